@@ -0,0 +1,66 @@
+"""
+Parse mode throughput benchmark.
+
+Parses the stored sample pages concurrently through PageLoader, once with
+the default thread executor and once with the process pool at each worker
+count, and reports pages per second. Thread mode is bound to one core by
+the GIL; process mode should scale with the worker count up to the number
+of cores.
+
+Usage:
+    python benchmarks/bench_parse_pool.py [--repeat N] [--pages N] [--workers 1,2,4]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_parsers import load_pages
+
+async def run_mode(mode: str, workers: int, contents):
+    from src.utils.pages import PageLoader
+    from src.utils.parse_pool import ParsePool
+
+    loader = PageLoader(fetcher=object(), parse_mode=mode)
+    if mode == "process":
+        loader.parse_pool = ParsePool(loader.parser.name, workers=workers)
+        # Start the workers outside the measurement
+        await asyncio.gather(*(loader.parse_pool.index(contents[0]) for _ in range(workers)))
+    try:
+        start_time = time.perf_counter()
+        # Distinct contents: identical pages would be coalesced by the loader
+        pages = await asyncio.gather(*(loader.parse(content) for content in contents))
+        # Agents extract every plan next; process mode already did that in the workers
+        for page in pages:
+            loader.engine.extract_plans(page.index)
+        return time.perf_counter() - start_time
+    finally:
+        loader.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=20, help="pricing section copies per page")
+    parser.add_argument("--pages", type=int, default=16, help="pages parsed per run")
+    parser.add_argument("--workers", default=",".join(str(n) for n in (1, 2, 4, os.cpu_count() or 1)),
+                        help="comma-separated process pool sizes")
+    args = parser.parse_args()
+
+    samples = list(load_pages(args.repeat).values())
+    contents = [f"{samples[i % len(samples)]}<!-- {i} -->" for i in range(args.pages)]
+    size_kb = sum(len(content) for content in contents) / 1024
+
+    print(f"{args.pages} pages, {size_kb:.0f} KB, {os.cpu_count()} cores")
+    print(f"{'mode':<8} {'workers':>7} {'seconds':>8} {'pages/s':>8}")
+    elapsed = asyncio.run(run_mode("thread", 0, contents))
+    print(f"{'thread':<8} {'-':>7} {elapsed:>8.2f} {args.pages / elapsed:>8.1f}")
+    for workers in sorted({int(n) for n in args.workers.split(",")}):
+        elapsed = asyncio.run(run_mode("process", workers, contents))
+        print(f"{'process':<8} {workers:>7} {elapsed:>8.2f} {args.pages / elapsed:>8.1f}")
+
+if __name__ == "__main__":
+    main()
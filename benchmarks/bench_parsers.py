@@ -0,0 +1,109 @@
+"""
+Parser backend micro-benchmark.
+
+Compares parse + extract time and peak memory of every installed HTML
+parser backend on the stored sample pages in benchmarks/pages. Each
+backend runs in a fresh process so peak RSS is not shared between them.
+
+Usage:
+    python benchmarks/bench_parsers.py [--repeat N] [--rounds N] [--json]
+
+--repeat duplicates each page's pricing section N times to simulate the
+1-3 MB provider pages seen in production.
+"""
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PAGES_DIR = os.path.join(ROOT, "benchmarks", "pages")
+sys.path.insert(0, ROOT)
+
+def load_pages(repeat: int):
+    pages = {}
+    for path in sorted(glob.glob(os.path.join(PAGES_DIR, "*.html"))):
+        with open(path, "r", encoding="utf-8") as f:
+            content = f.read()
+        if repeat > 1:
+            start = content.index('<section class="pricing-table">')
+            end = content.index('</section>', start) + len('</section>')
+            section = content[start:end]
+            content = content[:end] + section * (repeat - 1) + content[end:]
+        pages[os.path.basename(path)] = content
+    return pages
+
+def run_backend(backend_name: str, pages, rounds: int, queue):
+    from src.utils.extraction import ExtractionEngine
+    from src.utils.parsers import get_parser_backend
+
+    backend = get_parser_backend(backend_name)
+    engine = ExtractionEngine()
+    results = {}
+    for name, content in pages.items():
+        # Warm up imports and caches outside the measurement
+        backend.index(content, engine)
+
+        timings = []
+        for _ in range(rounds):
+            start_time = time.perf_counter()
+            _, page_index = backend.index(content, engine)
+            plans = engine.extract_plans(page_index)
+            timings.append(time.perf_counter() - start_time)
+
+        tracemalloc.start()
+        backend.index(content, engine)
+        _, traced_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        timings.sort()
+        results[name] = {
+            "bytes": len(content.encode("utf-8")),
+            "plans": len(plans),
+            "median_ms": round(timings[len(timings) // 2] * 1000, 2),
+            "min_ms": round(timings[0] * 1000, 2),
+            "python_peak_kb": round(traced_peak / 1024, 1),
+        }
+    # ru_maxrss is KiB on Linux
+    queue.put({
+        "backend": backend.name,
+        "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "pages": results,
+    })
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=100, help="pricing section copies per page")
+    parser.add_argument("--rounds", type=int, default=5, help="timed rounds per page")
+    parser.add_argument("--json", action="store_true", help="print raw JSON results")
+    args = parser.parse_args()
+
+    from src.utils.parsers import available_backends
+
+    pages = load_pages(args.repeat)
+    context = multiprocessing.get_context("spawn")
+    reports = []
+    for backend_name in available_backends():
+        queue = context.Queue()
+        process = context.Process(target=run_backend, args=(backend_name, pages, args.rounds, queue))
+        process.start()
+        reports.append(queue.get())
+        process.join()
+
+    if args.json:
+        print(json.dumps(reports, indent=2))
+        return
+
+    print(f"{'backend':<12} {'page':<22} {'size KB':>8} {'plans':>6} {'median ms':>10} {'py peak KB':>11} {'max RSS KB':>11}")
+    for report in reports:
+        for page, stats in report["pages"].items():
+            print(f"{report['backend']:<12} {page:<22} {stats['bytes'] / 1024:>8.0f} {stats['plans']:>6} "
+                  f"{stats['median_ms']:>10.2f} {stats['python_peak_kb']:>11.1f} {report['max_rss_kb']:>11}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Startup-time benchmark.
+
+Times cold start scenarios, each in a fresh interpreter, with GOOGLE_API_KEY
+unset to show that configuration is only validated when the model is used:
+
+  import          import src.main
+  fallback_only   construct PriceRetriever(fallback_only=True) and its fallback
+  scraper_worker  import the fallback agents and build a RoundRobinDistributor
+  model_sdk       import the model SDKs that are now deferred (for comparison)
+
+Usage:
+    python benchmarks/bench_startup.py [--runs N] [--json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = {
+    "import": "import src.main",
+    "fallback_only": (
+        "from src.main import PriceRetriever\n"
+        "retriever = PriceRetriever(fallback_only=True)\n"
+        "retriever.fallback"
+    ),
+    "scraper_worker": (
+        "from src.agents.fallback import RoundRobinDistributor\n"
+        "RoundRobinDistributor()"
+    ),
+    "model_sdk": (
+        "from google.cloud import aiplatform\n"
+        "from autogen_ext.agents.magentic_one import MagenticOneCoderAgent\n"
+        "from autogen_ext.agents.web_surfer import MultimodalWebSurfer"
+    ),
+}
+
+TIMER = (
+    "import time\n"
+    "start_time = time.perf_counter()\n"
+    "{code}\n"
+    "print(time.perf_counter() - start_time)\n"
+)
+
+def run_scenario(code: str) -> float:
+    env = {key: value for key, value in os.environ.items() if key != "GOOGLE_API_KEY"}
+    env["PYTHONDONTWRITEBYTECODE"] = "1"
+    output = subprocess.run(
+        [sys.executable, "-c", TIMER.format(code=code)],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    )
+    return float(output.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per scenario")
+    parser.add_argument("--json", action="store_true", help="print raw JSON results")
+    args = parser.parse_args()
+
+    results = {}
+    for name, code in SCENARIOS.items():
+        try:
+            timings = sorted(run_scenario(code) for _ in range(args.runs))
+        except subprocess.CalledProcessError as e:
+            results[name] = {"error": e.stderr.strip().splitlines()[-1] if e.stderr else "failed"}
+            continue
+        results[name] = {
+            "median_ms": round(statistics.median(timings) * 1000, 1),
+            "min_ms": round(timings[0] * 1000, 1),
+            "max_ms": round(timings[-1] * 1000, 1),
+        }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'scenario':<16} {'median ms':>10} {'min ms':>8} {'max ms':>8}")
+    for name, stats in results.items():
+        if "error" in stats:
+            print(f"{name:<16} {stats['error']}")
+            continue
+        print(f"{name:<16} {stats['median_ms']:>10.1f} {stats['min_ms']:>8.1f} {stats['max_ms']:>8.1f}")
+
+if __name__ == "__main__":
+    main()
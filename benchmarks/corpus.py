@@ -0,0 +1,104 @@
+"""
+Synthetic ISP pricing pages.
+
+Pages are generated deterministically from (seed, site index), so the stub
+server, the fake model and the benchmarks agree on every page's plans
+without sharing state. Size, plan count and nesting depth are configurable.
+"""
+import random
+from typing import List, Optional
+
+SPEEDS = [12, 25, 50, 100, 250, 500, 1000]
+TIERS = ["Basic", "Everyday", "Standard", "Fast", "Superfast", "Ultrafast", "Home Ultra", "Max"]
+
+class Plan:
+    __slots__ = ("name", "speed", "price")
+
+    def __init__(self, name: str, speed: int, price: float):
+        self.name = name
+        self.speed = speed
+        self.price = price
+
+class SiteSpec:
+    """Plans offered by one synthetic site."""
+
+    def __init__(self, index: int, plans: List[Plan]):
+        self.index = index
+        self.plans = plans
+
+    def plan_for(self, download_speed: float, plan_name: Optional[str] = None) -> Optional[Plan]:
+        """First plan the extractors should match (within 10% of the speed, name substring)."""
+        for plan in self.plans:
+            if abs(plan.speed - download_speed) / download_speed > 0.1:
+                continue
+            if plan_name and plan_name.lower() not in plan.name.lower():
+                continue
+            return plan
+        return None
+
+def site_spec(index: int, plan_count: int = 6, seed: int = 0) -> SiteSpec:
+    rng = random.Random(seed * 1_000_003 + index)
+    speeds = sorted(rng.sample(SPEEDS, min(plan_count, len(SPEEDS))))
+    plans = []
+    for position, speed in enumerate(speeds):
+        tier = TIERS[position % len(TIERS)]
+        plans.append(Plan(f"{tier} {speed}", speed, round(39 + speed ** 0.6 * 4 + rng.randint(0, 9) + 0.99, 2)))
+    return SiteSpec(index, plans)
+
+def plan_card(plan: Plan, rng: random.Random) -> str:
+    contract = rng.choice(["No contract", "12 month contract", "24 month contract"])
+    return (
+        '<div class="plan-card">'
+        f'<h3 class="plan-name">{plan.name}</h3>'
+        f'<div class="price"><span class="amount">${plan.price:.2f}</span> /mo</div>'
+        f'<div class="speed">Download speed {plan.speed} Mbps</div>'
+        f'<ul class="features"><li>{contract}</li><li>Unlimited data</li>'
+        f'<li>Setup fee ${rng.choice([0, 49, 99])}</li></ul>'
+        '</div>'
+    )
+
+def filler_block(rng: random.Random, number: int) -> str:
+    words = " ".join(rng.choice(["fast", "reliable", "nbn", "fibre", "support", "modem", "local", "award"])
+                     for _ in range(40))
+    return (
+        f'<div class="article c{number % 50}"><h4>Why choose us #{number}</h4><p>{words}</p>'
+        f'<a href="/help/{number}">Learn more</a><script>track({number}, "$0");</script></div>'
+    )
+
+def generate_page(index: int, plan_count: int = 6, depth: int = 3, size_kb: int = 64, seed: int = 0) -> str:
+    """
+    HTML for site `index`.
+
+    Args:
+        index: Site index (selects the plans)
+        plan_count: Plans on the page (at most len(SPEEDS))
+        depth: Wrapper elements around the pricing section
+        size_kb: Approximate page size; filler markup pads the page to it
+        seed: Corpus seed
+    """
+    spec = site_spec(index, plan_count, seed)
+    rng = random.Random(seed * 7919 + index)
+    cards = "".join(plan_card(plan, rng) for plan in spec.plans)
+    section = f'<section class="pricing-table">{cards}</section>'
+    for level in range(depth):
+        section = f'<div class="wrap-{level} layout">{section}</div>'
+
+    head = (
+        '<!DOCTYPE html><html lang="en"><head><meta charset="utf-8">'
+        f'<title>ISP {index} plans</title><style>.layout{{display:block}}</style>'
+        '<script>window.dataLayer = [];</script></head><body>'
+        '<nav class="menu"><a href="/">Home</a><a href="/plans">Plans</a></nav>'
+    )
+    tail = '<footer class="site-footer">Prices from $39.99</footer></body></html>'
+
+    target = size_kb * 1024
+    before, after = [], []
+    size = len(head) + len(section) + len(tail)
+    number = 0
+    while size < target:
+        block = filler_block(rng, number)
+        # Most filler goes after the plans so streaming early exit has something to skip
+        (before if number % 4 == 0 else after).append(block)
+        size += len(block)
+        number += 1
+    return head + "".join(before) + section + "".join(after) + tail
@@ -0,0 +1,64 @@
+"""
+Deterministic stand-in for the coordinator's model client.
+
+Answers the coordinator prompt from the corpus spec of the requested site,
+after a fixed latency, and reports token usage the way Gemini responses do
+so cost accounting runs as in production.
+"""
+import asyncio
+import json
+import re
+from typing import Optional
+
+from corpus import site_spec
+
+URL_PATTERN = re.compile(r"from (\S+?)\.?\n")
+SPEED_PATTERN = re.compile(r"Required download speed: ([\d.]+) Mbps")
+PLAN_PATTERN = re.compile(r"Specific plan name: (.+)\n")
+SITE_PATTERN = re.compile(r"/site/(\d+)")
+BATCH_QUERY_PATTERN = re.compile(r"^### Query (\S+)\n", re.MULTILINE)
+
+class Usage:
+    def __init__(self, prompt_token_count: int, candidates_token_count: int):
+        self.prompt_token_count = prompt_token_count
+        self.candidates_token_count = candidates_token_count
+
+class FakeResponse:
+    def __init__(self, text: str, usage: Usage):
+        self.text = text
+        self.usage_metadata = usage
+
+class FakeModelClient:
+    """Implements generate(prompt) like the coordinator's agent."""
+
+    def __init__(self, latency: float = 0.2, plan_count: int = 6, seed: int = 0, confidence: float = 0.95):
+        self.latency = latency
+        self.plan_count = plan_count
+        self.seed = seed
+        self.confidence = confidence
+        self.calls = 0
+
+    def answer(self, prompt: str) -> dict:
+        url = URL_PATTERN.search(prompt).group(1)
+        speed = float(SPEED_PATTERN.search(prompt).group(1))
+        plan_match = PLAN_PATTERN.search(prompt)
+        plan_name: Optional[str] = plan_match.group(1).strip() if plan_match else None
+
+        site = SITE_PATTERN.search(url)
+        plan = site_spec(int(site.group(1)), self.plan_count, self.seed).plan_for(speed, plan_name) if site else None
+        if plan is None:
+            return {"price": 0, "confidence": 0.0, "details": {}}
+        return {"price": plan.price, "confidence": self.confidence, "details": {"plan": plan.name}}
+
+    async def generate(self, prompt: str) -> FakeResponse:
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        queries = BATCH_QUERY_PATTERN.split(prompt)[1:]
+        if queries:
+            # Micro-batched prompt: alternating query ids and query texts
+            text = json.dumps({query_id: self.answer(query) for query_id, query in zip(queries[::2], queries[1::2])})
+        else:
+            text = json.dumps(self.answer(prompt))
+        # Same rough four-characters-per-token rule as the cost estimator
+        return FakeResponse(text, Usage(len(prompt) // 4 + 1, len(text) // 4 + 1))
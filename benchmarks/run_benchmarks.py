@@ -0,0 +1,259 @@
+"""
+Offline benchmark suite.
+
+Runs entirely against local fixtures: synthetic pages (corpus.py), a local
+stub HTTP server (stub_server.py) and a deterministic fake model
+(fake_model.py). No network access or API keys are needed.
+
+Benchmarks:
+  find_price            ScraperAgent._find_price full scan over an indexed page
+  find_price_template   the same with the per-domain template fast path
+  extract_plan_info     WebSurferAgent._extract_plan_information over an indexed page
+  end_to_end            PriceRetriever.get_plan_price, cold (fetch, parse, model)
+  end_to_end_warm       the same requests again (page and result caches warm)
+  fallback_only         PriceRetriever(fallback_only=True).get_plan_price, cold
+
+Results are written as JSON. With --baseline, they are compared against a
+stored run and the process exits with status 1 if any benchmark regressed
+beyond --tolerance.
+
+Usage:
+    python benchmarks/run_benchmarks.py [--sites N] [--size-kb N] [--requests N]
+        [--concurrency N] [--output PATH] [--baseline PATH] [--save-baseline]
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.join(ROOT, "benchmarks")
+DEFAULT_OUTPUT = os.path.join(BENCH_DIR, "results", "latest.json")
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+sys.path.insert(0, ROOT)
+
+# Isolate the run from on-disk caches and production rate limits; set before src is imported
+os.environ.update({
+    "PAGE_CACHE_DIR": "",
+    "RESULT_CACHE_DIR": "",
+    "TEMPLATE_STORE_PATH": "",
+    "SNAPSHOT_DIR": "",
+    "PRICE_HISTORY_DIR": "",
+    "MODEL_REQUESTS_PER_MINUTE": "1000000",
+    "MODEL_TOKENS_PER_MINUTE": "1000000000",
+    "COST_THRESHOLD": "1000000",
+    "SLOW_REQUEST_PROFILER": "off",
+})
+
+from corpus import generate_page, site_spec
+from fake_model import FakeModelClient
+from stub_server import StubServer
+
+# Metrics where a larger value is a regression, and where a smaller one is
+HIGHER_IS_WORSE = ("p50_ms", "p95_ms", "p99_ms")
+LOWER_IS_WORSE = ("ops_per_sec", "accuracy")
+
+def percentile(samples, quantile):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    return ordered[min(int(quantile * len(ordered)), len(ordered) - 1)]
+
+def summarize(timings, elapsed, correct, errors=0):
+    count = len(timings)
+    return {
+        "count": count,
+        "errors": errors,
+        "ops_per_sec": round(count / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(timings, 0.5) * 1000, 3),
+        "p95_ms": round(percentile(timings, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(timings, 0.99) * 1000, 3),
+        "max_ms": round(max(timings) * 1000, 3) if timings else 0.0,
+        "accuracy": round(correct / (count + errors), 4) if count + errors else 0.0,
+    }
+
+def site_case(index, args):
+    """(site index, speed, expected price) for a site, targeting a mid-page plan."""
+    spec = site_spec(index, args.plans, args.seed)
+    plan = spec.plans[len(spec.plans) // 2]
+    return index, plan.speed, plan.price
+
+def queries(args):
+    return [site_case(index, args) for index in range(args.sites)]
+
+def bench_find_price(args, use_template: bool):
+    from src.agents.fallback import ScraperAgent
+    from src.utils.extraction import ExtractionEngine
+    from src.utils.templates import TemplateStore
+
+    engine = ExtractionEngine()
+    agent = ScraperAgent(0, templates=TemplateStore(path=None))
+    cases = []
+    for index, speed, price in queries(args):
+        html = generate_page(index, args.plans, args.depth, args.size_kb, args.seed)
+        url = f"https://isp{index}.example.com/plans" if use_template else None
+        cases.append((engine.index(html), speed, price, url))
+
+    timings, correct = [], 0
+    start_time = time.perf_counter()
+    for _ in range(args.rounds):
+        for page_index, speed, price, url in cases:
+            call_start = time.perf_counter()
+            found = agent._find_price(page_index, speed, None, url=url)
+            timings.append(time.perf_counter() - call_start)
+            correct += found == price
+    return summarize(timings, time.perf_counter() - start_time, correct)
+
+def bench_extract_plan_info(args):
+    from src.agents.web_surfer import WebSurferAgent
+    from src.utils.extraction import ExtractionEngine
+    from src.utils.templates import TemplateStore
+
+    engine = ExtractionEngine()
+    web_surfer = WebSurferAgent(templates=TemplateStore(path=None))
+    cases = []
+    for index, speed, price in queries(args):
+        html = generate_page(index, args.plans, args.depth, args.size_kb, args.seed)
+        cases.append((html, speed, price))
+
+    async def run():
+        timings, correct = [], 0
+        start_time = time.perf_counter()
+        for _ in range(args.rounds):
+            for html, speed, price in cases:
+                # A fresh index each round so memoized plan extraction is not measured as free
+                page_index = engine.index(html)
+                call_start = time.perf_counter()
+                result = await web_surfer._extract_plan_information(page_index, speed, None)
+                timings.append(time.perf_counter() - call_start)
+                correct += result.get("price") == price
+        return summarize(timings, time.perf_counter() - start_time, correct)
+
+    return asyncio.run(run())
+
+async def drive(retriever, server, args, cases):
+    semaphore = asyncio.Semaphore(args.concurrency)
+    timings, errors, correct = [], 0, 0
+
+    async def one(index, speed, price):
+        nonlocal errors, correct
+        async with semaphore:
+            call_start = time.perf_counter()
+            try:
+                result = await retriever.get_plan_price(server.url(index), speed)
+            except Exception:
+                errors += 1
+                return
+            timings.append(time.perf_counter() - call_start)
+            correct += result.get("price") == price
+
+    start_time = time.perf_counter()
+    await asyncio.gather(*(one(*case) for case in cases))
+    return summarize(timings, time.perf_counter() - start_time, correct, errors)
+
+def bench_end_to_end(args):
+    from src.main import PriceRetriever
+
+    cases = [site_case(index, args) for index in range(args.requests)]
+    # A disjoint site range so the fallback-only run starts cold too
+    fallback_cases = [site_case(index + args.requests, args) for index in range(args.requests)]
+
+    async def run():
+        server = StubServer(latency=args.server_latency, jitter=args.server_latency, error_rate=args.error_rate,
+                            plan_count=args.plans, depth=args.depth, size_kb=args.size_kb, seed=args.seed)
+        async with server:
+            retriever = PriceRetriever()
+            retriever.coordinator.coordinator = FakeModelClient(args.model_latency, args.plans, args.seed)
+            fallback_only = PriceRetriever(fallback_only=True)
+            try:
+                cold = await drive(retriever, server, args, cases)
+                warm = await drive(retriever, server, args, cases)
+                fallback = await drive(fallback_only, server, args, fallback_cases)
+            finally:
+                await retriever.close()
+        return {"end_to_end": cold, "end_to_end_warm": warm, "fallback_only": fallback}
+
+    return asyncio.run(run())
+
+def compare(results, baseline, tolerance):
+    """Regressions of results against baseline, as human-readable lines."""
+    regressions = []
+    for name, current in results["benchmarks"].items():
+        previous = baseline.get("benchmarks", {}).get(name)
+        if previous is None:
+            continue
+        for metric in HIGHER_IS_WORSE:
+            if previous.get(metric) and current[metric] > previous[metric] * (1 + tolerance):
+                regressions.append(f"{name}.{metric}: {previous[metric]} -> {current[metric]}")
+        for metric in LOWER_IS_WORSE:
+            if previous.get(metric) and current[metric] < previous[metric] * (1 - tolerance):
+                regressions.append(f"{name}.{metric}: {previous[metric]} -> {current[metric]}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sites", type=int, default=20, help="synthetic sites for the extraction benchmarks")
+    parser.add_argument("--plans", type=int, default=6, help="plans per page")
+    parser.add_argument("--depth", type=int, default=3, help="wrapper depth around the pricing section")
+    parser.add_argument("--size-kb", type=int, default=64, help="approximate page size")
+    parser.add_argument("--rounds", type=int, default=5, help="passes over the sites per extraction benchmark")
+    parser.add_argument("--requests", type=int, default=100, help="end-to-end requests per run")
+    parser.add_argument("--concurrency", type=int, default=10, help="concurrent end-to-end requests")
+    parser.add_argument("--server-latency", type=float, default=0.02, help="stub server base latency (s)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="stub server 503 probability")
+    parser.add_argument("--model-latency", type=float, default=0.05, help="fake model latency (s)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--only", nargs="*", help="benchmark groups to run: find_price extract end_to_end")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="results JSON path")
+    parser.add_argument("--baseline", help="baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown")
+    parser.add_argument("--save-baseline", action="store_true", help=f"also write results to {DEFAULT_BASELINE}")
+    args = parser.parse_args()
+
+    groups = set(args.only or ["find_price", "extract", "end_to_end"])
+    benchmarks = {}
+    if "find_price" in groups:
+        benchmarks["find_price"] = bench_find_price(args, use_template=False)
+        benchmarks["find_price_template"] = bench_find_price(args, use_template=True)
+    if "extract" in groups:
+        benchmarks["extract_plan_info"] = bench_extract_plan_info(args)
+    if "end_to_end" in groups:
+        benchmarks.update(bench_end_to_end(args))
+
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "args": {key: value for key, value in vars(args).items()
+                     if key not in ("output", "baseline", "save_baseline")},
+        },
+        "benchmarks": benchmarks,
+    }
+
+    print(f"{'benchmark':<22} {'ops/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7} {'accuracy':>9}")
+    for name, stats in benchmarks.items():
+        print(f"{name:<22} {stats['ops_per_sec']:>9.1f} {stats['p50_ms']:>9.3f} {stats['p95_ms']:>9.3f} "
+              f"{stats['p99_ms']:>9.3f} {stats['errors']:>7} {stats['accuracy']:>9.2%}")
+
+    for path in [args.output] + ([DEFAULT_BASELINE] if args.save_baseline else []):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {path}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("Regressions against baseline:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("No regressions against baseline")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Local HTTP stub serving the synthetic corpus.
+
+GET /site/{index} returns generated page `index`. Latency and failures can
+be injected per server or per request with query parameters:
+
+    latency   base delay in seconds
+    jitter    extra uniform random delay in seconds
+    error     probability of an HTTP 503 response
+    throttle  probability of an HTTP 429 response
+
+Usage:
+    python benchmarks/stub_server.py [--port 8765] [--latency 0.05] [--error-rate 0.01]
+"""
+import argparse
+import asyncio
+import random
+from typing import Dict, Optional
+from aiohttp import web
+
+from corpus import generate_page
+
+class StubServer:
+    """aiohttp server for the synthetic corpus with latency and error injection."""
+
+    def __init__(self,
+                 latency: float = 0.0,
+                 jitter: float = 0.0,
+                 error_rate: float = 0.0,
+                 throttle_rate: float = 0.0,
+                 plan_count: int = 6,
+                 depth: int = 3,
+                 size_kb: int = 64,
+                 seed: int = 0,
+                 host: str = "127.0.0.1",
+                 port: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.page_options = {"plan_count": plan_count, "depth": depth, "size_kb": size_kb, "seed": seed}
+        self.host = host
+        self.port = port
+        self.random = random.Random(seed)
+        self._pages: Dict[int, bytes] = {}
+        self._runner: Optional[web.AppRunner] = None
+        self.stats = {"requests": 0, "errors": 0, "throttled": 0, "bytes": 0}
+
+    def url(self, index: int) -> str:
+        return f"http://{self.host}:{self.port}/site/{index}"
+
+    def page(self, index: int) -> bytes:
+        if index not in self._pages:
+            self._pages[index] = generate_page(index, **self.page_options).encode("utf-8")
+        return self._pages[index]
+
+    async def handle_site(self, request: web.Request) -> web.Response:
+        self.stats["requests"] += 1
+        query = request.query
+        latency = float(query.get("latency", self.latency))
+        jitter = float(query.get("jitter", self.jitter))
+        delay = latency + (self.random.uniform(0, jitter) if jitter else 0.0)
+        if delay:
+            await asyncio.sleep(delay)
+
+        if self.random.random() < float(query.get("throttle", self.throttle_rate)):
+            self.stats["throttled"] += 1
+            return web.Response(status=429, headers={"Retry-After": "1"})
+        if self.random.random() < float(query.get("error", self.error_rate)):
+            self.stats["errors"] += 1
+            return web.Response(status=503)
+
+        body = self.page(int(request.match_info["index"]))
+        self.stats["bytes"] += len(body)
+        return web.Response(body=body, content_type="text/html", charset="utf-8")
+
+    async def start(self) -> "StubServer":
+        app = web.Application()
+        app.router.add_get("/site/{index}", self.handle_site)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        # Resolve the port when an ephemeral one was requested
+        self.port = self._runner.addresses[0][1]
+        return self
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self) -> "StubServer":
+        return await self.start()
+
+    async def __aexit__(self, *exc_info):
+        await self.stop()
+
+async def serve(args):
+    server = StubServer(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                        throttle_rate=args.throttle_rate, size_kb=args.size_kb, port=args.port)
+    await server.start()
+    print(f"Serving synthetic corpus at {server.url(0)} (Ctrl+C to stop)")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--size-kb", type=int, default=64)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
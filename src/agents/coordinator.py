@@ -1,33 +1,117 @@
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple, List
+import json
 import time
-from google.cloud import aiplatform
-from autogen_ext.agents.magentic_one import MagenticOneCoderAgent
-from ..config import GEMINI_CONFIG, VERIFICATION_CONFIDENCE, COST_THRESHOLD
+from ..config import (
+    GEMINI_CONFIG, VERIFICATION_CONFIDENCE, INCREMENTAL_EXTRACTION, PROMPT_COMPACTION, PROMPT_TOKEN_BUDGET,
+    MICRO_BATCHING, require_google_api_key
+)
+from ..utils.admission import (
+    AdmissionController, estimate_tokens, token_usage, response_text, call_cost
+)
+from ..utils.digest import PageDigest, build_digest
+from ..utils.fetcher import FetchError
+from ..utils.microbatch import MicroBatcher
+from ..utils.pages import PageLoader, ParsedPage, get_page_loader
+from ..utils.result_cache import ResultCache
+from ..utils.singleflight import content_hash
+from ..utils.snapshots import SnapshotStore, get_snapshot_store, leaf_mask, matches_query
+from ..utils.latency import LatencyRecorder, get_latency_recorder
+from ..utils.tracing import traced, current_span
+
+RESPONSE_FORMAT = (
+    "\nFormat the response as JSON with:\n"
+    "- price: monthly cost in dollars\n"
+    "- confidence: confidence score between 0-1\n"
+    "- details: any additional plan information\n"
+)
+
+BATCH_RESPONSE_FORMAT = (
+    "\nFormat the response as one JSON object with a key for every query id. "
+    "The value for each id is that query's answer, a JSON object with:\n"
+    "- price: monthly cost in dollars\n"
+    "- confidence: confidence score between 0-1\n"
+    "- details: any additional plan information\n"
+)
 
 class MagenticCoordinator:
     """Coordinates price retrieval using Magentic framework with Gemini model."""
     
-    def __init__(self):
-        """Initialize coordinator with Gemini model."""
-        self.model = aiplatform.Model(
-            model_name=GEMINI_CONFIG["model"],
-            project=aiplatform.initializer.global_config.project,
-            location=aiplatform.initializer.global_config.location,
-        )
-        self.coordinator = MagenticOneCoderAgent(
-            model=self.model,
-            temperature=GEMINI_CONFIG["temperature"],
-            max_output_tokens=GEMINI_CONFIG["max_output_tokens"],
-            top_p=GEMINI_CONFIG["top_p"],
-            top_k=GEMINI_CONFIG["top_k"]
-        )
+    def __init__(self, loader: Optional[PageLoader] = None, result_cache: Optional[ResultCache] = None,
+                 admission: Optional[AdmissionController] = None,
+                 latency: Optional[LatencyRecorder] = None,
+                 snapshots: Optional[SnapshotStore] = None,
+                 compact_prompts: bool = PROMPT_COMPACTION,
+                 prompt_budget: int = PROMPT_TOKEN_BUDGET,
+                 micro_batching: bool = MICRO_BATCHING):
+        """Initialize coordinator; the Gemini model and agent are built on first use."""
+        self._model = None
+        self._coordinator = None
+        self.loader = loader or get_page_loader()
+        self.result_cache = result_cache or ResultCache()
+        self.admission = admission or AdmissionController()
+        self.latency = latency or get_latency_recorder()
+        self.snapshots = snapshots or (get_snapshot_store() if INCREMENTAL_EXTRACTION else None)
+        self.compact_prompts = compact_prompts
+        self.prompt_budget = prompt_budget
+        # Concurrent requests share model calls through the batcher when enabled
+        self.batcher = MicroBatcher(self._generate_batch) if micro_batching else None
         self.metrics = {
             "requests_processed": 0,
             "total_cost": 0.0,
+            "input_tokens": 0,
+            "output_tokens": 0,
+            "estimated_usage_calls": 0,
             "average_latency": 0.0,
-            "total_latency": 0.0
+            "total_latency": 0.0,
+            "cache_hits": 0,
+            "cache_misses": 0,
+            "compacted_prompts": 0,
+            "prompt_tokens_saved": 0,
+            "full_prompts": 0,
+            "llm_latency_compacted": 0.0,
+            "llm_latency_full": 0.0,
+            "model_calls": 0,
+            "batched_calls": 0,
+            "batched_queries": 0
         }
     
+    @property
+    def model(self):
+        """Gemini model, created (and the API key checked) on first access."""
+        if self._model is None:
+            require_google_api_key()
+            # Imported here: the SDK takes seconds to import and fallback-only runs never need it
+            from google.cloud import aiplatform
+            self._model = aiplatform.Model(
+                model_name=GEMINI_CONFIG["model"],
+                project=aiplatform.initializer.global_config.project,
+                location=aiplatform.initializer.global_config.location,
+            )
+        return self._model
+    
+    @model.setter
+    def model(self, model):
+        self._model = model
+    
+    @property
+    def coordinator(self):
+        """Magentic agent wrapping the model, created on first access."""
+        if self._coordinator is None:
+            from autogen_ext.agents.magentic_one import MagenticOneCoderAgent
+            self._coordinator = MagenticOneCoderAgent(
+                model=self.model,
+                temperature=GEMINI_CONFIG["temperature"],
+                max_output_tokens=GEMINI_CONFIG["max_output_tokens"],
+                top_p=GEMINI_CONFIG["top_p"],
+                top_k=GEMINI_CONFIG["top_k"]
+            )
+        return self._coordinator
+    
+    @coordinator.setter
+    def coordinator(self, coordinator):
+        self._coordinator = coordinator
+    
+    @traced("coordinator.process_request")
     async def process_request(self, url: str, download_speed: float, plan_name: Optional[str] = None) -> Dict[str, Any]:
         """
         Process a price retrieval request using Magentic framework.
@@ -40,37 +124,92 @@ class MagenticCoordinator:
         Returns:
             Dict containing price information and metadata
         """
-        start_time = time.time()
+        start_time = time.monotonic()
         
         try:
-            # Prepare the prompt for the model
-            prompt = self._build_prompt(url, download_speed, plan_name)
+            # Serve pages whose relevant plans are unchanged from the result cache without an LLM call
+            cache_key = ResultCache.make_key(url, download_speed, plan_name, namespace=GEMINI_CONFIG["model"])
+            page = await self.loader.load(url)
+            page_hash, changes = await self._page_state(page, url, download_speed, plan_name)
+            cached = await self.result_cache.get_async(cache_key, page_hash)
+            if cached is not None:
+                self.metrics["cache_hits"] += 1
+                cached["cached"] = True
+                if changes is not None:
+                    cached["changes"] = changes
+                current_span().set_attributes(url=url, cached=True)
+                return cached
+            self.metrics["cache_misses"] += 1
+            
+            # Prepare the prompt for the model, with a digest of the plan cards
+            digest = None
+            if self.compact_prompts:
+                digest = build_digest(page.index, page.content, download_speed, plan_name, self.prompt_budget)
+            prompt = self._build_prompt(url, download_speed, plan_name, digest.text if digest else None)
             
-            # Get response from model
-            response = await self.coordinator.generate(prompt)
+            # Get response from model, alone or batched with concurrent requests
+            if self.batcher is not None:
+                answer = await self.batcher.submit(prompt, estimate_tokens(prompt))
+            else:
+                answer = (await self._generate_batch([prompt]))[0]
+            text, usage, llm_latency, batch_size = answer
+            cost = call_cost(*usage)
+            current_span().set_attributes(url=url, cached=False, input_tokens=usage[0],
+                                          output_tokens=usage[1], cost=cost, batch_size=batch_size,
+                                          tokens_saved=digest.tokens_saved if digest else 0)
             
             # Parse and validate the response
-            result = self._parse_response(response)
+            result = self._parse_response(text)
             
             # Update metrics
-            elapsed_time = time.time() - start_time
-            self._update_metrics(elapsed_time)
+            elapsed_time = time.monotonic() - start_time
+            self._update_metrics(elapsed_time, usage[0], usage[1], cost)
             
             # Check confidence threshold
             if result["confidence"] < VERIFICATION_CONFIDENCE:
                 raise ValueError("Confidence below threshold")
-                
-            # Check cost threshold
-            if self.metrics["total_cost"] > COST_THRESHOLD:
-                raise ValueError("Cost threshold exceeded")
             
+            self.result_cache.put(cache_key, page_hash, result)
+            if changes is not None:
+                result["changes"] = changes
+            result["prompt"] = self._prompt_report(digest, usage[0], llm_latency)
+            result["prompt"]["batch_size"] = batch_size
             return result
             
+        except FetchError:
+            # Without the page there is nothing to ask the model; callers see the status and Retry-After
+            raise
         except Exception as e:
             raise Exception(f"Coordinator processing failed: {str(e)}")
     
-    def _build_prompt(self, url: str, download_speed: float, plan_name: Optional[str]) -> str:
-        """Build prompt for the model."""
+    async def _page_state(self, page: ParsedPage, url: str, download_speed: float,
+                          plan_name: Optional[str]) -> Tuple[str, Optional[Dict[str, Any]]]:
+        """
+        Hash of the page content a result depends on, and the page's change report.
+
+        With a snapshot store, the hash covers only the plan containers that
+        could answer the query, so an edit to an unrelated plan card keeps the
+        cached answer; new or changed matching cards invalidate it. Without
+        one, or when no container matches, it covers every plan container, so
+        rotating tokens or timestamps elsewhere on the page do not defeat the
+        cache.
+        """
+        containers = page.index.plan_containers()
+        if not containers:
+            return page.content_hash, None
+        if self.snapshots is None:
+            return content_hash("\x00".join(container.text for container in containers)), None
+        
+        await self.snapshots.load(url)
+        plans, changes = self.snapshots.observe(url, page.index)
+        relevant = [container.fingerprint for container, plan, leaf in zip(containers, plans, leaf_mask(containers))
+                    if leaf and matches_query(plan, download_speed, plan_name)]
+        fingerprints = relevant or [container.fingerprint for container in containers]
+        return content_hash("\x00".join(fingerprints)), changes
+    
+    def _build_prompt(self, url: str, download_speed: float, plan_name: Optional[str],
+                      digest: Optional[str] = None) -> str:
+        """Build prompt for the model, embedding the page digest when there is one."""
         prompt = (
             f"Extract internet plan pricing information from {url}.\n"
             f"Required download speed: {download_speed} Mbps\n"
@@ -78,19 +217,112 @@ class MagenticCoordinator:
         if plan_name:
             prompt += f"Specific plan name: {plan_name}\n"
         
-        prompt += (
-            "\nFormat the response as JSON with:\n"
-            "- price: monthly cost in dollars\n"
-            "- confidence: confidence score between 0-1\n"
-            "- details: any additional plan information\n"
+        if digest:
+            prompt += f"\n{digest}\nAnswer from these listings; there is no need to open the page.\n"
+        
+        return prompt + RESPONSE_FORMAT
+    
+    def _build_batch_prompt(self, ids: List[str], prompts: List[str]) -> str:
+        """Combine single-query prompts into one prompt answered per query id."""
+        batch_prompt = f"Answer each of the following {len(prompts)} queries independently.\n"
+        for query_id, prompt in zip(ids, prompts):
+            if prompt.endswith(RESPONSE_FORMAT):
+                prompt = prompt[:-len(RESPONSE_FORMAT)]
+            batch_prompt += f"\n### Query {query_id}\n{prompt}"
+        return batch_prompt + BATCH_RESPONSE_FORMAT
+    
+    async def _generate(self, prompt: str, queries: int = 1) -> Tuple[str, Tuple[int, int], float]:
+        """
+        One model call under admission control.
+        
+        Returns:
+            Response text, (input, output) token usage and the call's latency
+        """
+        # Reserve rate and budget capacity before spending anything
+        input_estimate = estimate_tokens(prompt)
+        output_estimate = self._expected_output_tokens() * queries
+        reservation = await self.admission.admit(
+            input_estimate + output_estimate,
+            call_cost(input_estimate, output_estimate)
         )
-        return prompt
+        
+        llm_start = time.monotonic()
+        try:
+            with self.latency.time("llm"):
+                response = await self.coordinator.generate(prompt)
+        except BaseException:
+            # Cancellation too (a hedge losing its race, a client going away): otherwise the
+            # reserved cost and tokens would stay held and the budget would drain away
+            self.admission.release(reservation)
+            raise
+        llm_latency = time.monotonic() - llm_start
+        self.metrics["model_calls"] += 1
+        
+        # Account for the tokens actually used
+        text = response_text(response)
+        usage = token_usage(response)
+        if usage is None:
+            self.metrics["estimated_usage_calls"] += 1
+            usage = (input_estimate, estimate_tokens(text))
+        self.admission.settle(reservation, usage[0], usage[1], call_cost(*usage))
+        return text, usage, llm_latency
+    
+    async def _generate_batch(self, prompts: List[str]) -> List[Any]:
+        """
+        Answer several prompts with one model call.
+        
+        Returns:
+            Per prompt, either (response text, token usage, latency, batch size)
+            or the exception that fails that prompt alone. Usage is split
+            between the prompts by prompt and answer length.
+        """
+        if len(prompts) == 1:
+            text, usage, llm_latency = await self._generate(prompts[0])
+            return [(text, usage, llm_latency, 1)]
+        
+        ids = [f"q{i}" for i in range(len(prompts))]
+        text, usage, llm_latency = await self._generate(self._build_batch_prompt(ids, prompts), len(prompts))
+        self.metrics["batched_calls"] += 1
+        self.metrics["batched_queries"] += len(prompts)
+        answers = self._split_batch_response(text, ids)
+        
+        input_weights = [estimate_tokens(prompt) for prompt in prompts]
+        output_weights = [estimate_tokens(answer) if isinstance(answer, str) else 0 for answer in answers]
+        results = []
+        for answer, input_weight, output_weight in zip(answers, input_weights, output_weights):
+            if isinstance(answer, Exception):
+                results.append(answer)
+                continue
+            share = (
+                round(usage[0] * input_weight / sum(input_weights)),
+                round(usage[1] * output_weight / sum(output_weights))
+            )
+            results.append((answer, share, llm_latency, len(prompts)))
+        return results
+    
+    def _split_batch_response(self, response: str, ids: List[str]) -> List[Any]:
+        """Sub-answer text for each query id, or a ValueError for ids the response does not answer."""
+        try:
+            parsed = json.loads(response)
+        except ValueError as e:
+            raise ValueError(f"Failed to parse batch response: {str(e)}")
+        if not isinstance(parsed, dict):
+            raise ValueError("Failed to parse batch response: expected a JSON object keyed by query id")
+        
+        answers = []
+        for query_id in ids:
+            if query_id not in parsed:
+                answers.append(ValueError(f"Failed to parse model response: no answer for query {query_id}"))
+            elif isinstance(parsed[query_id], str):
+                answers.append(parsed[query_id])
+            else:
+                answers.append(json.dumps(parsed[query_id]))
+        return answers
     
     def _parse_response(self, response: str) -> Dict[str, Any]:
         """Parse and validate model response."""
         try:
             # Parse JSON response from model
-            import json
             parsed = json.loads(response)
             
             # Validate required fields
@@ -113,16 +345,60 @@ class MagenticCoordinator:
         except Exception as e:
             raise ValueError(f"Failed to parse model response: {str(e)}")
     
-    def _update_metrics(self, elapsed_time: float):
-        """Update performance metrics."""
+    def _prompt_report(self, digest: Optional[PageDigest], input_tokens: int, llm_latency: float) -> Dict[str, Any]:
+        """
+        Prompt size and latency of a model call.
+
+        latency_delta compares this call (digest build plus model time) with
+        the average model latency of full-page prompts, once any were made.
+        """
+        if digest is None:
+            self.metrics["full_prompts"] += 1
+            self.metrics["llm_latency_full"] += (llm_latency - self.metrics["llm_latency_full"]) / self.metrics["full_prompts"]
+            return {"compacted": False, "tokens": input_tokens, "llm_latency": llm_latency}
+        
+        self.metrics["compacted_prompts"] += 1
+        self.metrics["prompt_tokens_saved"] += digest.tokens_saved
+        self.metrics["llm_latency_compacted"] += (
+            (llm_latency - self.metrics["llm_latency_compacted"]) / self.metrics["compacted_prompts"]
+        )
+        baseline = self.metrics["llm_latency_full"] if self.metrics["full_prompts"] else None
+        return {
+            "compacted": True,
+            "tokens": input_tokens,
+            "page_tokens": digest.raw_tokens,
+            "tokens_saved": digest.tokens_saved,
+            "plans_included": digest.included,
+            "plans_total": digest.containers,
+            "build_time": digest.build_time,
+            "llm_latency": llm_latency,
+            "latency_delta": digest.build_time + llm_latency - baseline if baseline is not None else None
+        }
+    
+    def _expected_output_tokens(self) -> int:
+        """Output tokens to reserve: the observed average, or the model maximum before any call."""
+        if self.metrics["requests_processed"]:
+            return max(1, round(self.metrics["output_tokens"] / self.metrics["requests_processed"]))
+        return GEMINI_CONFIG["max_output_tokens"]
+    
+    def _update_metrics(self, elapsed_time: float, input_tokens: int = 0, output_tokens: int = 0, cost: float = 0.0):
+        """Update performance and token cost metrics."""
         self.metrics["requests_processed"] += 1
         self.metrics["total_latency"] += elapsed_time
         self.metrics["average_latency"] = (
             self.metrics["total_latency"] / self.metrics["requests_processed"]
         )
-        # TODO: Implement actual cost calculation
-        self.metrics["total_cost"] += 0.001  # Placeholder cost per request
+        self.metrics["input_tokens"] += input_tokens
+        self.metrics["output_tokens"] += output_tokens
+        self.metrics["total_cost"] += cost
         
     def monitor_performance(self) -> Dict[str, Any]:
         """Get coordinator performance metrics."""
+        if self.batcher is not None:
+            return {**self.metrics, "batcher": self.batcher.get_metrics()}
         return self.metrics
+    
+    async def close(self):
+        """Send any pending micro-batch and wait for batched calls in flight."""
+        if self.batcher is not None:
+            await self.batcher.close()
@@ -1,42 +1,141 @@
 from typing import Dict, Any, Optional, List
 import time
-from concurrent.futures import ThreadPoolExecutor
 from functools import partial
 import asyncio
-import requests
-from bs4 import BeautifulSoup
-from ..config import MAX_AGENTS, VERIFICATION_CONFIDENCE
+from ..config import (
+    MAX_AGENTS, VERIFICATION_CONFIDENCE, STREAM_PARSING, AGENT_MAX_CONCURRENCY, AGENT_EWMA_ALPHA,
+    EXTRACTION_TEMPLATES, INCREMENTAL_EXTRACTION, PLAN_TABLES
+)
+from ..utils.fetcher import FetchError
+from ..utils.pages import PageLoader, get_page_loader
+from ..utils.extraction import PageIndex, ContainerIndex, ROLE_SCRAPER_PLAN, parse_number
+from ..utils.templates import TemplateStore, get_template_store
+from ..utils.snapshots import SnapshotStore, get_snapshot_store
+from ..utils.plan_table import PlanTable, PlanTableCache, get_plan_table_cache
+from ..utils.latency import get_latency_recorder
+from ..utils.tracing import traced, current_span
+from .scheduler import SchedulingPolicy, get_scheduling_policy
 
 class ScraperAgent:
     """Individual scraper agent for fallback system."""
     
-    def __init__(self, agent_id: int):
+    def __init__(self,
+                 agent_id: int,
+                 loader: Optional[PageLoader] = None,
+                 stream_parsing: bool = STREAM_PARSING,
+                 max_concurrency: int = AGENT_MAX_CONCURRENCY,
+                 templates: Optional[TemplateStore] = None,
+                 snapshots: Optional[SnapshotStore] = None,
+                 plan_tables: Optional[PlanTableCache] = None):
         self.agent_id = agent_id
+        self.loader = loader or get_page_loader()
+        self.stream_parsing = stream_parsing
+        self.templates = templates or (get_template_store() if EXTRACTION_TEMPLATES else None)
+        self.snapshots = snapshots or (get_snapshot_store() if INCREMENTAL_EXTRACTION else None)
+        self.plan_tables = plan_tables or (get_plan_table_cache() if PLAN_TABLES else None)
+        self.latency = get_latency_recorder()
+        self.max_concurrency = max_concurrency
+        self._slots = asyncio.Semaphore(max_concurrency)
         self.metrics = {
             "requests_handled": 0,
             "successful_extractions": 0,
-            "failed_extractions": 0
+            "failed_extractions": 0,
+            "in_flight": 0,
+            "ewma_latency": 0.0
         }
         
+    @property
+    def saturated(self) -> bool:
+        """Whether the agent is at its concurrency cap."""
+        return self.metrics["in_flight"] >= self.max_concurrency
+        
+    @traced("scraper.extract_price")
     async def extract_price(self, url: str, download_speed: float, plan_name: Optional[str] = None) -> Dict[str, Any]:
-        """Extract price information from URL."""
+        """Extract price information from URL, waiting for a free slot if the agent is at its cap."""
+        self.metrics["in_flight"] += 1
         try:
-            response = requests.get(url)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.text, 'html.parser')
+            async with self._slots:
+                start_time = time.monotonic()
+                try:
+                    return await self._extract_price(url, download_speed, plan_name)
+                finally:
+                    self._record_latency(time.monotonic() - start_time)
+        finally:
+            self.metrics["in_flight"] -= 1
             
-            # Simple extraction based on common patterns
-            price = self._find_price(soup, download_speed, plan_name)
+    def _record_latency(self, elapsed_time: float):
+        """Fold a request latency into the agent's EWMA."""
+        if not self.metrics["ewma_latency"]:
+            self.metrics["ewma_latency"] = elapsed_time
+        else:
+            self.metrics["ewma_latency"] += AGENT_EWMA_ALPHA * (elapsed_time - self.metrics["ewma_latency"])
+        
+    async def _extract_price(self, url: str, download_speed: float, plan_name: Optional[str] = None) -> Dict[str, Any]:
+        try:
+            # A fresh plan table of the page answers any speed or plan name without loading it again
+            table = self.plan_tables.get("scraper", url) if self.plan_tables is not None else None
+            page = None
+            template_plan = None
+            content = None
+            changes = None
+            if table is None and self.templates is not None:
+                # The domain's template reads its container without loading and scanning the whole page
+                template_plan, content = await self.templates.load(
+                    self.loader, url, TemplateStore.make_key("scraper", download_speed, plan_name),
+                    validate=lambda c: self._container_price(c, download_speed, plan_name) is not None
+                )
+            if table is not None:
+                with self.latency.time("extract"):
+                    price = self._table_price(table, download_speed, plan_name)
+                current_span().set_attributes(agent_id=self.agent_id, url=url, plan_table=True, found=bool(price))
+            elif template_plan is not None:
+                with self.latency.time("extract"):
+                    price = self._container_price(template_plan, download_speed, plan_name)
+                current_span().set_attributes(agent_id=self.agent_id, url=url, template=True, found=True)
+            else:
+                # Agents hitting the same URL concurrently share one download and parse
+                if content is not None:
+                    # Already downloaded for the template that missed
+                    page = await self.loader.parse(content, url)
+                elif self.stream_parsing:
+                    page = await self.loader.stream(
+                        url,
+                        stop=lambda plan: self._container_price(plan, download_speed, plan_name) is not None,
+                        flight_key=f"scraper|{download_speed}|{plan_name}"
+                    )
+                else:
+                    page = await self.loader.load(url)
+                
+                if self.snapshots is not None and page.content is not None:
+                    await self.snapshots.load(url)
+                # Simple extraction based on common patterns
+                with self.latency.time("extract"):
+                    # Streamed pages stop early, so only fully loaded pages can be diffed against the snapshot
+                    records = None
+                    if self.snapshots is not None and page.content is not None:
+                        changes = self.snapshots.observe(url, page.index)[1]
+                        records = self.snapshots.reuse(url, "scraper", page.index.scraper_containers(),
+                                                       self._plan_record)
+                    price = self._find_price(page.index, download_speed, plan_name, url=url,
+                                             lookup_template=False, records=records)
+                current_span().set_attributes(agent_id=self.agent_id, url=url,
+                                              containers=len(page.index.containers), found=bool(price))
+                # Streamed pages stop early, so only fully loaded pages make a complete table
+                if self.plan_tables is not None and page.content is not None:
+                    self.plan_tables.put("scraper", url, self._plan_records(page.index, records))
             
             self.metrics["requests_handled"] += 1
             if price:
                 self.metrics["successful_extractions"] += 1
-                return {
+                result = {
                     "price": price,
                     "confidence": 0.7,  # Lower confidence for fallback
                     "agent_id": self.agent_id,
                     "details": {"extraction_method": "fallback_pattern_matching"}
                 }
+                if changes is not None:
+                    result["changes"] = changes
+                return result
             else:
                 self.metrics["failed_extractions"] += 1
                 return {
@@ -45,64 +144,141 @@ class ScraperAgent:
                     "agent_id": self.agent_id
                 }
                 
+        except FetchError:
+            # Passed on unwrapped so callers see the HTTP status and Retry-After
+            self.metrics["failed_extractions"] += 1
+            raise
         except Exception as e:
             self.metrics["failed_extractions"] += 1
             raise Exception(f"Agent {self.agent_id} extraction failed: {str(e)}")
             
-    def _find_price(self, soup: BeautifulSoup, download_speed: float, plan_name: Optional[str]) -> Optional[float]:
-        """Find price in soup based on criteria."""
+    def _find_price(self, page_index: PageIndex, download_speed: float, plan_name: Optional[str],
+                    url: Optional[str] = None, lookup_template: bool = True,
+                    records: Optional[List[Optional[Dict[str, Any]]]] = None) -> Optional[float]:
+        """
+        Find price in an indexed page based on criteria, trying the domain's template first unless the caller has.
+
+        records, one _plan_record() per scraper container (e.g. served from
+        the snapshot store), are matched instead of re-reading each container.
+        """
         try:
-            # Look for plan containers
-            plans = soup.find_all(['div', 'section'], class_=lambda x: x and any(
-                term in str(x).lower() for term in ['plan', 'package', 'pricing']
-            ))
-            
-            for plan in plans:
-                # Check if plan matches criteria
-                if plan_name and plan_name.lower() not in str(plan).lower():
-                    continue
+            use_templates = url is not None and self.templates is not None
+            if use_templates:
+                query = TemplateStore.make_key("scraper", download_speed, plan_name)
+            if use_templates and lookup_template:
+                plan = self.templates.lookup(
+                    page_index, url, query,
+                    validate=lambda c: self._container_price(c, download_speed, plan_name) is not None
+                )
+                if plan is not None:
+                    return self._container_price(plan, download_speed, plan_name)
                     
-                speed_text = plan.find(string=lambda x: 'mbps' in str(x).lower())
-                if speed_text:
-                    try:
-                        found_speed = float(''.join(filter(str.isdigit, speed_text)))
-                        if abs(found_speed - download_speed) / download_speed > 0.1:
-                            continue
-                    except:
-                        continue
-                
-                # Look for price
-                price_text = plan.find(string=lambda x: '$' in str(x))
-                if price_text:
-                    try:
-                        return float(''.join(filter(str.isdigit, price_text)))
-                    except:
-                        continue
+            # Look for plan containers
+            containers = page_index.scraper_containers()
+            for position, plan in enumerate(containers):
+                if records is None:
+                    price = self._container_price(plan, download_speed, plan_name)
+                elif records[position] is not None:
+                    price = self._record_price(records[position], download_speed, plan_name)
+                else:
+                    price = None
+                if price is not None:
+                    if use_templates:
+                        self.templates.learn(url, query, plan)
+                    return price
             
             return None
             
         except Exception:
             return None
 
+    def _plan_records(self, page_index: PageIndex,
+                      records: Optional[List[Optional[Dict[str, Any]]]] = None) -> List[Dict[str, Any]]:
+        """Plan table records of a page's scraper containers, from precomputed records if given."""
+        if records is None:
+            records = [self._plan_record(plan) for plan in page_index.scraper_containers()]
+        return [record for record in records if record is not None]
+        
+    def _plan_record(self, plan: ContainerIndex) -> Optional[Dict[str, Any]]:
+        """
+        Plan table record of a container _container_price could ever answer from.
+
+        A container without speed text matches every speed, so its record has
+        no speed; containers whose speed or price text holds no number never
+        match and get no record.
+        """
+        speed_text = plan.first_strings.get('mbps')
+        speed = parse_number(speed_text) if speed_text else None
+        price_text = plan.first_strings.get('$')
+        price = parse_number(price_text) if price_text else None
+        if (speed_text and speed is None) or price is None:
+            return None
+        return {"name": None, "speed": speed, "price": price, "match_text": plan.lower_text}
+        
+    def _table_price(self, table: PlanTable, download_speed: float, plan_name: Optional[str]) -> Optional[float]:
+        """Price of the first plan in page order that matches, found through the table's indexes."""
+        for record in table.lookup(download_speed, plan_name, unknown_speed_matches=True):
+            price = self._record_price(record, download_speed, plan_name)
+            if price is not None:
+                return price
+        return None
+        
+    def _record_price(self, record: Dict[str, Any], download_speed: float, plan_name: Optional[str]) -> Optional[float]:
+        """Price of a plan record if it matches the criteria (the same rules as _container_price)."""
+        if plan_name and plan_name.lower() not in record["match_text"]:
+            return None
+        if record["speed"] is not None and abs(record["speed"] - download_speed) / download_speed > 0.1:
+            return None
+        return record["price"]
+        
+    def _container_price(self, plan: ContainerIndex, download_speed: float, plan_name: Optional[str]) -> Optional[float]:
+        """Price of a single plan container if it matches the criteria."""
+        if not plan.roles & ROLE_SCRAPER_PLAN:
+            return None
+            
+        # Check if plan matches criteria
+        if plan_name and plan_name.lower() not in plan.lower_text:
+            return None
+            
+        speed_text = plan.first_strings.get('mbps')
+        if speed_text:
+            found_speed = parse_number(speed_text)
+            if found_speed is None or abs(found_speed - download_speed) / download_speed > 0.1:
+                return None
+        
+        # Look for price
+        price_text = plan.first_strings.get('$')
+        if price_text:
+            return parse_number(price_text)
+        return None
+
 class RoundRobinDistributor:
-    """Fallback system using round-robin distribution of scraper agents."""
+    """Fallback system distributing requests over a pool of scraper agents."""
     
-    def __init__(self):
-        """Initialize distributor with pool of agents."""
-        self.agents = [ScraperAgent(i) for i in range(MAX_AGENTS)]
-        self.current_agent = 0
+    def __init__(self, loader: Optional[PageLoader] = None, scheduler: Optional[SchedulingPolicy] = None,
+                 templates: Optional[TemplateStore] = None, snapshots: Optional[SnapshotStore] = None,
+                 plan_tables: Optional[PlanTableCache] = None):
+        """Initialize distributor with pool of agents sharing one page loader, template, snapshot and plan table store."""
+        self.loader = loader or get_page_loader()
+        self.agents = [ScraperAgent(i, loader=self.loader, templates=templates, snapshots=snapshots,
+                                    plan_tables=plan_tables)
+                       for i in range(MAX_AGENTS)]
+        self.scheduler = scheduler or get_scheduling_policy()
+        self.latency = get_latency_recorder()
         self.metrics = {
             "total_requests": 0,
             "successful_requests": 0,
             "failed_requests": 0,
             "average_response_time": 0.0,
-            "total_response_time": 0.0
+            "total_response_time": 0.0,
+            "fan_outs": 0,
+            "cancelled_agent_requests": 0
         }
-        self.executor = ThreadPoolExecutor(max_workers=MAX_AGENTS)
         
+    @traced("fallback.process_request")
     async def process_request(self, url: str, download_speed: float, plan_name: Optional[str] = None) -> Dict[str, Any]:
         """
-        Process request using round-robin distribution among agents.
+        Process request with the agent picked by the scheduling policy.
         
         Args:
             url: Website URL to scrape
@@ -112,56 +288,68 @@ class RoundRobinDistributor:
         Returns:
             Dict containing price information and metadata
         """
-        start_time = time.time()
+        start_time = time.monotonic()
         self.metrics["total_requests"] += 1
         
         try:
-            # Get next agent in rotation
-            agent = self.agents[self.current_agent]
-            self.current_agent = (self.current_agent + 1) % len(self.agents)
+            agent = self.scheduler.select(self.agents)
+            current_span().set_attributes(url=url, agent_id=agent.agent_id, scheduler=self.scheduler.name)
             
             # Process with selected agent
             result = await agent.extract_price(url, download_speed, plan_name)
             
             # Update metrics
-            elapsed_time = time.time() - start_time
+            elapsed_time = time.monotonic() - start_time
             self._update_metrics(elapsed_time, success="error" not in result)
             
             if "error" in result:
-                # Try parallel processing with remaining agents
-                results = await self._parallel_process(url, download_speed, plan_name, exclude_agent=agent.agent_id)
-                if results:
-                    return max(results, key=lambda x: x.get("confidence", 0))
+                # Fan out to the remaining agents and keep the first valid answer
+                with self.latency.time("fallback_fanout"):
+                    result = await self._parallel_process(url, download_speed, plan_name, exclude_agent=agent.agent_id)
+                if result is not None:
+                    return result
                 raise Exception("All agents failed to extract price")
                 
             return result
             
+        except FetchError:
+            # The agents share one loader, so the rest would fail to fetch the page too
+            self._update_metrics(time.monotonic() - start_time, success=False)
+            raise
         except Exception as e:
-            elapsed_time = time.time() - start_time
+            elapsed_time = time.monotonic() - start_time
             self._update_metrics(elapsed_time, success=False)
             raise Exception(f"Fallback processing failed: {str(e)}")
+        finally:
+            self.latency.observe("fallback", time.monotonic() - start_time)
             
-    async def _parallel_process(self, url: str, download_speed: float, plan_name: Optional[str], exclude_agent: int) -> List[Dict[str, Any]]:
-        """Process request with multiple agents in parallel."""
-        agents = [a for a in self.agents if a.agent_id != exclude_agent]
+    @traced("fallback.fan_out")
+    async def _parallel_process(self, url: str, download_speed: float, plan_name: Optional[str], exclude_agent: int) -> Optional[Dict[str, Any]]:
+        """Run the remaining agents in parallel; return the first valid result and cancel the rest."""
+        agents = self.scheduler.rank(self.agents, exclude=[exclude_agent])
+        current_span().set_attribute("agents", len(agents))
+        self.metrics["fan_outs"] += 1
         
-        # Create tasks for each agent
-        tasks = []
-        for agent in agents:
-            task = asyncio.create_task(agent.extract_price(url, download_speed, plan_name))
-            tasks.append(task)
-            
-        # Wait for all tasks to complete
-        results = []
-        for task in asyncio.as_completed(tasks):
-            try:
-                result = await task
+        # Tasks are created in scheduler order so the preferred agents start first
+        tasks = [
+            asyncio.ensure_future(agent.extract_price(url, download_speed, plan_name))
+            for agent in agents
+        ]
+        
+        try:
+            for task in asyncio.as_completed(tasks):
+                try:
+                    result = await task
+                except Exception:
+                    continue
                 if "error" not in result:
-                    results.append(result)
-            except:
-                continue
-                
-        return results
+                    return result
+            return None
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+                    self.metrics["cancelled_agent_requests"] += 1
         
     def _update_metrics(self, elapsed_time: float, success: bool):
         """Update performance metrics."""
@@ -179,5 +367,6 @@ class RoundRobinDistributor:
         """Get system load and performance metrics."""
         return {
             **self.metrics,
+            "scheduler": self.scheduler.name,
             "agent_metrics": [agent.metrics for agent in self.agents]
         }
@@ -0,0 +1,99 @@
+from typing import Any, Optional, List, Iterable
+import random
+from ..config import FALLBACK_SCHEDULER
+
+class SchedulingPolicy:
+    """
+    Picks the scraper agent for the next request from the agents' metrics.
+
+    Policies read the per-agent metrics dicts maintained by ScraperAgent
+    (in_flight, ewma_latency, successful_extractions, failed_extractions) and
+    prefer agents below their concurrency cap.
+    """
+
+    name = "base"
+
+    def __init__(self, seed: Optional[int] = None):
+        self.random = random.Random(seed)
+
+    def select(self, agents: List[Any], exclude: Iterable[int] = ()) -> Any:
+        """Agent to run the next request."""
+        candidates = self._candidates(agents, exclude)
+        return self._pick(candidates)
+
+    def rank(self, agents: List[Any], exclude: Iterable[int] = ()) -> List[Any]:
+        """All eligible agents, best first, for fan-out."""
+        candidates = self._candidates(agents, exclude)
+        return sorted(candidates, key=self._score)
+
+    def _candidates(self, agents: List[Any], exclude: Iterable[int]) -> List[Any]:
+        excluded = set(exclude)
+        candidates = [agent for agent in agents if agent.agent_id not in excluded]
+        if not candidates:
+            raise ValueError("No agents available for scheduling")
+        # Saturated agents are only used when every agent is at its cap
+        available = [agent for agent in candidates if not agent.saturated]
+        return available or candidates
+
+    def _pick(self, candidates: List[Any]) -> Any:
+        return min(candidates, key=self._score)
+
+    def _score(self, agent: Any) -> float:
+        """Lower is better."""
+        raise NotImplementedError
+
+class LeastOutstandingPolicy(SchedulingPolicy):
+    """Agent with the fewest in-flight requests; ties go to the lowest EWMA latency."""
+
+    name = "least_outstanding"
+
+    def _score(self, agent: Any):
+        return (agent.metrics["in_flight"], agent.metrics["ewma_latency"])
+
+class EWMAPowerOfTwoPolicy(SchedulingPolicy):
+    """
+    Power of two choices on EWMA latency weighted by load.
+
+    Two random candidates are compared on ewma_latency * (in_flight + 1),
+    which avoids herding every request onto the single fastest agent.
+    """
+
+    name = "ewma_p2c"
+
+    def _pick(self, candidates: List[Any]) -> Any:
+        if len(candidates) < 3:
+            return min(candidates, key=self._score)
+        return min(self.random.sample(candidates, 2), key=self._score)
+
+    def _score(self, agent: Any) -> float:
+        return agent.metrics["ewma_latency"] * (agent.metrics["in_flight"] + 1)
+
+class SuccessWeightedPolicy(SchedulingPolicy):
+    """Random pick weighted by each agent's smoothed success rate and load."""
+
+    name = "success_weighted"
+
+    def _pick(self, candidates: List[Any]) -> Any:
+        weights = [self._weight(agent) for agent in candidates]
+        return self.random.choices(candidates, weights=weights, k=1)[0]
+
+    def _weight(self, agent: Any) -> float:
+        metrics = agent.metrics
+        # Laplace smoothing so new agents start at 0.5 rather than 0 or 1
+        attempts = metrics["successful_extractions"] + metrics["failed_extractions"]
+        success_rate = (metrics["successful_extractions"] + 1) / (attempts + 2)
+        return success_rate / (metrics["in_flight"] + 1)
+
+    def _score(self, agent: Any) -> float:
+        return -self._weight(agent)
+
+SCHEDULING_POLICIES = {
+    policy.name: policy
+    for policy in (LeastOutstandingPolicy, EWMAPowerOfTwoPolicy, SuccessWeightedPolicy)
+}
+
+def get_scheduling_policy(name: str = FALLBACK_SCHEDULER, seed: Optional[int] = None) -> SchedulingPolicy:
+    """Scheduling policy by name."""
+    if name not in SCHEDULING_POLICIES:
+        raise ValueError(f"Unknown scheduling policy: {name}")
+    return SCHEDULING_POLICIES[name](seed=seed)
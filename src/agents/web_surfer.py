@@ -1,20 +1,31 @@
 from typing import Dict, Any, Optional
 import time
-from autogen_ext.agents.web_surfer import MultimodalWebSurfer
-from autogen_ext.models.openai import OpenAIChatCompletionClient
-from bs4 import BeautifulSoup
-import requests
-from ..config import VERIFICATION_CONFIDENCE, MODEL_NAME
+from ..config import (
+    VERIFICATION_CONFIDENCE, MODEL_NAME, STREAM_PARSING, EXTRACTION_TEMPLATES, PLAN_TABLES, INCREMENTAL_EXTRACTION
+)
+from ..utils.pages import PageLoader, get_page_loader
+from ..utils.templates import TemplateStore, get_template_store
+from ..utils.snapshots import SnapshotStore, get_snapshot_store
+from ..utils.plan_table import PlanTable, PlanTableCache, get_plan_table_cache
+from ..utils.latency import get_latency_recorder
+from ..utils.tracing import traced, current_span
+from ..utils.extraction import PageIndex, ContainerIndex, ROLE_PLAN
 
 class WebSurferAgent:
     """Agent for web interaction and content processing using MultimodalWebSurfer."""
     
-    def __init__(self):
+    def __init__(self, loader: Optional[PageLoader] = None, stream_parsing: bool = STREAM_PARSING,
+                 templates: Optional[TemplateStore] = None, plan_tables: Optional[PlanTableCache] = None,
+                 snapshots: Optional[SnapshotStore] = None):
         """Initialize web surfer agent."""
-        self.web_surfer = MultimodalWebSurfer(
-            name="MultimodalWebSurfer",
-            model_client=OpenAIChatCompletionClient(model=MODEL_NAME),
-        )
+        self.loader = loader or get_page_loader()
+        self.engine = self.loader.engine
+        self.stream_parsing = stream_parsing
+        self.templates = templates or (get_template_store() if EXTRACTION_TEMPLATES else None)
+        self.plan_tables = plan_tables or (get_plan_table_cache() if PLAN_TABLES else None)
+        self.snapshots = snapshots or (get_snapshot_store() if INCREMENTAL_EXTRACTION else None)
+        self.latency = get_latency_recorder()
+        self._web_surfer = None
         self.metrics = {
             "pages_processed": 0,
             "successful_extractions": 0,
@@ -23,6 +34,23 @@ class WebSurferAgent:
             "total_load_time": 0.0
         }
         
+    @property
+    def web_surfer(self):
+        """Browser agent, created on first access since it pulls in autogen and a model client."""
+        if self._web_surfer is None:
+            from autogen_ext.agents.web_surfer import MultimodalWebSurfer
+            from autogen_ext.models.openai import OpenAIChatCompletionClient
+            self._web_surfer = MultimodalWebSurfer(
+                name="MultimodalWebSurfer",
+                model_client=OpenAIChatCompletionClient(model=MODEL_NAME),
+            )
+        return self._web_surfer
+        
+    @web_surfer.setter
+    def web_surfer(self, web_surfer):
+        self._web_surfer = web_surfer
+        
+    @traced("web_surfer.process_content")
     async def process_content(self, url: str, download_speed: Optional[float] = None, plan_name: Optional[str] = None) -> Dict[str, Any]:
         """
         Process web content from given URL.
@@ -35,199 +63,174 @@ class WebSurferAgent:
         Returns:
             Dict containing processed content and metadata
         """
-        start_time = time.time()
+        start_time = time.monotonic()
         
         try:
-            # First try with MultimodalWebSurfer
-            content = await self.web_surfer.browse(url)
+            # A fresh plan table of the page answers any speed or plan name without loading it again
+            table = self.plan_tables.get("web_surfer", url) if self.plan_tables is not None else None
+            if table is not None:
+                with self.latency.time("extract"):
+                    data = self._table_result(table, download_speed, plan_name)
+                current_span().set_attributes(url=url, plan_table=True, found="error" not in data)
+                self._update_metrics(time.monotonic() - start_time, success=True)
+                return data
+            
+            # The domain's template reads its container without loading and scanning the whole page
+            content = None
+            if self.templates is not None:
+                container, content = await self.templates.load(
+                    self.loader, url, TemplateStore.make_key("web_surfer", download_speed, plan_name),
+                    validate=lambda c: self._is_confident_match(c, download_speed, plan_name)
+                )
+                if container is not None:
+                    with self.latency.time("extract"):
+                        data = self._plan_result(self.engine.extract_plan(container))
+                    current_span().set_attributes(url=url, template=True, found=True)
+                    self._update_metrics(time.monotonic() - start_time, success=True)
+                    return data
+            
+            # First try with MultimodalWebSurfer, unless the template that missed already downloaded the page
+            if content is None:
+                content = await self.web_surfer.browse(url)
             
-            # If that fails, fallback to basic requests
-            if not content:
-                response = requests.get(url)
-                response.raise_for_status()
-                content = response.text
+            # If that fails, fallback to the shared page loader
+            if content:
+                page = await self.loader.parse(content, url)
+            elif self.stream_parsing:
+                page = await self.loader.stream(
+                    url,
+                    stop=lambda container: self._is_confident_match(container, download_speed, plan_name),
+                    flight_key=f"web_surfer|{download_speed}|{plan_name}"
+                )
+            else:
+                page = await self.loader.load(url)
                 
+            if self.snapshots is not None and page.content is not None:
+                await self.snapshots.load(url)
             # Parse the content
-            data = await self._extract_plan_information(content, download_speed, plan_name)
+            with self.latency.time("extract"):
+                # Streamed pages stop early, so only fully loaded pages can be diffed against the snapshot
+                plans = None
+                if self.snapshots is not None and page.content is not None:
+                    plans = self.snapshots.observe(url, page.index)[0]
+                data = await self._extract_plan_information(page.index, download_speed, plan_name, url=url,
+                                                            lookup_template=False, plans=plans)
+                # Streamed pages stop early, so only fully loaded pages make a complete table
+                if self.plan_tables is not None and page.content is not None:
+                    self.plan_tables.put("web_surfer", url,
+                                         plans if plans is not None else self.engine.extract_plans(page.index))
+            current_span().set_attributes(url=url, parser=page.parser, containers=len(page.index.containers),
+                                          found="error" not in data)
             
             # Update metrics
-            elapsed_time = time.time() - start_time
+            elapsed_time = time.monotonic() - start_time
             self._update_metrics(elapsed_time, success=True)
             
             return data
             
         except Exception as e:
-            self._update_metrics(time.time() - start_time, success=False)
+            self._update_metrics(time.monotonic() - start_time, success=False)
             raise Exception(f"Web content processing failed: {str(e)}")
             
-    async def _extract_plan_information(self, content: str, download_speed: Optional[float], plan_name: Optional[str]) -> Dict[str, Any]:
-        """Extract relevant plan information from content."""
+    async def _extract_plan_information(self, content, download_speed: Optional[float], plan_name: Optional[str],
+                                        url: Optional[str] = None, lookup_template: bool = True,
+                                        plans: Optional[list] = None) -> Dict[str, Any]:
+        """
+        Extract relevant plan information from raw HTML, a parsed tree or a page index.
+
+        With a url, the domain's extraction template is tried before scanning
+        every plan (unless lookup_template is False because the caller already
+        tried it), and a confident full-scan match is learned as the new template.
+        plans, one per plan container (e.g. from the snapshot store), are used
+        instead of extracting each container again.
+        """
         try:
-            soup = BeautifulSoup(content, 'html.parser')
+            index = content if isinstance(content, PageIndex) else self.engine.index(content)
             
-            # Extract all potential plan elements
-            plans = []
+            use_templates = url is not None and self.templates is not None
+            if use_templates:
+                query = TemplateStore.make_key("web_surfer", download_speed, plan_name)
+            if use_templates and lookup_template:
+                container = self.templates.lookup(
+                    index, url, query,
+                    validate=lambda c: self._is_confident_match(c, download_speed, plan_name)
+                )
+                if container is not None:
+                    return self._plan_result(self.engine.extract_plan(container))
             
-            # Look for common plan container patterns
-            plan_containers = soup.find_all(['div', 'section'], class_=lambda x: x and any(
-                term in x.lower() for term in ['plan', 'package', 'pricing', 'subscription']
-            ))
-            
-            for container in plan_containers:
-                plan = {
-                    "name": self._extract_text(container, ['h1', 'h2', 'h3', '.plan-name', '.title']),
-                    "price": self._extract_price(container),
-                    "speed": self._extract_speed(container),
-                    "details": self._extract_details(container)
-                }
-                plans.append(plan)
+            # Extract all potential plan elements in one indexed pass
+            containers = index.plan_containers()
+            if plans is None:
+                plans = [self.engine.extract_plan(container) for container in containers]
             
             # Filter plans based on criteria
             matching_plans = self._filter_plans(plans, download_speed, plan_name)
             
             if not matching_plans:
-                return {
-                    "error": "No matching plans found",
-                    "confidence": 0.0,
-                    "extracted_plans": plans
-                }
+                nearest = None
+                if download_speed:
+                    nearest = min((plan for plan in plans if plan["speed"] is not None),
+                                  key=lambda plan: abs(plan["speed"] - download_speed), default=None)
+                return self._no_match(plans, nearest)
             
             # Return best matching plan
             best_match = matching_plans[0]
-            return {
-                "name": best_match["name"],
-                "price": best_match["price"],
-                "speed": best_match["speed"],
-                "details": best_match["details"],
-                "confidence": self._calculate_confidence(best_match)
-            }
+            if use_templates and self._calculate_confidence(best_match) >= VERIFICATION_CONFIDENCE:
+                container = next(c for c, plan in zip(containers, plans) if plan is best_match)
+                self.templates.learn(url, query, container)
+            return self._plan_result(best_match)
             
         except Exception as e:
             raise ValueError(f"Failed to extract plan information: {str(e)}")
             
-    def _extract_text(self, container, selectors) -> Optional[str]:
-        """Extract text using multiple possible selectors."""
-        for selector in selectors:
-            element = container.find(selector) if selector in ['h1', 'h2', 'h3'] else container.select_one(selector)
-            if element and element.text.strip():
-                return element.text.strip()
-        return None
+    def _table_result(self, table: PlanTable, download_speed: Optional[float],
+                      plan_name: Optional[str]) -> Dict[str, Any]:
+        """Answer a query from a page's plan table: speed range and name lookups, then the usual filter."""
+        matching_plans = self._filter_plans(table.lookup(download_speed, plan_name), download_speed, plan_name)
+        if not matching_plans:
+            return self._no_match(table.records, table.nearest(download_speed) if download_speed else None)
+        return self._plan_result(matching_plans[0])
+        
+    def _no_match(self, plans: list, nearest: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Response when no plan answers the query, with the plan closest to the wanted speed."""
+        result = {
+            "error": "No matching plans found",
+            "confidence": 0.0,
+            "extracted_plans": plans
+        }
+        if nearest is not None:
+            result["nearest_plan"] = nearest
+        return result
         
+    def _plan_result(self, best_match: Dict[str, Any]) -> Dict[str, Any]:
+        """Response for the plan that answers the query."""
+        return {
+            "name": best_match["name"],
+            "price": best_match["price"],
+            "speed": best_match["speed"],
+            "details": best_match["details"],
+            "confidence": self._calculate_confidence(best_match)
+        }
+            
     def _extract_price(self, container) -> Optional[float]:
         """Extract price from container."""
-        import re
-        
-        # Look for price elements first
-        price_elements = container.find_all(class_=lambda x: x and any(
-            term in x.lower() for term in ['price', 'cost', 'amount', 'fee']
-        ))
-        
-        # Combine with general container text
-        text_to_search = ' '.join([
-            elem.text for elem in price_elements
-        ] + [container.text])
-        
-        price_patterns = [
-            r'\$(\d+\.?\d*)',  # $XX.XX
-            r'(\d+\.?\d*)\s*/\s*mo',  # XX.XX /mo
-            r'(\d+\.?\d*)\s*per\s*month',  # XX.XX per month
-            r'(\d+\.?\d*)/month',  # XX.XX/month
-            r'(\d+\.?\d*)\s*monthly'  # XX.XX monthly
-        ]
-        
-        for pattern in price_patterns:
-            match = re.search(pattern, text_to_search, re.IGNORECASE)
-            if match:
-                try:
-                    return float(match.group(1))
-                except (ValueError, IndexError):
-                    continue
-        
-        return None
+        return self.engine.extract_price(self.engine.index_container(container))
         
     def _extract_speed(self, container) -> Optional[float]:
         """Extract speed from container."""
-        import re
-        
-        # Look for speed elements first
-        speed_elements = container.find_all(class_=lambda x: x and any(
-            term in x.lower() for term in ['speed', 'bandwidth', 'download', 'mbps']
-        ))
-        
-        # Combine with general container text
-        text_to_search = ' '.join([
-            elem.text for elem in speed_elements
-        ] + [container.text])
-        
-        speed_patterns = [
-            r'(\d+\.?\d*)\s*mbps',
-            r'(\d+\.?\d*)\s*mb/s',
-            r'(\d+\.?\d*)\s*mbit',
-            r'(\d+\.?\d*)\s*megabits?(?:\s*per\s*second)?',
-            r'download(?:\s*speed)?\s*(?:of\s*)?(\d+\.?\d*)',
-            r'(\d+\.?\d*)\s*download'
-        ]
-        
-        for pattern in speed_patterns:
-            match = re.search(pattern, text_to_search, re.IGNORECASE)
-            if match:
-                try:
-                    return float(match.group(1))
-                except (ValueError, IndexError):
-                    continue
-        
-        return None
+        return self.engine.extract_speed(self.engine.index_container(container))
         
     def _extract_details(self, container) -> Dict[str, Any]:
         """Extract additional plan details."""
-        details = {}
-        
-        # Common features to look for
-        feature_patterns = {
-            "contract_length": r'(?:(\d+)\s*(?:month|year)|no\s*contract)',
-            "setup_fee": r'setup\s*fee\s*\$?(\d+\.?\d*)',
-            "data_limit": r'(\d+)\s*(?:gb|tb)|unlimited',
-            "extras": r'includes?\s*(.*?)(?:\.|$)',
-        }
-        
-        # Look for feature elements
-        feature_elements = container.find_all(class_=lambda x: x and any(
-            term in x.lower() for term in ['feature', 'benefit', 'include']
-        ))
-        
-        text_to_search = ' '.join([
-            elem.text for elem in feature_elements
-        ] + [container.text])
-        
-        # Extract contract length
-        contract_match = re.search(feature_patterns["contract_length"], text_to_search, re.IGNORECASE)
-        if contract_match:
-            if "no contract" in contract_match.group(0).lower():
-                details["contract_length"] = "No contract"
-            else:
-                details["contract_length"] = f"{contract_match.group(1)} months"
-        
-        # Extract setup fee
-        setup_match = re.search(feature_patterns["setup_fee"], text_to_search, re.IGNORECASE)
-        if setup_match:
-            try:
-                details["setup_fee"] = float(setup_match.group(1))
-            except (ValueError, IndexError):
-                pass
+        return self.engine.extract_details(self.engine.index_container(container))
         
-        # Extract data limit
-        data_match = re.search(feature_patterns["data_limit"], text_to_search, re.IGNORECASE)
-        if data_match:
-            details["data_limit"] = "Unlimited" if "unlimited" in data_match.group(0).lower() else data_match.group(0)
-        
-        # Extract additional features
-        features = []
-        for feature in feature_elements:
-            features.append(feature.text.strip())
-        if features:
-            details["features"] = features
-            
-        return details
+    def _is_confident_match(self, container: ContainerIndex, download_speed: Optional[float], plan_name: Optional[str]) -> bool:
+        """Whether a completed container already answers the query (streaming early exit)."""
+        if not container.roles & ROLE_PLAN:
+            return False
+        plan = self.engine.extract_plan(container)
+        return (bool(self._filter_plans([plan], download_speed, plan_name))
+                and self._calculate_confidence(plan) >= VERIFICATION_CONFIDENCE)
         
     def _filter_plans(self, plans: list, download_speed: Optional[float], plan_name: Optional[str]) -> list:
         """Filter plans based on criteria."""
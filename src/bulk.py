@@ -0,0 +1,275 @@
+"""
+Bulk mode: run a CSV or JSONL file of queries through one PriceRetriever.
+
+Each input row has url, download_speed and optionally plan_name (CSV with a
+header row, or one JSON object per line). Results are appended to a JSONL
+file as they complete, one object per row:
+
+    {"row": 12, "url": ..., "download_speed": ..., "plan_name": ...,
+     "ok": true, "result": {...}, "elapsed": 1.93}
+
+Rows are dispatched per host: a row starts only when its host has a free
+permit and a global slot is free, so a host with a long backlog never
+holds slots that rows for other hosts could use. A malformed input line
+becomes a failed record for its row.
+
+The output doubles as the checkpoint: rerunning with the same output path
+skips rows already recorded there, so an interrupted run resumes where it
+stopped. Failed rows are retried on resume only with --retry-errors.
+
+Usage:
+    python -m src.bulk queries.csv results.jsonl [--concurrency 8] [--per-host 2] [--retry-errors]
+"""
+from typing import Dict, Any, Optional, Iterator, Set, List
+from collections import Counter, OrderedDict, deque
+from urllib.parse import urlsplit
+import argparse
+import asyncio
+import csv
+import json
+import os
+import sys
+import time
+from .config import BULK_CONCURRENCY, BULK_PER_HOST_CONCURRENCY, BULK_READ_AHEAD
+from .main import PriceRetriever
+
+def read_queries(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Rows of a CSV or JSONL query file, numbered from 0 in file order.
+
+    The format is taken from the extension (.jsonl/.ndjson/.json, else CSV).
+    Blank lines are skipped but still counted, so row numbers stay stable.
+    A JSONL line that is not a JSON object yields its row with an "error"
+    instead of the query fields.
+    """
+    jsonl = os.path.splitext(path)[1].lower() in (".jsonl", ".ndjson", ".json")
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        rows = (_json_row(line) for line in f) if jsonl else csv.DictReader(f)
+        for number, row in enumerate(rows):
+            if not row:
+                continue
+            if isinstance(row, str):
+                yield {"row": number, "url": "", "download_speed": None, "plan_name": None, "error": row}
+                continue
+            yield {
+                "row": number,
+                "url": (row.get("url") or "").strip(),
+                "download_speed": row.get("download_speed"),
+                "plan_name": (row.get("plan_name") or "").strip() or None
+            }
+
+def _json_row(line: str):
+    """A JSONL line as a dict, None if blank, or the reason it is not a query object."""
+    if not line.strip():
+        return None
+    try:
+        row = json.loads(line)
+    except ValueError as e:
+        return f"Malformed JSON line: {e}"
+    if not isinstance(row, dict):
+        return f"Expected a JSON object, got {type(row).__name__}"
+    return row
+
+def completed_rows(path: str, retry_errors: bool = False) -> Set[int]:
+    """Rows already recorded in an output file; failures count only without retry_errors."""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # A torn last line from an interrupted run; that row is simply redone
+                continue
+            if not isinstance(record, dict) or not isinstance(record.get("row"), int):
+                continue
+            if record.get("ok") or not retry_errors:
+                done.add(record["row"])
+    return done
+
+def ends_with_newline(path: str) -> bool:
+    with open(path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+class BulkRunner:
+    """Runs queries with bounded overall and per-host concurrency, streaming results as JSONL."""
+
+    def __init__(self,
+                 retriever: Optional[PriceRetriever] = None,
+                 concurrency: int = BULK_CONCURRENCY,
+                 per_host: int = BULK_PER_HOST_CONCURRENCY,
+                 read_ahead: int = BULK_READ_AHEAD):
+        self.retriever = retriever or PriceRetriever()
+        self.concurrency = max(1, concurrency)
+        self.per_host = max(1, per_host)
+        self.read_ahead = max(self.concurrency, read_ahead)
+        self.metrics = {
+            "rows": 0,
+            "skipped": 0,
+            "succeeded": 0,
+            "failed": 0,
+            "errors": Counter(),
+            "sources": Counter()
+        }
+        self._latencies: List[float] = []
+
+    @staticmethod
+    def host(query: Dict[str, Any]) -> str:
+        return urlsplit(query["url"]).netloc.lower()
+
+    async def run_query(self, query: Dict[str, Any]) -> Dict[str, Any]:
+        """Run one row and build its output record; failures are recorded, not raised."""
+        record = dict(query)
+        start_time = time.monotonic()
+        try:
+            if query.get("error"):
+                raise ValueError(query["error"])
+            if not query["url"]:
+                raise ValueError("Missing url")
+            download_speed = float(query["download_speed"])
+            result = await self.retriever.get_plan_price(query["url"], download_speed, query["plan_name"])
+        except Exception as e:
+            record.update(ok=False, error=f"{type(e).__name__}: {e}")
+            self.metrics["failed"] += 1
+            self.metrics["errors"][type(e).__name__] += 1
+        else:
+            record.update(ok=True, result=result)
+            self.metrics["succeeded"] += 1
+            self.metrics["sources"][result.get("source", "unknown")] += 1
+        record["elapsed"] = round(time.monotonic() - start_time, 4)
+        self._latencies.append(record["elapsed"])
+        return record
+
+    async def run(self, input_path: str, output_path: str, retry_errors: bool = False) -> Dict[str, Any]:
+        """
+        Process every row of input_path not already in output_path.
+
+        Up to read_ahead pending rows are buffered per host; hosts take turns
+        in first-seen order, each with at most per_host rows in flight and
+        at most concurrency rows in flight overall.
+
+        Args:
+            input_path: CSV or JSONL query file
+            output_path: JSONL results file, appended to and used as the checkpoint
+            retry_errors: Also rerun rows whose recorded attempt failed
+
+        Returns:
+            Run summary (see summary())
+        """
+        done = completed_rows(output_path, retry_errors)
+        rows = read_queries(input_path)
+        # Per-host FIFO of pending rows, bounded in total so a large input file is streamed
+        hosts: "OrderedDict[str, deque]" = OrderedDict()
+        host_active: Counter = Counter()
+        tasks: Dict[asyncio.Future, str] = {}
+        buffered = 0
+        exhausted = False
+        start_time = time.monotonic()
+
+        def fill():
+            nonlocal buffered, exhausted
+            while not exhausted and buffered < self.read_ahead:
+                query = next(rows, None)
+                if query is None:
+                    exhausted = True
+                    break
+                self.metrics["rows"] += 1
+                if query["row"] in done:
+                    self.metrics["skipped"] += 1
+                    continue
+                hosts.setdefault(self.host(query), deque()).append(query)
+                buffered += 1
+
+        def dispatch():
+            nonlocal buffered
+            progressed = True
+            while progressed and len(tasks) < self.concurrency:
+                progressed = False
+                for host in list(hosts):
+                    if len(tasks) >= self.concurrency:
+                        break
+                    if host_active[host] >= self.per_host:
+                        continue
+                    query = hosts[host].popleft()
+                    if not hosts[host]:
+                        del hosts[host]
+                    else:
+                        # Rotate so the next round starts with another host
+                        hosts.move_to_end(host)
+                    host_active[host] += 1
+                    buffered -= 1
+                    tasks[asyncio.ensure_future(self.run_query(query))] = host
+                    progressed = True
+
+        with open(output_path, "a", encoding="utf-8") as out:
+            if out.tell() and not ends_with_newline(output_path):
+                # Terminate a torn last line so the first new record is not glued onto it
+                out.write("\n")
+
+            try:
+                fill()
+                dispatch()
+                while tasks:
+                    finished, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                    for task in finished:
+                        host_active[tasks.pop(task)] -= 1
+                        out.write(json.dumps(task.result(), default=str) + "\n")
+                        # Flushed per row so an interruption loses at most the rows in flight
+                        out.flush()
+                    fill()
+                    dispatch()
+            finally:
+                for task in tasks:
+                    task.cancel()
+
+        return self.summary(time.monotonic() - start_time)
+
+    def summary(self, elapsed: float) -> Dict[str, Any]:
+        processed = self.metrics["succeeded"] + self.metrics["failed"]
+        latencies = sorted(self._latencies)
+
+        def percentile(quantile: float) -> Optional[float]:
+            if not latencies:
+                return None
+            return latencies[min(int(quantile * len(latencies)), len(latencies) - 1)]
+
+        return {
+            "rows": self.metrics["rows"],
+            "skipped": self.metrics["skipped"],
+            "processed": processed,
+            "succeeded": self.metrics["succeeded"],
+            "failed": self.metrics["failed"],
+            "error_rate": self.metrics["failed"] / processed if processed else 0.0,
+            "errors": dict(self.metrics["errors"]),
+            "sources": dict(self.metrics["sources"]),
+            "elapsed": round(elapsed, 3),
+            "throughput": round(processed / elapsed, 3) if elapsed else 0.0,
+            "latency_p50": percentile(0.5),
+            "latency_p95": percentile(0.95)
+        }
+
+async def run_bulk(args) -> Dict[str, Any]:
+    runner = BulkRunner(concurrency=args.concurrency, per_host=args.per_host, read_ahead=args.read_ahead)
+    try:
+        return await runner.run(args.input, args.output, retry_errors=args.retry_errors)
+    finally:
+        await runner.retriever.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a CSV/JSONL file of price queries")
+    parser.add_argument("input", help="CSV (with a header row) or JSONL file of url, download_speed, plan_name")
+    parser.add_argument("output", help="JSONL results file; rows already in it are skipped")
+    parser.add_argument("--concurrency", type=int, default=BULK_CONCURRENCY)
+    parser.add_argument("--per-host", type=int, default=BULK_PER_HOST_CONCURRENCY)
+    parser.add_argument("--read-ahead", type=int, default=BULK_READ_AHEAD,
+                        help="input rows buffered so idle hosts are not stuck behind a busy one")
+    parser.add_argument("--retry-errors", action="store_true", help="rerun rows that failed previously")
+    args = parser.parse_args()
+
+    summary = asyncio.run(run_bulk(args))
+    print(json.dumps(summary, indent=2), file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
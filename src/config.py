@@ -19,7 +19,152 @@ MODEL_NAME = os.getenv("MODEL_NAME", "gemini-2.0-flash")
 COST_THRESHOLD = float(os.getenv("COST_THRESHOLD", 5.0))
 VERIFICATION_CONFIDENCE = float(os.getenv("VERIFICATION_CONFIDENCE", 0.85))
 
+# Gemini pricing in USD per million (input, output) tokens
+MODEL_PRICING = {
+    "gemini-2.0-flash": (0.10, 0.40),
+    "gemini-2.0-flash-lite": (0.075, 0.30),
+    "gemini-1.5-flash": (0.075, 0.30),
+    "gemini-1.5-pro": (1.25, 5.00)
+}
+INPUT_TOKEN_COST = float(os.getenv("INPUT_TOKEN_COST", MODEL_PRICING.get(MODEL_NAME, (0.10, 0.40))[0]))
+OUTPUT_TOKEN_COST = float(os.getenv("OUTPUT_TOKEN_COST", MODEL_PRICING.get(MODEL_NAME, (0.10, 0.40))[1]))
+
+# Admission control for model calls: COST_THRESHOLD is the spend allowed per COST_BUDGET_WINDOW seconds
+COST_BUDGET_WINDOW = float(os.getenv("COST_BUDGET_WINDOW", 3600.0))
+MODEL_REQUESTS_PER_MINUTE = int(os.getenv("MODEL_REQUESTS_PER_MINUTE", 60))
+MODEL_TOKENS_PER_MINUTE = int(os.getenv("MODEL_TOKENS_PER_MINUTE", 1000000))
+ADMISSION_MAX_WAIT = float(os.getenv("ADMISSION_MAX_WAIT", 5.0))
+
+# Prompt compaction: send the model a digest of the page's plan cards instead of just the URL
+PROMPT_COMPACTION = os.getenv("PROMPT_COMPACTION", "true").lower() in ("1", "true", "yes")
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", 1500))
+PROMPT_MAX_CONTAINER_CHARS = int(os.getenv("PROMPT_MAX_CONTAINER_CHARS", 400))
+
+# Micro-batching of coordinator model calls: concurrent prompts collected for up to
+# MICROBATCH_WINDOW seconds are sent as one multi-query prompt
+MICRO_BATCHING = os.getenv("MICRO_BATCHING", "false").lower() in ("1", "true", "yes")
+MICROBATCH_WINDOW = float(os.getenv("MICROBATCH_WINDOW", 0.05))
+MICROBATCH_MAX_SIZE = int(os.getenv("MICROBATCH_MAX_SIZE", 8))
+MICROBATCH_MAX_TOKENS = int(os.getenv("MICROBATCH_MAX_TOKENS", 12000))
+
+# Hedged execution: start the fallback after HEDGE_DELAY seconds if the coordinator has not answered
+HEDGED_EXECUTION = os.getenv("HEDGED_EXECUTION", "false").lower() in ("1", "true", "yes")
+HEDGE_DELAY = float(os.getenv("HEDGE_DELAY", 2.0))
+
+# Fallback agent scheduling: least_outstanding, ewma_p2c or success_weighted
+FALLBACK_SCHEDULER = os.getenv("FALLBACK_SCHEDULER", "least_outstanding")
+AGENT_MAX_CONCURRENCY = int(os.getenv("AGENT_MAX_CONCURRENCY", 2))
+AGENT_EWMA_ALPHA = float(os.getenv("AGENT_EWMA_ALPHA", 0.3))
+
+# HTTP fetch configuration
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", 30.0))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", 10.0))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", 15.0))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", 100))
+HTTP_MAX_CONNECTIONS_PER_HOST = int(os.getenv("HTTP_MAX_CONNECTIONS_PER_HOST", 8))
+HTTP_KEEPALIVE_TIMEOUT = float(os.getenv("HTTP_KEEPALIVE_TIMEOUT", 30.0))
+HTTP_CHUNK_SIZE = int(os.getenv("HTTP_CHUNK_SIZE", 64 * 1024))
+HTTP_USER_AGENT = os.getenv("HTTP_USER_AGENT", "price-retriever/0.1")
+HTTP_MAX_BODY_BYTES = int(os.getenv("HTTP_MAX_BODY_BYTES", 8 * 1024 * 1024))
+
+# Page cache configuration (empty PAGE_CACHE_DIR disables the disk tier)
+PAGE_CACHE_MAX_BYTES = int(os.getenv("PAGE_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+PAGE_CACHE_DIR = os.getenv("PAGE_CACHE_DIR", ".cache/pages")
+PAGE_CACHE_DEFAULT_TTL = float(os.getenv("PAGE_CACHE_DEFAULT_TTL", 300.0))
+
+# HTML parser backend: auto, selectolax, lxml or html.parser
+HTML_PARSER = os.getenv("HTML_PARSER", "auto")
+
+# Parse mode: "thread" parses on the default executor, "process" on a pool of PARSE_WORKERS
+# processes; pages of PARSE_SHM_MIN_BYTES or more reach the workers through shared memory
+PARSE_MODE = os.getenv("PARSE_MODE", "thread")
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", os.cpu_count() or 1))
+PARSE_SHM_MIN_BYTES = int(os.getenv("PARSE_SHM_MIN_BYTES", 64 * 1024))
+PARSE_START_METHOD = os.getenv("PARSE_START_METHOD", "spawn")
+
+# Streaming parse mode: incremental, size-capped parsing with early exit
+STREAM_PARSING = os.getenv("STREAM_PARSING", "false").lower() in ("1", "true", "yes")
+STREAM_MAX_BYTES = int(os.getenv("STREAM_MAX_BYTES", 2 * 1024 * 1024))
+STREAM_SKIP_TAGS = frozenset(
+    tag.strip() for tag in os.getenv(
+        "STREAM_SKIP_TAGS", "head,script,style,svg,noscript,template,iframe,canvas,nav,footer"
+    ).split(",") if tag.strip()
+)
+
+# Coordinator result cache (empty RESULT_CACHE_DIR disables the disk tier)
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", 24 * 3600.0))
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", 4096))
+RESULT_CACHE_DIR = os.getenv("RESULT_CACHE_DIR", ".cache/results")
+
+# Per-domain extraction templates; changes are written at most every TEMPLATE_SAVE_INTERVAL seconds
+EXTRACTION_TEMPLATES = os.getenv("EXTRACTION_TEMPLATES", "true").lower() in ("1", "true", "yes")
+TEMPLATE_STORE_PATH = os.getenv("TEMPLATE_STORE_PATH", ".cache/templates.json")
+TEMPLATE_SAVE_INTERVAL = float(os.getenv("TEMPLATE_SAVE_INTERVAL", 5.0))
+
+# Incremental re-extraction: per-URL plan container fingerprints and extracted plans
+INCREMENTAL_EXTRACTION = os.getenv("INCREMENTAL_EXTRACTION", "true").lower() in ("1", "true", "yes")
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", ".cache/snapshots")
+SNAPSHOT_MAX_ENTRIES = int(os.getenv("SNAPSHOT_MAX_ENTRIES", 4096))
+
+# Price history: get_plan_price observations in columnar segment files under PRICE_HISTORY_DIR,
+# written every PRICE_HISTORY_FLUSH_ROWS rows and compacted beyond PRICE_HISTORY_MAX_SEGMENTS files
+PRICE_HISTORY = os.getenv("PRICE_HISTORY", "false").lower() in ("1", "true", "yes")
+PRICE_HISTORY_DIR = os.getenv("PRICE_HISTORY_DIR", ".cache/history")
+PRICE_HISTORY_FLUSH_ROWS = int(os.getenv("PRICE_HISTORY_FLUSH_ROWS", 1000))
+PRICE_HISTORY_MAX_SEGMENTS = int(os.getenv("PRICE_HISTORY_MAX_SEGMENTS", 64))
+
+# Per-URL plan tables: every extracted plan of a page, indexed by speed and name, answers
+# later queries on the page for PLAN_TABLE_TTL seconds without another fetch
+PLAN_TABLES = os.getenv("PLAN_TABLES", "true").lower() in ("1", "true", "yes")
+PLAN_TABLE_TTL = float(os.getenv("PLAN_TABLE_TTL", 300.0))
+PLAN_TABLE_MAX_ENTRIES = int(os.getenv("PLAN_TABLE_MAX_ENTRIES", 1024))
+
+# Request tracing and slow-request profiling (SLOW_REQUEST_PROFILER: off, cprofile or sampling)
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "true").lower() in ("1", "true", "yes")
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", 100))
+SLOW_REQUEST_PROFILER = os.getenv("SLOW_REQUEST_PROFILER", "off")
+SLOW_REQUEST_THRESHOLD = float(os.getenv("SLOW_REQUEST_THRESHOLD", 10.0))
+PROFILE_DIR = os.getenv("PROFILE_DIR", ".cache/profiles")
+PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", 0.005))
+
+# Skip the model coordinator and answer every request from the scraper fallback
+FALLBACK_ONLY = os.getenv("FALLBACK_ONLY", "false").lower() in ("1", "true", "yes")
+
+# Batch API (PriceRetriever.get_plan_prices): pages in flight overall and per site host
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", 8))
+BATCH_PER_HOST_CONCURRENCY = int(os.getenv("BATCH_PER_HOST_CONCURRENCY", 2))
+
+# Service mode: worker count, bounded priority queue and shutdown drain
+SERVICE_HOST = os.getenv("SERVICE_HOST", "127.0.0.1")
+SERVICE_PORT = int(os.getenv("SERVICE_PORT", 8080))
+SERVICE_WORKERS = int(os.getenv("SERVICE_WORKERS", 8))
+SERVICE_QUEUE_SIZE = int(os.getenv("SERVICE_QUEUE_SIZE", 64))
+SERVICE_MAX_QUEUE_WAIT = float(os.getenv("SERVICE_MAX_QUEUE_WAIT", 10.0))
+SERVICE_DRAIN_TIMEOUT = float(os.getenv("SERVICE_DRAIN_TIMEOUT", 30.0))
+
+# Bulk mode: concurrent queries overall and per site host; up to BULK_READ_AHEAD input rows are
+# buffered so rows for idle hosts can start while a busy host's rows wait
+BULK_CONCURRENCY = int(os.getenv("BULK_CONCURRENCY", 8))
+BULK_PER_HOST_CONCURRENCY = int(os.getenv("BULK_PER_HOST_CONCURRENCY", 2))
+BULK_READ_AHEAD = int(os.getenv("BULK_READ_AHEAD", 10000))
+
+# Refresh scheduler: check intervals follow each page's change rate, within per-host limits.
+# REFRESH_HOST_RPM counts checks, and a check makes up to two requests to the host (one when cached)
+REFRESH_STATE_PATH = os.getenv("REFRESH_STATE_PATH", ".cache/refresh.json")
+REFRESH_CONCURRENCY = int(os.getenv("REFRESH_CONCURRENCY", 8))
+REFRESH_HOST_CONCURRENCY = int(os.getenv("REFRESH_HOST_CONCURRENCY", 2))
+REFRESH_HOST_RPM = float(os.getenv("REFRESH_HOST_RPM", 30))
+REFRESH_MIN_INTERVAL = float(os.getenv("REFRESH_MIN_INTERVAL", 300.0))
+REFRESH_MAX_INTERVAL = float(os.getenv("REFRESH_MAX_INTERVAL", 7 * 24 * 3600.0))
+REFRESH_CHANGE_THRESHOLD = float(os.getenv("REFRESH_CHANGE_THRESHOLD", 0.5))
+REFRESH_BACKOFF_BASE = float(os.getenv("REFRESH_BACKOFF_BASE", 30.0))
+REFRESH_BACKOFF_MAX = float(os.getenv("REFRESH_BACKOFF_MAX", 3600.0))
+
 # API configuration
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-if not GOOGLE_API_KEY:
-    raise ValueError("GOOGLE_API_KEY environment variable is required")
+
+def require_google_api_key() -> str:
+    """GOOGLE_API_KEY, validated when the model is first needed rather than at import."""
+    if not GOOGLE_API_KEY:
+        raise ValueError("GOOGLE_API_KEY environment variable is required")
+    return GOOGLE_API_KEY
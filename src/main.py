@@ -1,15 +1,73 @@
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, AsyncIterator, Iterable, Union, Sequence
+from collections import OrderedDict, deque
+from urllib.parse import urlsplit
+import asyncio
+import time
+from .config import (HEDGED_EXECUTION, HEDGE_DELAY, VERIFICATION_CONFIDENCE, FALLBACK_ONLY,
+                     BATCH_CONCURRENCY, BATCH_PER_HOST_CONCURRENCY, PRICE_HISTORY)
 from .agents.coordinator import MagenticCoordinator
 from .agents.web_surfer import WebSurferAgent
 from .agents.fallback import RoundRobinDistributor
+from .utils.fetcher import FetchError
+from .utils.pages import get_page_loader
+from .utils.templates import get_template_store
+from .utils.singleflight import canonicalize_url
+from .utils.snapshots import get_snapshot_store
+from .utils.history import PriceHistory, get_price_history
+from .utils.plan_table import get_plan_table_cache
+from .utils.latency import get_latency_recorder, prometheus_gauges
+from .utils.tracing import get_tracer
+from .utils.profiling import SlowRequestProfiler
 
 class PriceRetriever:
     """Main entry point for internet plan price retrieval."""
     
-    def __init__(self):
-        self.coordinator = MagenticCoordinator()
-        self.web_surfer = WebSurferAgent()
-        self.fallback = RoundRobinDistributor()
+    def __init__(self, hedged: bool = HEDGED_EXECUTION, hedge_delay: float = HEDGE_DELAY,
+                 fallback_only: bool = FALLBACK_ONLY,
+                 history: Optional[PriceHistory] = None):
+        self.hedged = hedged
+        self.fallback_only = fallback_only
+        self.hedge_delay = hedge_delay
+        self.metrics = {
+            "hedged_requests": 0,
+            "fallback_launched": 0,
+            "coordinator_wins": 0,
+            "fallback_wins": 0,
+            "batches": 0,
+            "batch_queries": 0,
+            "batch_timeouts": 0,
+            "history_flush_errors": 0
+        }
+        self.latency = get_latency_recorder()
+        self.tracer = get_tracer()
+        self.profiler = SlowRequestProfiler()
+        self.pages = get_page_loader()
+        self.fetcher = self.pages.fetcher
+        # Every retrieved price is appended to the history when one is configured (an empty one is falsy)
+        self.history = history if history is not None else (get_price_history() if PRICE_HISTORY else None)
+        self._history_flush: Optional[asyncio.Future] = None
+        # Agents are built on first use so fallback-only runs never construct the model side
+        self._coordinator = None
+        self._web_surfer = None
+        self._fallback = None
+        
+    @property
+    def coordinator(self) -> MagenticCoordinator:
+        if self._coordinator is None:
+            self._coordinator = MagenticCoordinator(loader=self.pages)
+        return self._coordinator
+        
+    @property
+    def web_surfer(self) -> WebSurferAgent:
+        if self._web_surfer is None:
+            self._web_surfer = WebSurferAgent(loader=self.pages)
+        return self._web_surfer
+        
+    @property
+    def fallback(self) -> RoundRobinDistributor:
+        if self._fallback is None:
+            self._fallback = RoundRobinDistributor(loader=self.pages)
+        return self._fallback
         
     async def get_plan_price(self,
                            url: str,
@@ -30,7 +88,162 @@ class PriceRetriever:
                 - source: Source of price (coordinator/fallback)
                 - computational_cost: Cost of operation
                 - details: Additional plan information
+                - hedge: Winning path and hedge delay (hedged mode only)
+                - trace_id: Id of the request trace (when tracing is enabled)
+                - changes: How the page's plans differ from its previous version
+                  (incremental extraction, when the page was fully loaded)
+        """
+        with self.tracer.span("get_plan_price", url=url, download_speed=download_speed,
+                              plan_name=plan_name) as span, self.profiler.profile(span):
+            result = await self._get_plan_price(url, download_speed, plan_name)
+            if self.history is not None:
+                self.history.record(url, download_speed, plan_name, result, flush=False)
+                self._flush_history()
+            span.set_attributes(source=result.get("source"), price=result.get("price"),
+                                confidence=result.get("confidence"))
+            if span.trace is not None:
+                result["trace_id"] = span.trace.trace_id
+            return result
+            
+    async def get_plan_prices(self,
+                              queries: Iterable[Union[Dict[str, Any], Sequence]],
+                              deadline: Optional[float] = None,
+                              concurrency: int = BATCH_CONCURRENCY,
+                              per_host: int = BATCH_PER_HOST_CONCURRENCY) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Retrieve prices for many queries, yielding each as soon as it completes.
+
+        Queries for the same canonical URL are grouped and started together,
+        so their page loads coalesce into one fetch and parse. Groups are
+        dispatched round-robin across hosts, with at most `concurrency` pages
+        in flight overall and `per_host` per host. Each query still makes its
+        own coordinator call; with MICRO_BATCHING a group's prompts arrive
+        together and can share one model call.
+
+        Args:
+            queries: Dicts with url, download_speed and optional plan_name,
+                or (url, download_speed[, plan_name]) tuples
+            deadline: Seconds for the whole batch; queries still unfinished
+                when it passes are cancelled and yielded as timed out
+            concurrency: Pages in flight across all hosts (at least 1)
+            per_host: Pages in flight per host (at least 1)
+
+        Yields:
+            Dict containing:
+                - index: Position of the query in `queries`
+                - url, download_speed, plan_name: The query
+                - ok: Whether a result was retrieved
+                - result: get_plan_price result (when ok)
+                - error: Error message (when not ok)
+                - timed_out: Whether the deadline cut the query off
+
+        Raises:
+            ValueError: If concurrency or per_host is below 1
         """
+        # Checked before any work: with no slots nothing would ever start and every query would time out
+        if concurrency < 1 or per_host < 1:
+            raise ValueError(f"concurrency and per_host must be at least 1 (got {concurrency} and {per_host})")
+        batch = [self._batch_query(index, query) for index, query in enumerate(queries)]
+        groups = OrderedDict()
+        for query in batch:
+            groups.setdefault(canonicalize_url(query["url"]), []).append(query)
+        # Per-host FIFO of URL groups; hosts take turns in first-seen order
+        hosts = OrderedDict()
+        for key, group in groups.items():
+            hosts.setdefault(urlsplit(key).netloc, deque()).append(group)
+
+        self.metrics["batches"] += 1
+        self.metrics["batch_queries"] += len(batch)
+        expires_at = time.monotonic() + deadline if deadline is not None else None
+        host_active = {host: 0 for host in hosts}
+        group_left = {}
+        tasks = {}
+        pages_in_flight = 0
+
+        def dispatch():
+            nonlocal pages_in_flight
+            progressed = True
+            while progressed and pages_in_flight < concurrency:
+                progressed = False
+                for host in list(hosts):
+                    if pages_in_flight >= concurrency:
+                        break
+                    if host_active[host] >= per_host:
+                        continue
+                    group = hosts[host].popleft()
+                    if not hosts[host]:
+                        del hosts[host]
+                    else:
+                        # Rotate so the next round starts with another host
+                        hosts.move_to_end(host)
+                    host_active[host] += 1
+                    pages_in_flight += 1
+                    group_left[id(group)] = len(group)
+                    for query in group:
+                        task = asyncio.ensure_future(self._run_batch_query(query))
+                        tasks[task] = (query, host, group)
+                    progressed = True
+
+        try:
+            dispatch()
+            while tasks:
+                timeout = None
+                if expires_at is not None:
+                    timeout = max(expires_at - time.monotonic(), 0)
+                done, _ = await asyncio.wait(tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    break
+                for task in done:
+                    query, host, group = tasks.pop(task)
+                    group_left[id(group)] -= 1
+                    if not group_left[id(group)]:
+                        host_active[host] -= 1
+                        pages_in_flight -= 1
+                    yield task.result()
+                dispatch()
+
+            # Deadline passed: report what is unfinished or never started
+            unfinished = [query for query, _, _ in tasks.values()]
+            unfinished += [query for queue in hosts.values() for group in queue for query in group]
+            for task in tasks:
+                task.cancel()
+            tasks.clear()
+            self.metrics["batch_timeouts"] += len(unfinished)
+            for query in sorted(unfinished, key=lambda query: query["index"]):
+                yield {**query, "ok": False, "error": "Batch deadline exceeded", "timed_out": True}
+        finally:
+            # Also reached when the caller stops iterating early
+            for task in tasks:
+                task.cancel()
+
+    @staticmethod
+    def _batch_query(index: int, query: Union[Dict[str, Any], Sequence]) -> Dict[str, Any]:
+        if isinstance(query, dict):
+            url, download_speed, plan_name = query["url"], query["download_speed"], query.get("plan_name")
+        else:
+            url, download_speed, plan_name = (tuple(query) + (None,))[:3]
+        return {"index": index, "url": url, "download_speed": float(download_speed), "plan_name": plan_name}
+
+    async def _run_batch_query(self, query: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            result = await self.get_plan_price(query["url"], query["download_speed"], query["plan_name"])
+        except Exception as e:
+            return {**query, "ok": False, "error": str(e), "timed_out": False}
+        return {**query, "ok": True, "result": result, "timed_out": False}
+
+    async def _get_plan_price(self, url: str, download_speed: float, plan_name: Optional[str]) -> Dict[str, Any]:
+        if self.fallback_only:
+            result = await self.fallback.process_request(
+                url=url,
+                download_speed=download_speed,
+                plan_name=plan_name
+            )
+            result["source"] = "fallback"
+            return result
+            
+        if self.hedged:
+            return await self._hedged_plan_price(url, download_speed, plan_name)
+            
         try:
             # Try primary coordinator first
             result = await self.coordinator.process_request(
@@ -42,24 +255,171 @@ class PriceRetriever:
             return result
         except Exception as e:
             # Fall back to round-robin system
-            result = await self.fallback.process_request(
-                url=url,
-                download_speed=download_speed,
-                plan_name=plan_name
-            )
+            try:
+                result = await self.fallback.process_request(
+                    url=url,
+                    download_speed=download_speed,
+                    plan_name=plan_name
+                )
+            except Exception as fallback_error:
+                # A page that could not be fetched is the real failure, whatever the fallback then hit
+                if isinstance(e, FetchError) and not isinstance(fallback_error, FetchError):
+                    raise e
+                raise
             result["source"] = "fallback"
             return result
             
+    async def _hedged_plan_price(self,
+                                 url: str,
+                                 download_speed: float,
+                                 plan_name: Optional[str]) -> Dict[str, Any]:
+        """
+        Race the coordinator against a delayed fallback.
+
+        The fallback starts once the hedge delay passes without a confident
+        coordinator answer, or at once if the coordinator fails first. The
+        first result clearing VERIFICATION_CONFIDENCE wins and the other path
+        is cancelled. If neither clears it, the most confident successful
+        result is returned; if both fail, a FetchError takes precedence.
+        """
+        start_time = time.monotonic()
+        self.metrics["hedged_requests"] += 1
+        tasks = {
+            asyncio.ensure_future(self._run_path("coordinator", self.coordinator.process_request,
+                                                 url, download_speed, plan_name)): "coordinator"
+        }
+        fallback_started_at = None
+        best = None
+        last_error = None
+        
+        try:
+            pending = set(tasks)
+            while pending:
+                timeout = None
+                if fallback_started_at is None:
+                    timeout = max(self.hedge_delay - (time.monotonic() - start_time), 0)
+                done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                
+                for task in done:
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        # Keep a fetch failure over later errors so callers see its status
+                        if not isinstance(last_error, FetchError):
+                            last_error = e
+                        continue
+                    if result.get("confidence", 0) >= VERIFICATION_CONFIDENCE:
+                        return self._hedge_result(result, tasks[task], start_time, fallback_started_at)
+                    if best is None or result.get("confidence", 0) > best[0].get("confidence", 0):
+                        best = (result, tasks[task])
+                        
+                # Launch the fallback on hedge timeout or when the coordinator is out of the race
+                if fallback_started_at is None and (not done or not pending):
+                    fallback_started_at = time.monotonic()
+                    self.metrics["fallback_launched"] += 1
+                    task = asyncio.ensure_future(self._run_path("fallback", self.fallback.process_request,
+                                                                url, download_speed, plan_name))
+                    tasks[task] = "fallback"
+                    pending.add(task)
+                    
+            if best is not None:
+                return self._hedge_result(best[0], best[1], start_time, fallback_started_at)
+            raise last_error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+                    
+    @staticmethod
+    async def _run_path(source: str, process, url: str, download_speed: float, plan_name: Optional[str]) -> Dict[str, Any]:
+        result = await process(url=url, download_speed=download_speed, plan_name=plan_name)
+        result["source"] = source
+        return result
+        
+    def _hedge_result(self, result: Dict[str, Any], source: str, start_time: float,
+                      fallback_started_at: Optional[float]) -> Dict[str, Any]:
+        """Annotate a hedged result with the winning path and hedge timing."""
+        self.metrics[f"{source}_wins"] += 1
+        result["hedge"] = {
+            "winner": source,
+            "hedge_delay": self.hedge_delay,
+            "fallback_started": fallback_started_at is not None,
+            "fallback_start_offset": (fallback_started_at - start_time) if fallback_started_at is not None else None,
+            "elapsed": time.monotonic() - start_time
+        }
+        return result
+            
     def get_system_status(self) -> Dict[str, Any]:
-        """Get overall system status and metrics."""
+        """
+        Get overall system status and metrics.
+
+        Agents not built yet report None instead of metrics: a status call
+        never constructs the model client or agents (see the properties above).
+        """
+        coordinator = self._coordinator
         return {
-            "coordinator_metrics": self.coordinator.monitor_performance(),
-            "web_surfer_metrics": self.web_surfer.get_performance_metrics(),
-            "fallback_metrics": self.fallback.get_system_load()
+            "retriever_metrics": self.metrics,
+            "coordinator_metrics": coordinator.monitor_performance() if coordinator is not None else None,
+            "admission_metrics": coordinator.admission.get_metrics() if coordinator is not None else None,
+            "web_surfer_metrics": (self._web_surfer.get_performance_metrics()
+                                   if self._web_surfer is not None else None),
+            "fallback_metrics": self._fallback.get_system_load() if self._fallback is not None else None,
+            "fetcher_metrics": self.fetcher.get_metrics(),
+            "page_loader_metrics": self.pages.get_metrics(),
+            "page_cache_metrics": self.fetcher.cache.get_metrics() if self.fetcher.cache else {},
+            "result_cache_metrics": coordinator.result_cache.get_metrics() if coordinator is not None else None,
+            "template_metrics": get_template_store().get_metrics(),
+            "snapshot_metrics": get_snapshot_store().get_metrics(),
+            "plan_table_metrics": get_plan_table_cache().get_metrics(),
+            "history_metrics": self.history.get_metrics() if self.history is not None else None,
+            "profiler_metrics": self.profiler.get_metrics(),
+            "latency": self.latency.snapshot()
         }
+        
+    def export_trace(self, trace_id: Optional[str] = None, format: str = "json") -> Optional[Dict[str, Any]]:
+        """Spans of a recent request (the latest by default) as "json" or "chrome" trace events."""
+        return self.tracer.export(trace_id, format)
+        
+    def export_prometheus(self) -> str:
+        """System status in Prometheus text format: stage latency summaries plus numeric metrics as gauges."""
+        status = self.get_system_status()
+        status.pop("latency")
+        return self.latency.to_prometheus() + prometheus_gauges(status)
+
+    def _flush_history(self):
+        """Start writing a history segment in a worker thread once one is due, unless one is being written."""
+        if not self.history.flush_due or (self._history_flush is not None and not self._history_flush.done()):
+            return
+        # Encoding and compacting segments is CPU and disk work; like page parsing it runs off the event loop
+        loop = asyncio.get_running_loop()
+        self._history_flush = loop.run_in_executor(None, self.history.flush)
+        self._history_flush.add_done_callback(self._history_flushed)
+        
+    def _history_flushed(self, future: asyncio.Future):
+        # Unsaved rows stay in memory and go out with the next flush
+        if not future.cancelled() and future.exception() is not None:
+            self.metrics["history_flush_errors"] += 1
+        
+    async def close(self):
+        """Release pooled network resources and write pending templates, history, cache entries and snapshots."""
+        if self._coordinator is not None:
+            await self._coordinator.close()
+        self.pages.close()
+        # Disk-tier writes queued by the caches land before the process exits
+        loop = asyncio.get_running_loop()
+        if self.fetcher.cache is not None:
+            await loop.run_in_executor(None, self.fetcher.cache.flush)
+        if self._coordinator is not None:
+            await loop.run_in_executor(None, self._coordinator.result_cache.flush)
+        await loop.run_in_executor(None, get_snapshot_store().flush)
+        get_template_store().flush()
+        if self.history is not None:
+            if self._history_flush is not None:
+                await asyncio.wait([self._history_flush])
+            self.history.flush()
+        await self.fetcher.close()
 
 if __name__ == "__main__":
-    import asyncio
     import sys
     
     async def main():
@@ -72,7 +432,10 @@ if __name__ == "__main__":
         plan_name = sys.argv[3] if len(sys.argv) > 3 else None
         
         retriever = PriceRetriever()
-        result = await retriever.get_plan_price(url, download_speed, plan_name)
-        print(f"Result: {result}")
+        try:
+            result = await retriever.get_plan_price(url, download_speed, plan_name)
+            print(f"Result: {result}")
+        finally:
+            await retriever.close()
         
     asyncio.run(main())
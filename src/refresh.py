@@ -0,0 +1,429 @@
+"""
+Staleness-driven refresh scheduler.
+
+Keeps a set of (url, download_speed, plan_name) targets fresh through one
+PriceRetriever. Each target's change rate is estimated from its history
+(changes seen per hour checked, smoothed towards a prior), and the target
+falls due once staleness x change rate, the expected number of changes
+missed, reaches REFRESH_CHANGE_THRESHOLD. Pages that never change drift
+towards REFRESH_MAX_INTERVAL and volatile ones towards REFRESH_MIN_INTERVAL.
+Due targets are served from a priority queue ordered by due time.
+
+Each host has a concurrency cap, a token-bucket check rate and its own
+backoff: an HTTP 429 or 503 pauses the whole host for Retry-After seconds,
+or exponentially longer on repeated throttling. Other failures back off the
+failing target only. State is saved to REFRESH_STATE_PATH so a restarted
+scheduler continues where it stopped.
+
+The rate limit counts checks, not HTTP requests. A check is one
+get_plan_price call: usually one page request, or none while the page
+cache holds the page fresh, but two (the coordinator's load, then the
+fallback's) for a page the cache will not store. Size --host-rpm as the
+host's request budget divided by two to be safe.
+
+Usage:
+    python -m src.refresh targets.csv [--concurrency 8] [--host-concurrency 2] [--host-rpm 30]
+"""
+from typing import Dict, Any, Optional, List, Tuple, Callable
+from urllib.parse import urlsplit
+import argparse
+import asyncio
+import heapq
+import itertools
+import json
+import os
+import random
+import sys
+import time
+from .config import (REFRESH_STATE_PATH, REFRESH_CONCURRENCY, REFRESH_HOST_CONCURRENCY, REFRESH_HOST_RPM,
+                     REFRESH_MIN_INTERVAL, REFRESH_MAX_INTERVAL, REFRESH_CHANGE_THRESHOLD,
+                     REFRESH_BACKOFF_BASE, REFRESH_BACKOFF_MAX)
+from .main import PriceRetriever
+from .utils.admission import TokenBucket
+from .utils.fetcher import FetchError
+from .utils.singleflight import canonicalize_url
+
+# Prior for the change rate: one change per day until history says otherwise
+PRIOR_CHANGES = 1.0
+PRIOR_HOURS = 24.0
+THROTTLE_STATUSES = (429, 503)
+# Minimum seconds between state writes while running
+SAVE_INTERVAL = 5.0
+
+class RefreshTarget:
+    """One query kept fresh, with its check history."""
+
+    def __init__(self, url: str, download_speed: float, plan_name: Optional[str] = None):
+        self.url = url
+        self.download_speed = float(download_speed)
+        self.plan_name = plan_name
+        self.first_checked: Optional[float] = None
+        self.last_checked: Optional[float] = None
+        self.checks = 0
+        self.changes = 0
+        self.failures = 0
+        self.last_price: Optional[float] = None
+        self.last_version: Optional[int] = None
+        self.last_error: Optional[str] = None
+        self.due_at = 0.0
+
+    @staticmethod
+    def make_key(url: str, download_speed: float, plan_name: Optional[str]) -> str:
+        return f"{canonicalize_url(url)}|{float(download_speed):g}|{(plan_name or '').strip().lower()}"
+
+    @property
+    def key(self) -> str:
+        return self.make_key(self.url, self.download_speed, self.plan_name)
+
+    @property
+    def host(self) -> str:
+        return urlsplit(canonicalize_url(self.url)).netloc
+
+    def change_rate(self) -> float:
+        """Estimated changes per hour."""
+        observed = 0.0
+        if self.first_checked is not None and self.last_checked is not None:
+            observed = (self.last_checked - self.first_checked) / 3600.0
+        return (self.changes + PRIOR_CHANGES) / (observed + PRIOR_HOURS)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {key: getattr(self, key) for key in (
+            "url", "download_speed", "plan_name", "first_checked", "last_checked", "checks", "changes",
+            "failures", "last_price", "last_version", "last_error", "due_at")}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "RefreshTarget":
+        target = cls(data["url"], data["download_speed"], data.get("plan_name"))
+        for key, value in data.items():
+            if hasattr(target, key) and key not in ("url", "download_speed", "plan_name"):
+                setattr(target, key, value)
+        return target
+
+class HostState:
+    """
+    Per-host politeness: in-flight checks, check rate and throttling backoff.
+
+    The token bucket is charged once per check when it starts, whatever the
+    number of requests the check ends up making (see the module docstring).
+    """
+
+    def __init__(self, requests_per_minute: float):
+        self.bucket = TokenBucket(requests_per_minute)
+        self.in_flight = 0
+        self.throttles = 0
+        self.backoff_until = 0.0
+
+    def ready_at(self, now: float, concurrency: int) -> Optional[float]:
+        """When a check may start (now if it may start at once; None while at the concurrency cap)."""
+        if self.in_flight >= concurrency:
+            return None
+        return max(now, self.backoff_until, now + self.bucket.wait_time(1))
+
+class RefreshScheduler:
+    """Runs due refresh targets through a PriceRetriever under per-host limits."""
+
+    def __init__(self,
+                 retriever: Optional[PriceRetriever] = None,
+                 state_path: Optional[str] = REFRESH_STATE_PATH,
+                 concurrency: int = REFRESH_CONCURRENCY,
+                 host_concurrency: int = REFRESH_HOST_CONCURRENCY,
+                 host_rpm: float = REFRESH_HOST_RPM,
+                 min_interval: float = REFRESH_MIN_INTERVAL,
+                 max_interval: float = REFRESH_MAX_INTERVAL,
+                 change_threshold: float = REFRESH_CHANGE_THRESHOLD,
+                 backoff_base: float = REFRESH_BACKOFF_BASE,
+                 backoff_max: float = REFRESH_BACKOFF_MAX,
+                 on_result: Optional[Callable[[RefreshTarget, Dict[str, Any], bool], Any]] = None):
+        self.retriever = retriever or PriceRetriever()
+        self.state_path = state_path or None
+        self.concurrency = max(1, concurrency)
+        self.host_concurrency = max(1, host_concurrency)
+        self.host_rpm = host_rpm
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.change_threshold = change_threshold
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.on_result = on_result
+        self.targets: Dict[str, RefreshTarget] = {}
+        self.hosts: Dict[str, HostState] = {}
+        # (due_at, sequence, key); each queued target appears once and is popped when dispatched
+        self._queue: List[Tuple[float, int, str]] = []
+        self._sequence = itertools.count()
+        self._tasks: Dict[asyncio.Task, RefreshTarget] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+        self._saved_at = 0.0
+        self.metrics = {
+            "checks": 0,
+            "changes": 0,
+            "failures": 0,
+            "throttled": 0,
+            "deferred": 0
+        }
+        self._load()
+
+    def add(self, url: str, download_speed: float, plan_name: Optional[str] = None) -> RefreshTarget:
+        """Track a target; new targets are due at once, known ones keep their history."""
+        key = RefreshTarget.make_key(url, download_speed, plan_name)
+        target = self.targets.get(key)
+        if target is None:
+            target = RefreshTarget(url, download_speed, plan_name)
+            self.targets[key] = target
+            self._push(target)
+        return target
+
+    def remove(self, url: str, download_speed: float, plan_name: Optional[str] = None):
+        # Its queue entry is skipped when popped
+        self.targets.pop(RefreshTarget.make_key(url, download_speed, plan_name), None)
+
+    def interval(self, target: RefreshTarget) -> float:
+        """Seconds between checks at which staleness x change rate reaches the threshold."""
+        seconds = self.change_threshold / target.change_rate() * 3600.0
+        return min(max(seconds, self.min_interval), self.max_interval)
+
+    def _push(self, target: RefreshTarget):
+        heapq.heappush(self._queue, (target.due_at, next(self._sequence), target.key))
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _host(self, host: str) -> HostState:
+        if host not in self.hosts:
+            self.hosts[host] = HostState(self.host_rpm)
+        return self.hosts[host]
+
+    def _dispatch(self, now: float) -> Optional[float]:
+        """Start every due target its host allows; returns when the next deferred one may start."""
+        deferred = []
+        next_ready = None
+        while self._queue and self._queue[0][0] <= now and len(self._tasks) < self.concurrency:
+            entry = heapq.heappop(self._queue)
+            target = self.targets.get(entry[2])
+            if target is None or target.due_at != entry[0]:
+                continue
+            host = self._host(target.host)
+            ready_at = host.ready_at(now, self.host_concurrency)
+            if ready_at is None or ready_at > now:
+                # Keep its place in the queue; a finishing check or the host's ready time wakes the loop
+                deferred.append(entry)
+                self.metrics["deferred"] += 1
+                if ready_at is not None:
+                    next_ready = ready_at if next_ready is None else min(next_ready, ready_at)
+                continue
+            host.bucket.take(1)
+            host.in_flight += 1
+            self._tasks[asyncio.ensure_future(self._check(target))] = target
+        for entry in deferred:
+            heapq.heappush(self._queue, entry)
+        if self._queue and self._queue[0][0] > now:
+            next_due = self._queue[0][0]
+            next_ready = next_due if next_ready is None else min(next_ready, next_due)
+        return next_ready
+
+    async def _check(self, target: RefreshTarget) -> Tuple[Optional[Dict[str, Any]], bool]:
+        try:
+            result = await self.retriever.get_plan_price(target.url, target.download_speed, target.plan_name)
+        except Exception as e:
+            self._record_failure(target, e)
+            return None, False
+        return result, self._record_result(target, result)
+
+    def _record_result(self, target: RefreshTarget, result: Dict[str, Any]) -> bool:
+        now = time.time()
+        price = result.get("price")
+        version = (result.get("changes") or {}).get("version")
+        changed = target.checks > 0 and (
+            price != target.last_price or
+            (version is not None and target.last_version is not None and version != target.last_version)
+        )
+        if target.first_checked is None:
+            target.first_checked = now
+        target.last_checked = now
+        target.checks += 1
+        target.changes += changed
+        target.failures = 0
+        target.last_error = None
+        target.last_price = price
+        if version is not None:
+            target.last_version = version
+        host = self._host(target.host)
+        host.throttles = 0
+        target.due_at = now + self.interval(target)
+        self.metrics["checks"] += 1
+        self.metrics["changes"] += changed
+        return changed
+
+    def _record_failure(self, target: RefreshTarget, error: Exception):
+        now = time.time()
+        target.last_error = str(error)
+        if isinstance(error, FetchError) and error.status in THROTTLE_STATUSES:
+            # The host is pushing back: pause all of its targets, not just this one
+            host = self._host(target.host)
+            host.throttles += 1
+            delay = error.retry_after
+            if delay is None:
+                delay = min(self.backoff_base * 2 ** (host.throttles - 1), self.backoff_max)
+                delay *= random.uniform(0.8, 1.2)
+            host.backoff_until = max(host.backoff_until, now + delay)
+            target.due_at = host.backoff_until
+            self.metrics["throttled"] += 1
+            return
+        target.failures += 1
+        delay = min(self.backoff_base * 2 ** (target.failures - 1), self.backoff_max, self.max_interval)
+        target.due_at = now + delay * random.uniform(0.8, 1.2)
+        self.metrics["failures"] += 1
+
+    def _complete(self, task: asyncio.Task):
+        target = self._tasks.pop(task)
+        self._host(target.host).in_flight -= 1
+        if task.cancelled():
+            return
+        result, changed = task.result()
+        if target.key in self.targets:
+            self._push(target)
+        if result is not None and self.on_result is not None:
+            self.on_result(target, result, changed)
+
+    async def run(self, stop: Optional[asyncio.Event] = None, max_checks: Optional[int] = None):
+        """
+        Refresh due targets until stopped.
+
+        Args:
+            stop: Event ending the run once set; in-flight checks are finished first
+            max_checks: End after this many completed checks (successful or not)
+        """
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        completed = 0
+        try:
+            while not self._stopping and not (stop is not None and stop.is_set()):
+                if max_checks is not None and completed + len(self._tasks) >= max_checks:
+                    next_ready = None
+                else:
+                    next_ready = self._dispatch(time.time())
+                waiters = set(self._tasks)
+                wakeup = asyncio.ensure_future(self._wakeup.wait())
+                waiters.add(wakeup)
+                if stop is not None:
+                    stopper = asyncio.ensure_future(stop.wait())
+                    waiters.add(stopper)
+                timeout = None if next_ready is None else max(next_ready - time.time(), 0.001)
+                done, _ = await asyncio.wait(waiters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                self._wakeup.clear()
+                for waiter in waiters - set(self._tasks):
+                    waiter.cancel()
+                for task in done & set(self._tasks):
+                    self._complete(task)
+                    completed += 1
+                self._maybe_save()
+                if max_checks is not None and completed >= max_checks:
+                    break
+            # Let in-flight checks finish so their results are recorded
+            if self._tasks:
+                await asyncio.wait(list(self._tasks))
+                for task in list(self._tasks):
+                    self._complete(task)
+        finally:
+            for task in list(self._tasks):
+                task.cancel()
+            self._wakeup = None
+            self.save()
+
+    def stop(self):
+        """Ask a running scheduler to finish its in-flight checks and return."""
+        self._stopping = True
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _maybe_save(self):
+        if time.monotonic() - self._saved_at >= SAVE_INTERVAL:
+            self.save()
+
+    def save(self):
+        """Write targets and host backoffs to the state file (atomically)."""
+        self._saved_at = time.monotonic()
+        if not self.state_path:
+            return
+        data = {
+            "targets": [target.to_dict() for target in self.targets.values()],
+            "hosts": {name: {"backoff_until": host.backoff_until, "throttles": host.throttles}
+                      for name, host in self.hosts.items() if host.backoff_until or host.throttles}
+        }
+        directory = os.path.dirname(self.state_path)
+        tmp_path = f"{self.state_path}.{os.getpid()}.tmp"
+        try:
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.state_path)
+        except OSError:
+            # Losing state only means targets are checked again sooner after a restart
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    def _load(self):
+        if not self.state_path:
+            return
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            targets = [RefreshTarget.from_dict(entry) for entry in data.get("targets", [])]
+            hosts = data.get("hosts", {})
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            return
+        for target in targets:
+            self.targets[target.key] = target
+            self._push(target)
+        for name, entry in hosts.items():
+            host = self._host(name)
+            host.backoff_until = entry.get("backoff_until", 0.0)
+            host.throttles = entry.get("throttles", 0)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        now = time.time()
+        return {
+            **self.metrics,
+            "targets": len(self.targets),
+            "due": sum(1 for target in self.targets.values() if target.due_at <= now),
+            "in_flight": len(self._tasks),
+            "hosts_backing_off": sum(1 for host in self.hosts.values() if host.backoff_until > now)
+        }
+
+async def run_refresh(args):
+    from .bulk import read_queries
+
+    def report(target: RefreshTarget, result: Dict[str, Any], changed: bool):
+        print(json.dumps({"url": target.url, "download_speed": target.download_speed,
+                          "plan_name": target.plan_name, "changed": changed, "result": result}, default=str),
+              flush=True)
+
+    scheduler = RefreshScheduler(concurrency=args.concurrency, host_concurrency=args.host_concurrency,
+                                 host_rpm=args.host_rpm, on_result=report)
+    for query in read_queries(args.targets):
+        if query.get("error"):
+            print(f"Skipping row {query['row']}: {query['error']}", file=sys.stderr)
+            continue
+        scheduler.add(query["url"], float(query["download_speed"]), query["plan_name"])
+    try:
+        await scheduler.run()
+    finally:
+        await scheduler.retriever.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Keep price data fresh, checking volatile pages more often")
+    parser.add_argument("targets", help="CSV (with a header row) or JSONL file of url, download_speed, plan_name")
+    parser.add_argument("--concurrency", type=int, default=REFRESH_CONCURRENCY)
+    parser.add_argument("--host-concurrency", type=int, default=REFRESH_HOST_CONCURRENCY)
+    parser.add_argument("--host-rpm", type=float, default=REFRESH_HOST_RPM,
+                        help="checks per minute per host; a check makes up to two requests")
+    args = parser.parse_args()
+    try:
+        asyncio.run(run_refresh(args))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
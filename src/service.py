@@ -0,0 +1,299 @@
+"""
+Long-running HTTP/JSON service around a warm PriceRetriever.
+
+Requests go into a bounded priority queue served by a fixed pool of
+workers. When the queue is full, a request either displaces a queued
+request of lower priority or is rejected with 429. Requests that wait
+longer than SERVICE_MAX_QUEUE_WAIT are shed with 429 instead of being
+served late. On shutdown the service stops accepting work and drains what
+is queued and in flight before closing the retriever.
+
+Endpoints:
+    POST /price     {"url", "download_speed", "plan_name"?, "priority"?}
+    GET  /status    system status plus service metrics
+    GET  /metrics   Prometheus text format
+    GET  /health    liveness; 503 while draining
+
+Usage:
+    python -m src.service [--host 127.0.0.1] [--port 8080] [--workers 8] [--queue-size 64]
+"""
+from typing import Dict, Any, Optional, List, Set
+import argparse
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from aiohttp import web
+from .config import (SERVICE_HOST, SERVICE_PORT, SERVICE_WORKERS, SERVICE_QUEUE_SIZE,
+                     SERVICE_MAX_QUEUE_WAIT, SERVICE_DRAIN_TIMEOUT)
+from .main import PriceRetriever
+from .utils.admission import AdmissionRejected
+from .utils.latency import prometheus_gauges
+
+class Job:
+    """A queued request; lower sort keys are served first."""
+    __slots__ = ("sort_key", "priority", "url", "download_speed", "plan_name", "future", "enqueued_at")
+
+    def __init__(self, priority: int, sequence: int, url: str, download_speed: float,
+                 plan_name: Optional[str], future: asyncio.Future):
+        # Higher priority first, then arrival order
+        self.sort_key = (-priority, sequence)
+        self.priority = priority
+        self.url = url
+        self.download_speed = download_speed
+        self.plan_name = plan_name
+        self.future = future
+        self.enqueued_at = time.monotonic()
+
+    def __lt__(self, other: "Job") -> bool:
+        return self.sort_key < other.sort_key
+
+class PriceService:
+    """Bounded priority queue and worker pool in front of a PriceRetriever."""
+
+    def __init__(self,
+                 retriever: Optional[PriceRetriever] = None,
+                 workers: int = SERVICE_WORKERS,
+                 queue_size: int = SERVICE_QUEUE_SIZE,
+                 max_queue_wait: float = SERVICE_MAX_QUEUE_WAIT,
+                 drain_timeout: float = SERVICE_DRAIN_TIMEOUT):
+        self.retriever = retriever or PriceRetriever()
+        self.workers = max(1, workers)
+        self.queue_size = max(1, queue_size)
+        self.max_queue_wait = max_queue_wait
+        self.drain_timeout = drain_timeout
+        self.draining = False
+        self._queue: List[Job] = []
+        self._sequence = itertools.count()
+        self._ready: Optional[asyncio.Condition] = None
+        self._tasks: List[asyncio.Task] = []
+        # Jobs popped by a worker and not yet finished
+        self._running: Set[Job] = set()
+        # Smoothed per-request service time, for Retry-After estimates
+        self._service_time = 1.0
+        self.metrics = {
+            "accepted": 0,
+            "completed": 0,
+            "failed": 0,
+            "rejected": 0,
+            "shed_displaced": 0,
+            "shed_expired": 0,
+            "cancelled": 0,
+            "max_queue_depth": 0
+        }
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._queue)
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._running)
+
+    def start(self):
+        """Start the worker pool on the running loop."""
+        if self._tasks:
+            return
+        self._ready = asyncio.Condition()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    def retry_after(self) -> float:
+        """Seconds until the current backlog should have cleared."""
+        backlog = self.queue_depth + self.in_flight
+        return max(1.0, math.ceil(backlog * self._service_time / self.workers))
+
+    async def submit(self,
+                     url: str,
+                     download_speed: float,
+                     plan_name: Optional[str] = None,
+                     priority: int = 0) -> Dict[str, Any]:
+        """
+        Queue a request and wait for its result.
+
+        Args:
+            url: Website URL to scrape
+            download_speed: Desired download speed
+            plan_name: Optional specific plan name
+            priority: Larger values are served first and displace smaller ones when the queue is full
+
+        Returns:
+            The PriceRetriever result
+
+        Raises:
+            AdmissionRejected: The service is draining, the queue is full, or the request was shed
+        """
+        if self.draining or self._ready is None:
+            raise AdmissionRejected("Service is shutting down", "draining")
+
+        future = asyncio.get_running_loop().create_future()
+        job = Job(priority, next(self._sequence), url, download_speed, plan_name, future)
+        if len(self._queue) >= self.queue_size:
+            # Displace the least important queued job, latest arrival first, if the newcomer outranks it
+            victim = max(self._queue)
+            if job.priority <= victim.priority:
+                self.metrics["rejected"] += 1
+                raise AdmissionRejected("Request queue is full", "queue_full", self.retry_after())
+            self._queue.remove(victim)
+            heapq.heapify(self._queue)
+            self.metrics["shed_displaced"] += 1
+            if not victim.future.done():
+                victim.future.set_exception(AdmissionRejected(
+                    "Request displaced by higher priority work", "shed", self.retry_after()))
+
+        heapq.heappush(self._queue, job)
+        self.metrics["accepted"] += 1
+        self.metrics["max_queue_depth"] = max(self.metrics["max_queue_depth"], len(self._queue))
+        async with self._ready:
+            self._ready.notify()
+
+        try:
+            return await future
+        except asyncio.CancelledError:
+            # Client went away; the worker skips jobs whose future is already done
+            future.cancel()
+            raise
+
+    async def _next_job(self) -> Optional[Job]:
+        async with self._ready:
+            await self._ready.wait_for(lambda: self._queue or self.draining)
+            if not self._queue:
+                return None
+            return heapq.heappop(self._queue)
+
+    async def _worker(self):
+        while True:
+            job = await self._next_job()
+            if job is None:
+                return
+            if job.future.done():
+                self.metrics["cancelled"] += 1
+                continue
+            if time.monotonic() - job.enqueued_at > self.max_queue_wait:
+                self.metrics["shed_expired"] += 1
+                job.future.set_exception(AdmissionRejected(
+                    "Request waited too long in the queue", "shed", self.retry_after()))
+                continue
+
+            self._running.add(job)
+            start_time = time.monotonic()
+            try:
+                result = await self.retriever.get_plan_price(job.url, job.download_speed, job.plan_name)
+            except Exception as e:
+                self.metrics["failed"] += 1
+                if not job.future.done():
+                    job.future.set_exception(e)
+            else:
+                self.metrics["completed"] += 1
+                if not job.future.done():
+                    job.future.set_result(result)
+            finally:
+                self._running.discard(job)
+                self._service_time = 0.8 * self._service_time + 0.2 * (time.monotonic() - start_time)
+
+    async def drain(self):
+        """
+        Stop accepting requests and finish queued and in-flight ones.
+
+        Work still running after drain_timeout is cancelled and its
+        requests fail with AdmissionRejected("draining").
+        """
+        if self.draining:
+            return
+        self.draining = True
+        if self._ready is None:
+            return
+        async with self._ready:
+            self._ready.notify_all()
+        done, pending = await asyncio.wait(self._tasks, timeout=self.drain_timeout)
+        # Cancelled workers have already popped their jobs, so those are failed here with the queued ones
+        abandoned = list(self._running)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        for job in abandoned + self._queue:
+            if not job.future.done():
+                job.future.set_exception(AdmissionRejected("Service is shutting down", "draining"))
+        self._queue.clear()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {
+            **self.metrics,
+            "queue_depth": self.queue_depth,
+            "queue_size": self.queue_size,
+            "in_flight": self.in_flight,
+            "workers": self.workers,
+            "draining": self.draining,
+            "service_time": self._service_time
+        }
+
+    async def handle_price(self, request: web.Request) -> web.Response:
+        try:
+            body = await request.json()
+            url = body["url"]
+            download_speed = float(body["download_speed"])
+            plan_name = body.get("plan_name")
+            priority = int(body.get("priority", 0))
+        except (ValueError, KeyError, TypeError) as e:
+            return web.json_response({"error": f"Invalid request: {e}"}, status=400)
+
+        try:
+            result = await self.submit(url, download_speed, plan_name, priority)
+        except AdmissionRejected as e:
+            status = 503 if e.reason == "draining" else 429
+            headers = {"Retry-After": str(int(e.retry_after))} if e.retry_after else None
+            return web.json_response({"error": str(e), "reason": e.reason}, status=status, headers=headers)
+        except Exception as e:
+            return web.json_response({"error": str(e)}, status=502)
+        return web.json_response(result)
+
+    async def handle_status(self, request: web.Request) -> web.Response:
+        status = self.retriever.get_system_status()
+        status["service_metrics"] = self.get_metrics()
+        return web.json_response(status)
+
+    async def handle_metrics(self, request: web.Request) -> web.Response:
+        text = self.retriever.export_prometheus() + prometheus_gauges({"service": self.get_metrics()})
+        return web.Response(text=text, content_type="text/plain", charset="utf-8")
+
+    async def handle_health(self, request: web.Request) -> web.Response:
+        if self.draining:
+            return web.json_response({"status": "draining"}, status=503)
+        return web.json_response({"status": "ok"})
+
+    def make_app(self) -> web.Application:
+        """aiohttp application serving this service; starts, drains and closes with the app."""
+        app = web.Application()
+        app.router.add_post("/price", self.handle_price)
+        app.router.add_get("/status", self.handle_status)
+        app.router.add_get("/metrics", self.handle_metrics)
+        app.router.add_get("/health", self.handle_health)
+        app.on_startup.append(self._on_startup)
+        app.on_shutdown.append(self._on_shutdown)
+        app.on_cleanup.append(self._on_cleanup)
+        return app
+
+    async def _on_startup(self, app: web.Application):
+        self.start()
+
+    async def _on_shutdown(self, app: web.Application):
+        await self.drain()
+
+    async def _on_cleanup(self, app: web.Application):
+        await self.retriever.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Internet plan price retrieval service")
+    parser.add_argument("--host", default=SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=SERVICE_PORT)
+    parser.add_argument("--workers", type=int, default=SERVICE_WORKERS)
+    parser.add_argument("--queue-size", type=int, default=SERVICE_QUEUE_SIZE)
+    args = parser.parse_args()
+
+    service = PriceService(workers=args.workers, queue_size=args.queue_size)
+    # Leave room for the drain before aiohttp force-closes connections
+    web.run_app(service.make_app(), host=args.host, port=args.port,
+                shutdown_timeout=service.drain_timeout + 5)
+
+if __name__ == "__main__":
+    main()
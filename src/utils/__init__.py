@@ -0,0 +1,42 @@
+"""Shared utilities package initialization."""
+from .fetcher import AsyncFetcher, FetchError, FetchResult, get_fetcher
+from .singleflight import SingleFlight, canonicalize_url, content_hash
+from .page_cache import PageCache, CacheEntry, get_page_cache
+from .extraction import ExtractionEngine, PageIndex, ContainerIndex, get_extraction_engine
+from .parsers import ParserBackend, get_parser_backend, available_backends
+from .streaming import StreamingExtractor
+from .result_cache import ResultCache
+from .latency import LatencyHistogram, LatencyRecorder, get_latency_recorder, prometheus_gauges
+from .tracing import Tracer, Span, get_tracer, traced, current_span
+from .profiling import SlowRequestProfiler
+from .admission import AdmissionController, AdmissionRejected, TokenBucket
+from .templates import TemplateStore, ExtractionTemplate, get_template_store
+from .snapshots import SnapshotStore, get_snapshot_store
+from .digest import PageDigest, build_digest
+from .microbatch import MicroBatcher
+from .history import PriceHistory, Observation, get_price_history
+from .plan_table import PlanTable, PlanTableCache, get_plan_table_cache
+from .parse_pool import ParsePool
+from .pages import PageLoader, ParsedPage, get_page_loader
+
+__all__ = [
+    'AsyncFetcher', 'FetchError', 'FetchResult', 'get_fetcher',
+    'PageCache', 'CacheEntry', 'get_page_cache',
+    'SingleFlight', 'canonicalize_url', 'content_hash',
+    'ExtractionEngine', 'PageIndex', 'ContainerIndex', 'get_extraction_engine',
+    'ParserBackend', 'get_parser_backend', 'available_backends',
+    'StreamingExtractor',
+    'ResultCache',
+    'LatencyHistogram', 'LatencyRecorder', 'get_latency_recorder', 'prometheus_gauges',
+    'Tracer', 'Span', 'get_tracer', 'traced', 'current_span',
+    'SlowRequestProfiler',
+    'AdmissionController', 'AdmissionRejected', 'TokenBucket',
+    'TemplateStore', 'ExtractionTemplate', 'get_template_store',
+    'SnapshotStore', 'get_snapshot_store',
+    'PageDigest', 'build_digest',
+    'MicroBatcher',
+    'PriceHistory', 'Observation', 'get_price_history',
+    'PlanTable', 'PlanTableCache', 'get_plan_table_cache',
+    'ParsePool',
+    'PageLoader', 'ParsedPage', 'get_page_loader'
+]
@@ -0,0 +1,219 @@
+from typing import Dict, Any, Optional, Tuple
+from collections import deque
+import asyncio
+import math
+import time
+from ..config import (
+    COST_THRESHOLD, COST_BUDGET_WINDOW, MODEL_REQUESTS_PER_MINUTE, MODEL_TOKENS_PER_MINUTE,
+    ADMISSION_MAX_WAIT, INPUT_TOKEN_COST, OUTPUT_TOKEN_COST
+)
+
+# Rough characters per token for English prompts, used when the model reports no usage
+CHARS_PER_TOKEN = 4
+
+def estimate_tokens(text: str) -> int:
+    """Token estimate for text when no tokenizer or usage metadata is available."""
+    return max(1, math.ceil(len(text) / CHARS_PER_TOKEN))
+
+def response_text(response: Any) -> str:
+    """Text of a model response, which may be a plain string or a response object."""
+    if isinstance(response, str):
+        return response
+    for attribute in ("content", "text"):
+        value = getattr(response, attribute, None)
+        if isinstance(value, str):
+            return value
+    return str(response)
+
+def token_usage(response: Any) -> Optional[Tuple[int, int]]:
+    """(input, output) tokens reported by the model, or None if the response carries no usage."""
+    # Gemini responses
+    metadata = getattr(response, "usage_metadata", None)
+    if metadata is not None:
+        return (int(getattr(metadata, "prompt_token_count", 0) or 0),
+                int(getattr(metadata, "candidates_token_count", 0) or 0))
+    # autogen CreateResult
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        return (int(getattr(usage, "prompt_tokens", 0) or 0),
+                int(getattr(usage, "completion_tokens", 0) or 0))
+    return None
+
+def call_cost(input_tokens: int, output_tokens: int,
+              input_rate: float = INPUT_TOKEN_COST,
+              output_rate: float = OUTPUT_TOKEN_COST) -> float:
+    """Cost in USD of a call, with rates per million tokens."""
+    return (input_tokens * input_rate + output_tokens * output_rate) / 1_000_000
+
+class AdmissionRejected(Exception):
+    """A model call was refused because it would exceed a rate limit or the cost budget."""
+
+    def __init__(self, message: str, reason: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.reason = reason
+        self.retry_after = retry_after
+
+class TokenBucket:
+    """Bucket refilling at capacity per minute; settling actual usage may leave it in debt."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until amount can be taken (requests larger than capacity wait for a full bucket)."""
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount: float):
+        self._refill()
+        self.tokens -= amount
+
+    def give(self, amount: float):
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+class Reservation:
+    """Tokens and cost set aside for one admitted call until it settles."""
+
+    def __init__(self, tokens: int, cost: float, waited: float):
+        self.tokens = tokens
+        self.cost = cost
+        self.waited = waited
+
+class AdmissionController:
+    """
+    Admits model calls against request/token rate limits and a rolling cost budget.
+
+    A call that would exceed a limit waits until capacity frees up if that
+    takes at most max_wait seconds, and is rejected with AdmissionRejected
+    otherwise so the caller can route it elsewhere. Admission reserves the
+    estimated tokens and cost; settle() replaces the estimate with actual usage.
+    """
+
+    def __init__(self,
+                 requests_per_minute: int = MODEL_REQUESTS_PER_MINUTE,
+                 tokens_per_minute: int = MODEL_TOKENS_PER_MINUTE,
+                 budget: float = COST_THRESHOLD,
+                 budget_window: float = COST_BUDGET_WINDOW,
+                 max_wait: float = ADMISSION_MAX_WAIT):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.budget = budget
+        self.budget_window = budget_window
+        self.max_wait = max_wait
+        # (monotonic time, cost) of settled calls inside the budget window
+        self._spend: deque = deque()
+        self._window_spend = 0.0
+        self._reserved_cost = 0.0
+        self.metrics = {
+            "admitted": 0,
+            "deferred": 0,
+            "rejected_rate": 0,
+            "rejected_budget": 0,
+            "total_wait": 0.0,
+            "input_tokens": 0,
+            "output_tokens": 0,
+            "total_cost": 0.0
+        }
+
+    def _prune(self, now: float):
+        while self._spend and self._spend[0][0] <= now - self.budget_window:
+            _, cost = self._spend.popleft()
+            self._window_spend -= cost
+        if not self._spend:
+            self._window_spend = 0.0
+
+    def _budget_wait(self, cost: float) -> Optional[float]:
+        """Seconds until cost fits in the budget window, or None if it never will."""
+        now = time.monotonic()
+        self._prune(now)
+        excess = self._window_spend + self._reserved_cost + cost - self.budget
+        if excess <= 0:
+            return 0.0
+        if self._reserved_cost + cost > self.budget:
+            return None
+        released = 0.0
+        for spent_at, spent in self._spend:
+            released += spent
+            if released >= excess:
+                return spent_at + self.budget_window - now
+        return None
+
+    async def admit(self, tokens: int, cost: float) -> Reservation:
+        """
+        Wait for capacity and reserve it for one call.
+
+        Args:
+            tokens: Estimated input plus output tokens
+            cost: Estimated cost in USD
+
+        Returns:
+            Reservation to pass to settle() or release()
+
+        Raises:
+            AdmissionRejected: If the call cannot be admitted within max_wait
+        """
+        waited = 0.0
+        while True:
+            budget_wait = self._budget_wait(cost)
+            if budget_wait is None or waited + budget_wait > self.max_wait:
+                self.metrics["rejected_budget"] += 1
+                raise AdmissionRejected("Cost budget exhausted", "budget", retry_after=budget_wait)
+            wait = max(budget_wait, self.requests.wait_time(1), self.tokens.wait_time(tokens))
+            if wait <= 0:
+                break
+            if waited + wait > self.max_wait:
+                self.metrics["rejected_rate"] += 1
+                raise AdmissionRejected("Model rate limit reached", "rate", retry_after=wait)
+            if not waited:
+                self.metrics["deferred"] += 1
+            await asyncio.sleep(wait)
+            waited += wait
+
+        self.requests.take(1)
+        self.tokens.take(tokens)
+        self._reserved_cost += cost
+        self.metrics["admitted"] += 1
+        self.metrics["total_wait"] += waited
+        return Reservation(tokens, cost, waited)
+
+    def settle(self, reservation: Reservation, input_tokens: int, output_tokens: int, cost: float):
+        """Replace a reservation with the call's actual usage."""
+        self._reserved_cost = max(self._reserved_cost - reservation.cost, 0.0)
+        difference = input_tokens + output_tokens - reservation.tokens
+        if difference > 0:
+            self.tokens.take(difference)
+        elif difference < 0:
+            self.tokens.give(-difference)
+        self._spend.append((time.monotonic(), cost))
+        self._window_spend += cost
+        self.metrics["input_tokens"] += input_tokens
+        self.metrics["output_tokens"] += output_tokens
+        self.metrics["total_cost"] += cost
+
+    def release(self, reservation: Reservation):
+        """Return the reservation of a call that was never billed."""
+        self._reserved_cost = max(self._reserved_cost - reservation.cost, 0.0)
+        self.tokens.give(reservation.tokens)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get admission counters and the current budget window."""
+        self._prune(time.monotonic())
+        return {
+            **self.metrics,
+            "window_spend": self._window_spend,
+            "reserved_cost": self._reserved_cost,
+            "budget": self.budget,
+            "budget_remaining": max(self.budget - self._window_spend - self._reserved_cost, 0.0)
+        }
@@ -0,0 +1,130 @@
+from typing import Optional, List
+from collections import Counter
+import math
+import time
+from ..config import PROMPT_TOKEN_BUDGET, PROMPT_MAX_CONTAINER_CHARS
+from .admission import CHARS_PER_TOKEN, estimate_tokens
+from .extraction import ExtractionEngine, ContainerIndex, PageIndex, get_extraction_engine
+from .snapshots import leaf_mask, matches_query
+
+class PageDigest:
+    """Compact text of a page's plan listings for the model prompt, with its token accounting."""
+
+    def __init__(self, text: str, tokens: int, raw_tokens: int, containers: int, included: int,
+                 build_time: float):
+        self.text = text
+        self.tokens = tokens
+        # Estimated tokens of the whole page, which the model would otherwise read
+        self.raw_tokens = raw_tokens
+        self.containers = containers
+        self.included = included
+        self.build_time = build_time
+
+    @property
+    def tokens_saved(self) -> int:
+        return max(self.raw_tokens - self.tokens, 0)
+
+def _collapse(text: str) -> str:
+    return " ".join(text.split())
+
+def _first(entries) -> Optional[str]:
+    for _, text in sorted(entries):
+        text = _collapse(text)
+        if text:
+            return text
+    return None
+
+def _features(container: ContainerIndex) -> List[str]:
+    features = []
+    for _, text in sorted(container.feature_texts):
+        text = _collapse(text)
+        if text and text not in features:
+            features.append(text)
+    return features
+
+def build_digest(page_index: PageIndex,
+                 content: Optional[str],
+                 download_speed: Optional[float],
+                 plan_name: Optional[str],
+                 budget: int = PROMPT_TOKEN_BUDGET,
+                 max_chars: int = PROMPT_MAX_CONTAINER_CHARS,
+                 engine: Optional[ExtractionEngine] = None) -> Optional[PageDigest]:
+    """
+    Digest of the innermost plan containers of a page, within a token budget.
+
+    Each card becomes one line with its name, price, speed and feature text;
+    cards whose price or speed could not be located also carry their text,
+    truncated to max_chars. Features shared by most cards are listed once,
+    identical cards are dropped, and cards matching the query come first so
+    the budget cuts irrelevant ones. A first line longer than the whole
+    budget is truncated to fit.
+
+    Returns None if the page has no plan containers.
+    """
+    start_time = time.perf_counter()
+    engine = engine or get_extraction_engine()
+    plan_containers = page_index.plan_containers()
+    containers = [c for c, leaf in zip(plan_containers, leaf_mask(plan_containers)) if leaf]
+    if not containers:
+        return None
+
+    # Feature text on at least half the cards (and two or more) is boilerplate, listed once
+    features = {id(c): _features(c) for c in containers}
+    counts = Counter(text.lower() for texts in features.values() for text in set(texts))
+    threshold = max(2, math.ceil(len(containers) / 2))
+    common = {}
+    for container in containers:
+        for text in features[id(container)]:
+            if counts[text.lower()] >= threshold:
+                common.setdefault(text.lower(), text)
+
+    lines = []
+    seen = set()
+    for container in containers:
+        plan = engine.extract_plan(container)
+        fields = [
+            plan["name"] or "(unnamed)",
+            _first(container.price_texts) or (f"${plan['price']:g}" if plan["price"] is not None else None),
+            _first(container.speed_texts) or (f"{plan['speed']:g} Mbps" if plan["speed"] is not None else None)
+        ]
+        line = " | ".join(field for field in fields if field)
+        specific = [text for text in features[id(container)] if text.lower() not in common]
+        if specific:
+            line += " | " + "; ".join(specific)
+        if plan["price"] is None or plan["speed"] is None:
+            text = _collapse(container.text)
+            line += " | text: " + (text[:max_chars] + "..." if len(text) > max_chars else text)
+        if line in seen:
+            continue
+        seen.add(line)
+        lines.append((not matches_query(plan, download_speed, plan_name), len(lines), line))
+
+    header = "Plan listings extracted from the page (name | price | speed | features):"
+    footer = f"Common to most plans: {'; '.join(common.values())}" if common else ""
+    used = estimate_tokens(header) + (estimate_tokens(footer) if footer else 0)
+    included = []
+    for _, _, line in sorted(lines):
+        cost = estimate_tokens(line) + 1
+        if used + cost > budget:
+            if included:
+                break
+            # The best match alone is over budget: keep as much of it as fits
+            chars = (budget - used - 1) * CHARS_PER_TOKEN - len("...")
+            if chars <= 0:
+                break
+            line = line[:chars] + "..."
+            cost = estimate_tokens(line) + 1
+        included.append(line)
+        used += cost
+
+    omitted = len(lines) - len(included)
+    parts = [header] + [f"- {line}" for line in included]
+    if omitted:
+        parts.append(f"({omitted} less relevant plans omitted)")
+    if footer:
+        parts.append(footer)
+    text = "\n".join(parts)
+
+    raw_tokens = estimate_tokens(content) if content else estimate_tokens(" ".join(c.text for c in plan_containers))
+    return PageDigest(text, estimate_tokens(text), raw_tokens, len(containers), len(included),
+                      time.perf_counter() - start_time)
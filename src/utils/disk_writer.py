@@ -0,0 +1,42 @@
+from typing import Any, Optional, Callable
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+import asyncio
+import threading
+
+class DiskWriter:
+    """
+    Ordered writer for a store's disk tier.
+
+    Called from a running event loop, writes are queued on one worker
+    thread, in submission order, so requests never wait on the disk;
+    without a loop they run inline. Queued writes still finish at
+    interpreter exit.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._last: Optional[Future] = None
+        self._lock = threading.Lock()
+
+    def submit(self, func: Callable[..., Any], *args: Any):
+        """Run func(*args) off the event loop, after every write submitted before it."""
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            # Behind anything still queued, so a later write never lands first
+            self.flush()
+            func(*args)
+            return
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=self.name)
+            self._last = self._executor.submit(func, *args)
+
+    def flush(self):
+        """Wait for the queued writes (blocking; call from a thread or at shutdown)."""
+        with self._lock:
+            last = self._last
+        if last is not None:
+            wait([last])
+
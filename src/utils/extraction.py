@@ -0,0 +1,411 @@
+from typing import Dict, Any, Optional, List, Tuple, Union
+import hashlib
+import re
+from bs4 import BeautifulSoup, Tag, NavigableString, CData
+
+# Element roles, assigned once per (tag, class attribute) combination
+ROLE_PLAN = 1            # div/section plan container (web surfer terms)
+ROLE_SCRAPER_PLAN = 2    # div/section plan container (scraper terms)
+ROLE_PRICE = 4
+ROLE_SPEED = 8
+ROLE_FEATURE = 16
+ROLE_H1 = 32
+ROLE_H2 = 64
+ROLE_H3 = 128
+ROLE_PLAN_NAME = 256     # .plan-name
+ROLE_TITLE = 512         # .title
+
+ROLE_CONTAINER = ROLE_PLAN | ROLE_SCRAPER_PLAN
+ROLE_ELEMENT = (ROLE_PRICE | ROLE_SPEED | ROLE_FEATURE | ROLE_H1 | ROLE_H2 | ROLE_H3
+                | ROLE_PLAN_NAME | ROLE_TITLE)
+# Name selectors in lookup order: h1, h2, h3, .plan-name, .title
+NAME_ROLES = (ROLE_H1, ROLE_H2, ROLE_H3, ROLE_PLAN_NAME, ROLE_TITLE)
+
+CONTAINER_TAGS = frozenset(['div', 'section'])
+PLAN_TERMS = ('plan', 'package', 'pricing', 'subscription')
+SCRAPER_PLAN_TERMS = ('plan', 'package', 'pricing')
+PRICE_TERMS = ('price', 'cost', 'amount', 'fee')
+SPEED_TERMS = ('speed', 'bandwidth', 'download', 'mbps')
+FEATURE_TERMS = ('feature', 'benefit', 'include')
+HEADING_ROLES = {'h1': ROLE_H1, 'h2': ROLE_H2, 'h3': ROLE_H3}
+
+# Substrings whose first containing text node is recorded per container
+STRING_MARKERS = ('mbps', '$')
+
+# Only plain text counts, as with Tag.text (no comments, scripts or styles)
+TEXT_TYPES = (NavigableString, CData)
+
+PRICE_PATTERN_SOURCES = [
+    r'\$(\d+\.?\d*)',  # $XX.XX
+    r'(\d+\.?\d*)\s*/\s*mo',  # XX.XX /mo
+    r'(\d+\.?\d*)\s*per\s*month',  # XX.XX per month
+    r'(\d+\.?\d*)/month',  # XX.XX/month
+    r'(\d+\.?\d*)\s*monthly'  # XX.XX monthly
+]
+SPEED_PATTERN_SOURCES = [
+    r'(\d+\.?\d*)\s*mbps',
+    r'(\d+\.?\d*)\s*mb/s',
+    r'(\d+\.?\d*)\s*mbit',
+    r'(\d+\.?\d*)\s*megabits?(?:\s*per\s*second)?',
+    r'download(?:\s*speed)?\s*(?:of\s*)?(\d+\.?\d*)',
+    r'(\d+\.?\d*)\s*download'
+]
+PRICE_PATTERNS = [re.compile(p, re.IGNORECASE) for p in PRICE_PATTERN_SOURCES]
+SPEED_PATTERNS = [re.compile(p, re.IGNORECASE) for p in SPEED_PATTERN_SOURCES]
+# Combined alternations reject texts that match none of the ordered patterns in one scan
+PRICE_ANY = re.compile('|'.join(PRICE_PATTERN_SOURCES), re.IGNORECASE)
+SPEED_ANY = re.compile('|'.join(SPEED_PATTERN_SOURCES), re.IGNORECASE)
+
+CONTRACT_PATTERN = re.compile(r'(?:(\d+)\s*(?:month|year)|no\s*contract)', re.IGNORECASE)
+SETUP_FEE_PATTERN = re.compile(r'setup\s*fee\s*\$?(\d+\.?\d*)', re.IGNORECASE)
+DATA_LIMIT_PATTERN = re.compile(r'(\d+)\s*(?:gb|tb)|unlimited', re.IGNORECASE)
+NUMBER_PATTERN = re.compile(r'\d+(?:\.\d+)?')
+THOUSANDS_PATTERN = re.compile(r'(?<=\d),(?=\d{3})')
+
+def first_number(patterns: List[re.Pattern], combined: re.Pattern, text: str) -> Optional[float]:
+    """Value of the first capturing pattern (in list order) that matches text."""
+    if not combined.search(text):
+        return None
+    for pattern in patterns:
+        match = pattern.search(text)
+        if match:
+            try:
+                return float(match.group(1))
+            except (ValueError, IndexError, TypeError):
+                continue
+    return None
+
+def parse_number(text: str) -> Optional[float]:
+    """First number in a text node, ignoring thousands separators."""
+    match = NUMBER_PATTERN.search(THOUSANDS_PATTERN.sub('', text))
+    return float(match.group(0)) if match else None
+
+class ContainerIndex:
+    """Text and class index of one plan container, built in a single DOM pass."""
+
+    def __init__(self, seq: int, tag: str, classes: str, roles: int, path: str = "", ordinal: int = 0):
+        self.seq = seq
+        self.tag = tag
+        self.classes = classes
+        self.roles = roles
+        # Selector path through the enclosing containers, and position among containers sharing it
+        self.path = path
+        self.ordinal = ordinal
+        self.text = ""
+        self.price_texts: List[Tuple[int, str]] = []
+        self.speed_texts: List[Tuple[int, str]] = []
+        self.feature_texts: List[Tuple[int, str]] = []
+        self.names: Dict[int, Tuple[int, str]] = {}
+        self.first_strings: Dict[str, str] = {}
+        self._lower_text: Optional[str] = None
+        self._plan: Optional[Dict[str, Any]] = None
+        self._fingerprint: Optional[str] = None
+
+    @property
+    def lower_text(self) -> str:
+        if self._lower_text is None:
+            self._lower_text = self.text.lower()
+        return self._lower_text
+
+    @property
+    def fingerprint(self) -> str:
+        """Stable hash of the container's markup identity and text, independent of its position."""
+        if self._fingerprint is None:
+            data = f"{self.tag}\x00{self.classes}\x00{self.text}".encode("utf-8", errors="replace")
+            self._fingerprint = hashlib.sha256(data).hexdigest()[:32]
+        return self._fingerprint
+
+    # Compact pickled form for indexes returned from parse worker processes; the
+    # extracted plan and fingerprint travel with it, the lowercased text does not
+    _STATE = ('seq', 'tag', 'classes', 'roles', 'path', 'ordinal', 'text', 'price_texts', 'speed_texts',
+              'feature_texts', 'names', 'first_strings', '_plan', '_fingerprint')
+
+    def __getstate__(self):
+        return tuple(getattr(self, name) for name in self._STATE)
+
+    def __setstate__(self, state):
+        for name, value in zip(self._STATE, state):
+            setattr(self, name, value)
+        self._lower_text = None
+
+    def add_element(self, roles: int, seq: int, text: str):
+        """Record a descendant element that has a price/speed/feature/name role."""
+        if roles & ROLE_PRICE:
+            self.price_texts.append((seq, text))
+        if roles & ROLE_SPEED:
+            self.speed_texts.append((seq, text))
+        if roles & ROLE_FEATURE:
+            self.feature_texts.append((seq, text))
+        for role in NAME_ROLES:
+            if roles & role:
+                current = self.names.get(role)
+                if current is None or seq < current[0]:
+                    self.names[role] = (seq, text)
+
+    def search_text(self, entries: List[Tuple[int, str]]) -> str:
+        """Role element texts in document order followed by the container text."""
+        return ' '.join([text for _, text in sorted(entries)] + [self.text])
+
+class PageIndex:
+    """All plan containers found on a page, in document order."""
+
+    def __init__(self, containers: List[ContainerIndex]):
+        self.containers = containers
+        self._by_path: Optional[Dict[Tuple[str, int], ContainerIndex]] = None
+
+    def find(self, path: str, ordinal: int = 0) -> Optional[ContainerIndex]:
+        """Container at a selector path and ordinal, if present."""
+        if self._by_path is None:
+            self._by_path = {(c.path, c.ordinal): c for c in self.containers}
+        return self._by_path.get((path, ordinal))
+
+    def plan_containers(self) -> List[ContainerIndex]:
+        return [c for c in self.containers if c.roles & ROLE_PLAN]
+
+    def scraper_containers(self) -> List[ContainerIndex]:
+        return [c for c in self.containers if c.roles & ROLE_SCRAPER_PLAN]
+
+class _Frame:
+    __slots__ = ('roles', 'seq', 'start', 'container')
+
+    def __init__(self, roles: int, seq: int, start: int, container: Optional[ContainerIndex]):
+        self.roles = roles
+        self.seq = seq
+        self.start = start
+        self.container = container
+
+class IndexBuilder:
+    """
+    Builds a PageIndex from a stream of start/text/end events.
+
+    Any parser backend can drive it, so extraction does not depend on
+    which parser produced the tree.
+    """
+
+    def __init__(self, engine: "ExtractionEngine"):
+        self.engine = engine
+        self.strings: List[str] = []
+        self.containers: List[ContainerIndex] = []
+        self._stack: List[_Frame] = []
+        self._open: List[ContainerIndex] = []
+        self._path_counts: Dict[str, int] = {}
+        self._seq = 0
+
+    def start(self, tag: str, classes=None, force_container: bool = False):
+        roles = self.engine.classify(tag, classes)
+        if force_container:
+            roles |= ROLE_PLAN | ROLE_SCRAPER_PLAN
+        self._seq += 1
+        container = None
+        if roles & ROLE_CONTAINER:
+            class_string = _class_string(classes)
+            path = _selector(tag, class_string)
+            if self._open:
+                path = f"{self._open[-1].path} > {path}"
+            ordinal = self._path_counts.get(path, 0)
+            self._path_counts[path] = ordinal + 1
+            container = ContainerIndex(self._seq, tag, class_string, roles, path, ordinal)
+            self._open.append(container)
+        self._stack.append(_Frame(roles, self._seq, len(self.strings), container))
+
+    def text(self, value: str):
+        # Text outside every plan container is never read, so it is not kept
+        if not self._open:
+            return
+        self.strings.append(value)
+        lowered = value.lower()
+        for marker in STRING_MARKERS:
+            if marker in lowered:
+                for container in self._open:
+                    if marker not in container.first_strings:
+                        container.first_strings[marker] = value
+
+    def end(self) -> Optional[ContainerIndex]:
+        """Close the innermost element; returns it if it was a container."""
+        frame = self._stack.pop()
+        if not frame.roles:
+            return None
+        text = None
+        if frame.container is not None:
+            self._open.pop()
+            text = ''.join(self.strings[frame.start:])
+            frame.container.text = text
+            self.containers.append(frame.container)
+            if not self._open:
+                self.strings = []
+        if frame.roles & ROLE_ELEMENT and self._open:
+            if text is None:
+                text = ''.join(self.strings[frame.start:])
+            for container in self._open:
+                container.add_element(frame.roles, frame.seq, text)
+        return frame.container
+
+    def finish(self, close_open: bool = True) -> PageIndex:
+        """
+        Complete the index.
+
+        With close_open=False, containers still open (e.g. after an early
+        exit) are left out instead of being closed with partial text.
+        """
+        while close_open and self._stack:
+            self.end()
+        self.containers.sort(key=lambda c: c.seq)
+        return PageIndex(self.containers)
+
+def _class_string(classes) -> str:
+    if not classes:
+        return ''
+    if isinstance(classes, str):
+        return classes
+    return ' '.join(classes)
+
+def _selector(tag: str, class_string: str) -> str:
+    return '.'.join([tag] + class_string.split())
+
+def selector_path_part(tag: str, classes=None) -> str:
+    """An element's step in a container's selector path."""
+    return _selector(tag, _class_string(classes))
+
+def walk_soup(node: Tag, builder: IndexBuilder):
+    """Feed a BeautifulSoup subtree (children of node) to a builder without recursion."""
+    stack = [iter(node.contents)]
+    while stack:
+        for child in stack[-1]:
+            if isinstance(child, Tag):
+                builder.start(child.name, child.get('class'))
+                stack.append(iter(child.contents))
+                break
+            if type(child) in TEXT_TYPES:
+                builder.text(str(child))
+        else:
+            stack.pop()
+            if stack:
+                builder.end()
+
+class ExtractionEngine:
+    """Single-pass, index-based plan extraction shared by all agents."""
+
+    MAX_ROLE_CACHE = 10000
+
+    def __init__(self):
+        self._role_cache: Dict[Tuple[str, str], int] = {}
+
+    def classify(self, tag: str, classes=None) -> int:
+        """Roles of an element, memoized per tag and class attribute."""
+        class_string = _class_string(classes)
+        key = (tag, class_string)
+        roles = self._role_cache.get(key)
+        if roles is None:
+            roles = self._classify(tag, class_string)
+            if len(self._role_cache) < self.MAX_ROLE_CACHE:
+                self._role_cache[key] = roles
+        return roles
+
+    @staticmethod
+    def _classify(tag: str, class_string: str) -> int:
+        roles = HEADING_ROLES.get(tag, 0)
+        if not class_string:
+            return roles
+        lowered = class_string.lower()
+        if tag in CONTAINER_TAGS:
+            if any(term in lowered for term in PLAN_TERMS):
+                roles |= ROLE_PLAN
+            if any(term in lowered for term in SCRAPER_PLAN_TERMS):
+                roles |= ROLE_SCRAPER_PLAN
+        if any(term in lowered for term in PRICE_TERMS):
+            roles |= ROLE_PRICE
+        if any(term in lowered for term in SPEED_TERMS):
+            roles |= ROLE_SPEED
+        if any(term in lowered for term in FEATURE_TERMS):
+            roles |= ROLE_FEATURE
+        tokens = class_string.split()
+        if 'plan-name' in tokens:
+            roles |= ROLE_PLAN_NAME
+        if 'title' in tokens:
+            roles |= ROLE_TITLE
+        return roles
+
+    def index(self, source: Union[str, BeautifulSoup], backend: Optional[str] = None) -> PageIndex:
+        """Index every plan container in raw HTML or a parsed BeautifulSoup tree."""
+        if isinstance(source, Tag):
+            builder = IndexBuilder(self)
+            walk_soup(source, builder)
+            return builder.finish()
+
+        from .parsers import get_parser_backend
+        _, page_index = get_parser_backend(backend).index(source, self)
+        return page_index
+
+    def index_container(self, container: Tag) -> ContainerIndex:
+        """Index a single element, treating it as a plan container."""
+        builder = IndexBuilder(self)
+        builder.start(container.name, container.get('class'), force_container=True)
+        walk_soup(container, builder)
+        return builder.end()
+
+    def extract_name(self, container: ContainerIndex) -> Optional[str]:
+        for role in NAME_ROLES:
+            entry = container.names.get(role)
+            if entry and entry[1].strip():
+                return entry[1].strip()
+        return None
+
+    def extract_price(self, container: ContainerIndex) -> Optional[float]:
+        text = container.search_text(container.price_texts)
+        return first_number(PRICE_PATTERNS, PRICE_ANY, text)
+
+    def extract_speed(self, container: ContainerIndex) -> Optional[float]:
+        text = container.search_text(container.speed_texts)
+        return first_number(SPEED_PATTERNS, SPEED_ANY, text)
+
+    def extract_details(self, container: ContainerIndex) -> Dict[str, Any]:
+        details = {}
+        text_to_search = container.search_text(container.feature_texts)
+
+        contract_match = CONTRACT_PATTERN.search(text_to_search)
+        if contract_match:
+            if "no contract" in contract_match.group(0).lower():
+                details["contract_length"] = "No contract"
+            else:
+                details["contract_length"] = f"{contract_match.group(1)} months"
+
+        setup_match = SETUP_FEE_PATTERN.search(text_to_search)
+        if setup_match:
+            try:
+                details["setup_fee"] = float(setup_match.group(1))
+            except (ValueError, IndexError):
+                pass
+
+        data_match = DATA_LIMIT_PATTERN.search(text_to_search)
+        if data_match:
+            details["data_limit"] = "Unlimited" if "unlimited" in data_match.group(0).lower() else data_match.group(0)
+
+        features = [text.strip() for _, text in sorted(container.feature_texts)]
+        if features:
+            details["features"] = features
+
+        return details
+
+    def extract_plan(self, container: ContainerIndex) -> Dict[str, Any]:
+        """Name, price, speed and details of a container (computed once)."""
+        if container._plan is None:
+            container._plan = {
+                "name": self.extract_name(container),
+                "price": self.extract_price(container),
+                "speed": self.extract_speed(container),
+                "details": self.extract_details(container)
+            }
+        return dict(container._plan)
+
+    def extract_plans(self, index: PageIndex) -> List[Dict[str, Any]]:
+        """Plan records for every plan container on the page."""
+        return [self.extract_plan(container) for container in index.plan_containers()]
+
+_shared_engine: Optional[ExtractionEngine] = None
+
+def get_extraction_engine() -> ExtractionEngine:
+    """Get the process-wide extraction engine."""
+    global _shared_engine
+    if _shared_engine is None:
+        _shared_engine = ExtractionEngine()
+    return _shared_engine
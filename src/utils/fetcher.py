@@ -0,0 +1,336 @@
+from typing import Dict, Any, Optional, Mapping, AsyncIterator
+import asyncio
+import codecs
+import time
+import aiohttp
+from multidict import CIMultiDict
+from ..config import (
+    HTTP_TIMEOUT,
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_READ_TIMEOUT,
+    HTTP_MAX_CONNECTIONS,
+    HTTP_MAX_CONNECTIONS_PER_HOST,
+    HTTP_KEEPALIVE_TIMEOUT,
+    HTTP_CHUNK_SIZE,
+    HTTP_MAX_BODY_BYTES,
+    HTTP_USER_AGENT
+)
+from .page_cache import PageCache, CacheEntry, get_page_cache
+from .singleflight import canonicalize_url
+from .latency import LatencyRecorder, get_latency_recorder
+from .tracing import get_tracer
+
+def _incremental_decoder(encoding: Optional[str]):
+    try:
+        return codecs.getincrementaldecoder(encoding or "utf-8")(errors="replace")
+    except LookupError:
+        return codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+class FetchError(Exception):
+    """Raised when a page cannot be fetched."""
+
+    def __init__(self, message: str, status: Optional[int] = None, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status = status
+        # Seconds the server asked us to wait (Retry-After in seconds; HTTP dates are ignored)
+        self.retry_after = retry_after
+
+def _retry_after(headers: Mapping[str, str]) -> Optional[float]:
+    try:
+        return max(float(headers.get("Retry-After", "")), 0.0)
+    except ValueError:
+        return None
+
+class FetchResult:
+    """Body and metadata of a fetched page."""
+
+    def __init__(self, url: str, status: int, headers: Mapping[str, str], body: bytes,
+                 encoding: Optional[str] = None, elapsed: float = 0.0,
+                 cache_status: Optional[str] = None, truncated: bool = False):
+        self.url = url
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.encoding = encoding
+        self.elapsed = elapsed
+        # "hit", "revalidated", "miss" or None when no cache is attached
+        self.cache_status = cache_status
+        # Body was cut off at the fetcher's size cap
+        self.truncated = truncated
+
+    @property
+    def text(self) -> str:
+        """Decoded response body."""
+        return self.body.decode(self.encoding or "utf-8", errors="replace")
+
+class AsyncFetcher:
+    """Non-blocking HTTP client backed by a pooled keep-alive connector and a page cache."""
+
+    def __init__(self,
+                 timeout: float = HTTP_TIMEOUT,
+                 connect_timeout: float = HTTP_CONNECT_TIMEOUT,
+                 read_timeout: float = HTTP_READ_TIMEOUT,
+                 max_connections: int = HTTP_MAX_CONNECTIONS,
+                 max_connections_per_host: int = HTTP_MAX_CONNECTIONS_PER_HOST,
+                 chunk_size: int = HTTP_CHUNK_SIZE,
+                 max_body_bytes: int = HTTP_MAX_BODY_BYTES,
+                 cache: Optional[PageCache] = None,
+                 latency: Optional[LatencyRecorder] = None):
+        self.timeout = aiohttp.ClientTimeout(
+            total=timeout,
+            connect=connect_timeout,
+            sock_read=read_timeout
+        )
+        self.max_connections = max_connections
+        self.max_connections_per_host = max_connections_per_host
+        self.chunk_size = chunk_size
+        self.max_body_bytes = max_body_bytes
+        self.cache = cache
+        self.latency = latency or get_latency_recorder()
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.metrics = {
+            "requests": 0,
+            "failed_requests": 0,
+            "bytes_received": 0,
+            "total_fetch_time": 0.0,
+            "average_fetch_time": 0.0
+        }
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Return the pooled session, creating it for the running loop if needed."""
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._loop is not loop:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_connections,
+                limit_per_host=self.max_connections_per_host,
+                keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+                ttl_dns_cache=300
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=self.timeout,
+                headers={"User-Agent": HTTP_USER_AGENT}
+            )
+            self._loop = loop
+        return self._session
+
+    async def _lookup(self, url: str, headers: Optional[Dict[str, str]]):
+        """Cache, key and entry for a plain GET (all None when the cache is bypassed)."""
+        cache = self.cache if headers is None else None
+        if cache is None:
+            return None, None, None
+        key = canonicalize_url(url)
+        return cache, key, await cache.get_async(key)
+
+    async def fetch(self, url: str, headers: Optional[Dict[str, str]] = None,
+                    max_bytes: Optional[int] = None) -> FetchResult:
+        """
+        Fetch a URL, streaming the body in chunks.
+
+        Plain GETs go through the page cache when one is attached: fresh
+        entries are served directly and stale ones are revalidated with a
+        conditional GET.
+
+        Args:
+            url: Page URL to fetch
+            headers: Optional extra request headers (bypasses the cache)
+            max_bytes: Body size cap; longer bodies are truncated
+
+        Returns:
+            FetchResult with status, headers and raw body
+
+        Raises:
+            FetchError: On HTTP error status, timeout or connection failure
+        """
+        with get_tracer().span("http.fetch", url=url) as span:
+            result = await self._fetch(url, headers, max_bytes)
+            span.set_attributes(status=result.status, bytes=len(result.body),
+                                cache_status=result.cache_status, truncated=result.truncated)
+            return result
+
+    async def _fetch(self, url: str, headers: Optional[Dict[str, str]], max_bytes: Optional[int]) -> FetchResult:
+        max_bytes = self.max_body_bytes if max_bytes is None else max_bytes
+        cache, key, entry = await self._lookup(url, headers)
+        if entry is not None and entry.is_fresh():
+            cache.record_hit()
+            return self._from_entry(entry, "hit")
+
+        request_headers = dict(headers or {})
+        if entry is not None:
+            request_headers.update(entry.conditional_headers())
+
+        session = self._get_session()
+        start_time = time.monotonic()
+        self.metrics["requests"] += 1
+
+        try:
+            async with session.get(url, headers=request_headers or None) as response:
+                if response.status == 304 and entry is not None:
+                    entry = cache.refresh(key, entry, CIMultiDict(response.headers))
+                    self._update_metrics(time.monotonic() - start_time, 0)
+                    return self._from_entry(entry, "revalidated")
+
+                if response.status >= 400:
+                    raise FetchError(f"HTTP {response.status} for {url}", status=response.status,
+                                     retry_after=_retry_after(response.headers))
+
+                chunks = []
+                received = 0
+                truncated = False
+                async for chunk in response.content.iter_chunked(self.chunk_size):
+                    if received + len(chunk) > max_bytes:
+                        chunks.append(chunk[:max_bytes - received])
+                        truncated = True
+                        break
+                    chunks.append(chunk)
+                    received += len(chunk)
+                body = b"".join(chunks)
+
+                elapsed_time = time.monotonic() - start_time
+                self._update_metrics(elapsed_time, len(body))
+                response_headers = CIMultiDict(response.headers)
+                if cache is not None:
+                    cache.record_miss()
+                    if not truncated:
+                        cache.store(key, url, body, response_headers, response.charset)
+                return FetchResult(
+                    url=str(response.url),
+                    status=response.status,
+                    headers=response_headers,
+                    body=body,
+                    encoding=response.charset,
+                    elapsed=elapsed_time,
+                    cache_status="miss" if cache is not None else None,
+                    truncated=truncated
+                )
+
+        except FetchError:
+            self.metrics["failed_requests"] += 1
+            raise
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.metrics["failed_requests"] += 1
+            raise FetchError(f"Request to {url} failed: {str(e) or type(e).__name__}") from e
+
+    async def stream(self, url: str, max_bytes: Optional[int] = None) -> AsyncIterator[str]:
+        """
+        Yield the decoded body chunk by chunk as it arrives.
+
+        Stops after max_bytes. The consumer may stop early; the connection is
+        then released without reading the rest. Only complete bodies are
+        written to the page cache.
+
+        Raises:
+            FetchError: On HTTP error status, timeout or connection failure
+        """
+        max_bytes = self.max_body_bytes if max_bytes is None else max_bytes
+        cache, key, entry = await self._lookup(url, None)
+        if entry is not None and entry.is_fresh():
+            cache.record_hit()
+            for text in self._entry_chunks(entry):
+                yield text
+            return
+
+        request_headers = entry.conditional_headers() if entry is not None else {}
+        session = self._get_session()
+        start_time = time.monotonic()
+        self.metrics["requests"] += 1
+
+        try:
+            async with session.get(url, headers=request_headers or None) as response:
+                if response.status == 304 and entry is not None:
+                    entry = cache.refresh(key, entry, CIMultiDict(response.headers))
+                    self._update_metrics(time.monotonic() - start_time, 0)
+                    for text in self._entry_chunks(entry):
+                        yield text
+                    return
+
+                if response.status >= 400:
+                    raise FetchError(f"HTTP {response.status} for {url}", status=response.status,
+                                     retry_after=_retry_after(response.headers))
+
+                decoder = _incremental_decoder(response.charset)
+                chunks = []
+                received = 0
+                complete = False
+                async for chunk in response.content.iter_chunked(self.chunk_size):
+                    if received + len(chunk) > max_bytes:
+                        chunk = chunk[:max_bytes - received]
+                        received = max_bytes
+                        yield decoder.decode(chunk, final=True)
+                        break
+                    received += len(chunk)
+                    if cache is not None:
+                        chunks.append(chunk)
+                    yield decoder.decode(chunk)
+                else:
+                    complete = True
+                    tail = decoder.decode(b"", final=True)
+                    if tail:
+                        yield tail
+
+                self._update_metrics(time.monotonic() - start_time, received)
+                if cache is not None:
+                    cache.record_miss()
+                    if complete:
+                        cache.store(key, url, b"".join(chunks), CIMultiDict(response.headers), response.charset)
+
+        except FetchError:
+            self.metrics["failed_requests"] += 1
+            raise
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.metrics["failed_requests"] += 1
+            raise FetchError(f"Request to {url} failed: {str(e) or type(e).__name__}") from e
+
+    def _entry_chunks(self, entry: CacheEntry):
+        decoder = _incremental_decoder(entry.encoding)
+        body = entry.body
+        for offset in range(0, len(body), self.chunk_size):
+            yield decoder.decode(body[offset:offset + self.chunk_size])
+        tail = decoder.decode(b"", final=True)
+        if tail:
+            yield tail
+
+    @staticmethod
+    def _from_entry(entry: CacheEntry, cache_status: str) -> FetchResult:
+        return FetchResult(
+            url=entry.url,
+            status=200,
+            headers=CIMultiDict(entry.headers),
+            body=entry.body,
+            encoding=entry.encoding,
+            cache_status=cache_status
+        )
+
+    async def fetch_text(self, url: str) -> str:
+        """Fetch a URL and return the decoded body."""
+        result = await self.fetch(url)
+        return result.text
+
+    def _update_metrics(self, elapsed_time: float, size: int):
+        """Update fetch metrics."""
+        self.latency.observe("fetch", elapsed_time)
+        self.metrics["bytes_received"] += size
+        self.metrics["total_fetch_time"] += elapsed_time
+        completed = self.metrics["requests"] - self.metrics["failed_requests"]
+        self.metrics["average_fetch_time"] = self.metrics["total_fetch_time"] / max(completed, 1)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get fetcher metrics."""
+        return self.metrics
+
+    async def close(self):
+        """Close the pooled session."""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._loop = None
+
+_shared_fetcher: Optional[AsyncFetcher] = None
+
+def get_fetcher() -> AsyncFetcher:
+    """Get the process-wide fetcher shared by all agents, backed by the shared page cache."""
+    global _shared_fetcher
+    if _shared_fetcher is None:
+        _shared_fetcher = AsyncFetcher(cache=get_page_cache())
+    return _shared_fetcher
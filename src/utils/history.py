@@ -0,0 +1,428 @@
+from typing import Dict, Any, Optional, List, Tuple, Iterable
+from array import array
+from bisect import bisect_left
+import glob
+import json
+import os
+import struct
+import sys
+import threading
+import time
+import zlib
+from ..config import PRICE_HISTORY_DIR, PRICE_HISTORY_FLUSH_ROWS, PRICE_HISTORY_MAX_SEGMENTS
+from .singleflight import canonicalize_url
+
+SEGMENT_MAGIC = b"PHS1"
+SEGMENT_COLUMNS = ("series", "time", "price", "confidence")
+# Stored precision: prices in cents, confidence in thousandths, timestamps in milliseconds
+PRICE_SCALE = 100
+CONFIDENCE_SCALE = 1000
+TIME_SCALE = 1000
+
+def _encode_varints(values: Iterable[int]) -> bytes:
+    """Zigzag LEB128 encoding: small magnitudes, positive or negative, take one byte."""
+    out = bytearray()
+    for value in values:
+        value = (value << 1) ^ (value >> 63)
+        while value > 0x7f:
+            out.append((value & 0x7f) | 0x80)
+            value >>= 7
+        out.append(value)
+    return bytes(out)
+
+def _decode_varints(data: bytes) -> List[int]:
+    values = []
+    value = shift = 0
+    for byte in data:
+        value |= (byte & 0x7f) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        values.append((value >> 1) ^ -(value & 1))
+        value = shift = 0
+    return values
+
+class Observation:
+    """One price observation of a plan."""
+
+    __slots__ = ("url", "plan_name", "speed", "price", "confidence", "timestamp")
+
+    def __init__(self, url: str, plan_name: str, speed: float, price: float, confidence: float, timestamp: float):
+        self.url = url
+        self.plan_name = plan_name
+        self.speed = speed
+        self.price = price
+        self.confidence = confidence
+        self.timestamp = timestamp
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self) -> str:
+        return f"Observation({self.url!r}, {self.plan_name!r}, {self.speed:g}, {self.price:.2f}, @{self.timestamp:.0f})"
+
+class PriceHistory:
+    """
+    Columnar store of (url, plan, speed, price, confidence, timestamp) observations.
+
+    In memory, each observation is one entry in four typed arrays: a series
+    id (the dictionary-encoded url, plan name and speed), the timestamp, the
+    price and the confidence. Observation objects are only built for query
+    results. A per-series list of row positions, kept in timestamp order,
+    answers per-plan queries with a binary search.
+
+    On disk, rows are appended in segments. Each segment dictionary-encodes
+    its series and stores timestamps, prices and confidences as deltas
+    (timestamps against the previous row, prices and confidences against
+    the previous row of the same series), varint-packed and compressed.
+    Prices are kept to the cent, confidences to 0.001 and timestamps to the
+    millisecond.
+
+    Segment writes hold the store lock only while copying the rows they
+    cover; encoding and file I/O run without it, one writer at a time, so
+    a flush on a worker thread never stalls appends.
+    """
+
+    def __init__(self,
+                 directory: Optional[str] = PRICE_HISTORY_DIR,
+                 flush_rows: int = PRICE_HISTORY_FLUSH_ROWS,
+                 max_segments: int = PRICE_HISTORY_MAX_SEGMENTS):
+        self.directory = directory or None
+        self.flush_rows = flush_rows
+        self.max_segments = max_segments
+        self._series: List[Tuple[str, str, float]] = []
+        self._series_ids: Dict[Tuple[str, str, float], int] = {}
+        self._series_by_url: Dict[str, List[int]] = {}
+        self._positions: List[array] = []
+        self._series_col = array("I")
+        self._time = array("d")
+        self._price = array("d")
+        self._confidence = array("d")
+        # Whether the time column is sorted, so global time ranges can be bisected
+        self._sorted = True
+        self._saved_rows = 0
+        self._segments: List[str] = []
+        self._lock = threading.Lock()
+        # Serializes flush and compact, which do their encoding and I/O outside _lock
+        self._write_lock = threading.Lock()
+        self.metrics = {
+            "appended": 0,
+            "queries": 0,
+            "rows_scanned": 0,
+            "segments_written": 0,
+            "compactions": 0,
+            "bytes_written": 0
+        }
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            self._load()
+
+    def __len__(self) -> int:
+        return len(self._time)
+
+    @staticmethod
+    def normalize_name(plan_name: Optional[str]) -> str:
+        return " ".join((plan_name or "").split())
+
+    def _series_id(self, url: str, plan_name: str, speed: float) -> int:
+        key = (url, plan_name, speed)
+        series_id = self._series_ids.get(key)
+        if series_id is None:
+            series_id = len(self._series)
+            self._series.append(key)
+            self._series_ids[key] = series_id
+            self._series_by_url.setdefault(url, []).append(series_id)
+            self._positions.append(array("I"))
+        return series_id
+
+    def _add(self, series_id: int, timestamp: float, price: float, confidence: float):
+        row = len(self._time)
+        if row and timestamp < self._time[-1]:
+            self._sorted = False
+        self._series_col.append(series_id)
+        self._time.append(timestamp)
+        self._price.append(price)
+        self._confidence.append(confidence)
+        positions = self._positions[series_id]
+        if positions and timestamp < self._time[positions[-1]]:
+            positions.insert(self._bisect_time(positions, timestamp), row)
+        else:
+            positions.append(row)
+
+    def _bisect_time(self, positions: array, timestamp: float) -> int:
+        """First index in a time-ordered position list whose row is at or after timestamp."""
+        # bisect's key argument needs Python 3.10
+        low, high = 0, len(positions)
+        while low < high:
+            middle = (low + high) // 2
+            if self._time[positions[middle]] < timestamp:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def append(self, url: str, plan_name: Optional[str], speed: float, price: float,
+               confidence: float = 0.0, timestamp: Optional[float] = None, flush: bool = True):
+        """
+        Record an observation.
+
+        Args:
+            url: Page URL (canonicalized)
+            plan_name: Plan name (whitespace-normalized; None is stored as "")
+            speed: Plan download speed in Mbps
+            price: Monthly price
+            confidence: Confidence of the price
+            timestamp: Seconds since the epoch; defaults to now
+            flush: Write a segment here once flush_rows rows are unsaved; callers
+                on an event loop pass False and run flush() elsewhere when flush_due
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        with self._lock:
+            series_id = self._series_id(canonicalize_url(url), self.normalize_name(plan_name), float(speed))
+            self._add(series_id,
+                      round(timestamp * TIME_SCALE) / TIME_SCALE,
+                      round(price * PRICE_SCALE) / PRICE_SCALE,
+                      round(confidence * CONFIDENCE_SCALE) / CONFIDENCE_SCALE)
+            self.metrics["appended"] += 1
+        if flush and self.flush_due:
+            self.flush()
+
+    @property
+    def flush_due(self) -> bool:
+        """Whether flush_rows rows are waiting for a segment."""
+        return bool(self.directory) and len(self) - self._saved_rows >= self.flush_rows
+
+    def record(self, url: str, download_speed: float, plan_name: Optional[str], result: Dict[str, Any],
+               timestamp: Optional[float] = None, flush: bool = True) -> bool:
+        """
+        Record a get_plan_price result; returns False if it carries no price.
+
+        The plan is named by the query, or else by the name the extraction
+        reported; its speed is the extracted speed, or else the query's.
+        """
+        if result.get("price") is None:
+            return False
+        details = result.get("details") or {}
+        name = plan_name or result.get("name") or details.get("plan") or details.get("name")
+        speed = result.get("speed") or download_speed
+        self.append(url, name, speed, result["price"], result.get("confidence") or 0.0, timestamp, flush)
+        return True
+
+    def query(self,
+              url: Optional[str] = None,
+              plan_name: Optional[str] = None,
+              speed: Optional[float] = None,
+              start: Optional[float] = None,
+              end: Optional[float] = None) -> List[Observation]:
+        """
+        Observations in the time range [start, end), oldest first.
+
+        Args:
+            url: Only this page (canonicalized)
+            plan_name: Only this plan name (exact after whitespace normalization)
+            speed: Only this plan speed
+            start, end: Time range in seconds since the epoch (open-ended if None)
+        """
+        self.metrics["queries"] += 1
+        with self._lock:
+            if url is not None:
+                rows = []
+                for series_id in self._series_by_url.get(canonicalize_url(url), []):
+                    if self._series_matches(series_id, plan_name, speed):
+                        rows.extend(self._series_rows(series_id, start, end))
+                rows.sort(key=lambda row: (self._time[row], row))
+            else:
+                rows = [row for row in self._time_rows(start, end)
+                        if self._series_matches(self._series_col[row], plan_name, speed)]
+            self.metrics["rows_scanned"] += len(rows)
+            return [self._observation(row) for row in rows]
+
+    def plans(self, url: Optional[str] = None) -> List[Tuple[str, str, float]]:
+        """(url, plan name, speed) of every tracked series, optionally for one page."""
+        with self._lock:
+            if url is None:
+                return list(self._series)
+            return [self._series[series_id] for series_id in self._series_by_url.get(canonicalize_url(url), [])]
+
+    def _series_matches(self, series_id: int, plan_name: Optional[str], speed: Optional[float]) -> bool:
+        _, name, series_speed = self._series[series_id]
+        if plan_name is not None and name != self.normalize_name(plan_name):
+            return False
+        return speed is None or series_speed == float(speed)
+
+    def _series_rows(self, series_id: int, start: Optional[float], end: Optional[float]) -> List[int]:
+        positions = self._positions[series_id]
+        low = self._bisect_time(positions, start) if start is not None else 0
+        high = self._bisect_time(positions, end) if end is not None else len(positions)
+        return positions[low:high].tolist()
+
+    def _time_rows(self, start: Optional[float], end: Optional[float]) -> Iterable[int]:
+        if self._sorted:
+            low = bisect_left(self._time, start) if start is not None else 0
+            high = bisect_left(self._time, end) if end is not None else len(self._time)
+            return range(low, high)
+        # Rows appended out of order: scan the time column
+        return [row for row, timestamp in enumerate(self._time)
+                if (start is None or timestamp >= start) and (end is None or timestamp < end)]
+
+    def _observation(self, row: int) -> Observation:
+        url, plan_name, speed = self._series[self._series_col[row]]
+        return Observation(url, plan_name, speed, self._price[row], self._confidence[row], self._time[row])
+
+    def flush(self):
+        """Write rows appended since the last flush as a new segment, compacting when there are too many."""
+        if not self.directory:
+            return
+        with self._write_lock:
+            if self._saved_rows < len(self):
+                self._saved_rows = self._write_segment(self._saved_rows)
+            if len(self._segments) > self.max_segments:
+                self._compact()
+
+    def compact(self):
+        """Rewrite every row into one segment and remove the segments it replaces."""
+        if not self.directory:
+            return
+        with self._write_lock:
+            self._compact()
+
+    def _compact(self):
+        replaced = list(self._segments)
+        self._saved_rows = self._write_segment(0, compacts=True)
+        self._segments = self._segments[-1:]
+        self.metrics["compactions"] += 1
+        for path in replaced:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _write_segment(self, start: int, compacts: bool = False) -> int:
+        """Write rows from start to the current end as a segment; returns the end row. Needs _write_lock."""
+        with self._lock:
+            stop = len(self)
+            columns = (self._series_col[start:stop], self._time[start:stop],
+                       self._price[start:stop], self._confidence[start:stop])
+            series = list(self._series)
+
+        local_ids: Dict[int, int] = {}
+        series_col, time_col, price_col, confidence_col = [], [], [], []
+        last_time = 0
+        last_price: Dict[int, int] = {}
+        last_confidence: Dict[int, int] = {}
+        for series_id, timestamp, price, confidence in zip(*columns):
+            local = local_ids.setdefault(series_id, len(local_ids))
+            series_col.append(local)
+            timestamp = round(timestamp * TIME_SCALE)
+            time_col.append(timestamp - last_time)
+            last_time = timestamp
+            price = round(price * PRICE_SCALE)
+            price_col.append(price - last_price.get(local, 0))
+            last_price[local] = price
+            confidence = round(confidence * CONFIDENCE_SCALE)
+            confidence_col.append(confidence - last_confidence.get(local, 0))
+            last_confidence[local] = confidence
+
+        number = int(os.path.basename(self._segments[-1]).split(".")[0]) + 1 if self._segments else 1
+        header = json.dumps({
+            "rows": len(series_col),
+            "series": [list(series[series_id]) for series_id in local_ids],
+            "columns": SEGMENT_COLUMNS,
+            # A compacted segment holds every row of the segments numbered before it
+            "compacts": compacts
+        }).encode("utf-8")
+        parts = [SEGMENT_MAGIC, struct.pack(">I", len(header)), header]
+        for column in (series_col, time_col, price_col, confidence_col):
+            blob = zlib.compress(_encode_varints(column))
+            parts += [struct.pack(">I", len(blob)), blob]
+        data = b"".join(parts)
+
+        path = os.path.join(self.directory, f"{number:08d}.phs")
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        self._segments.append(path)
+        self.metrics["segments_written"] += 1
+        self.metrics["bytes_written"] += len(data)
+        return stop
+
+    def _load(self):
+        paths = sorted(glob.glob(os.path.join(self.directory, "*.phs")))
+        segments = []
+        for path in paths:
+            segment = self._read_segment(path)
+            if segment is None:
+                continue
+            if segment[0]["compacts"]:
+                # Leftovers of an interrupted compaction are already in this segment
+                segments = []
+            segments.append((path, segment))
+        for path, (header, columns) in segments:
+            series_ids = [self._series_id(url, plan_name, float(speed)) for url, plan_name, speed in header["series"]]
+            series_col, time_col, price_col, confidence_col = columns
+            timestamp = 0
+            last_price: Dict[int, int] = {}
+            last_confidence: Dict[int, int] = {}
+            for local, time_delta, price_delta, confidence_delta in zip(series_col, time_col, price_col, confidence_col):
+                timestamp += time_delta
+                price = last_price[local] = last_price.get(local, 0) + price_delta
+                confidence = last_confidence[local] = last_confidence.get(local, 0) + confidence_delta
+                self._add(series_ids[local], timestamp / TIME_SCALE, price / PRICE_SCALE,
+                          confidence / CONFIDENCE_SCALE)
+            self._segments.append(path)
+        self._saved_rows = len(self)
+
+    @staticmethod
+    def _read_segment(path: str) -> Optional[Tuple[Dict[str, Any], List[List[int]]]]:
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            if data[:4] != SEGMENT_MAGIC:
+                return None
+            offset = 4
+            (length,) = struct.unpack_from(">I", data, offset)
+            header = json.loads(data[offset + 4:offset + 4 + length])
+            offset += 4 + length
+            columns = []
+            for _ in SEGMENT_COLUMNS:
+                (length,) = struct.unpack_from(">I", data, offset)
+                columns.append(_decode_varints(zlib.decompress(data[offset + 4:offset + 4 + length])))
+                offset += 4 + length
+            if any(len(column) != header["rows"] for column in columns):
+                return None
+            return header, columns
+        except (OSError, ValueError, struct.error, zlib.error):
+            # An unreadable segment is skipped; its rows are lost, the rest still load
+            return None
+
+    def memory_bytes(self) -> int:
+        """Approximate memory held by the columns, position lists and series table."""
+        columns = sum(column.itemsize * len(column)
+                      for column in (self._series_col, self._time, self._price, self._confidence))
+        positions = sum(positions.itemsize * len(positions) for positions in self._positions)
+        series = sum(sys.getsizeof(url) + sys.getsizeof(name) + 24 for url, name, _ in self._series)
+        return columns + positions + series
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get store counters and the memory cost per observation."""
+        rows = len(self)
+        memory = self.memory_bytes()
+        return {
+            **self.metrics,
+            "rows": rows,
+            "series": len(self._series),
+            "segments": len(self._segments),
+            "unsaved_rows": rows - self._saved_rows,
+            "memory_bytes": memory,
+            "bytes_per_observation": memory / rows if rows else 0.0
+        }
+
+_shared_history: Optional[PriceHistory] = None
+
+def get_price_history() -> PriceHistory:
+    """Get the process-wide price history."""
+    global _shared_history
+    if _shared_history is None:
+        _shared_history = PriceHistory()
+    return _shared_history
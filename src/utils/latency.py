@@ -0,0 +1,144 @@
+from typing import Dict, Any, Optional, List
+from bisect import bisect_left
+from contextlib import contextmanager
+import re
+import threading
+import time
+
+# Log-spaced bucket bounds from 0.1ms to about 10 minutes; each bucket spans 20%
+BUCKET_BOUNDS = [0.0001 * 1.2 ** i for i in range(86)]
+QUANTILES = (0.5, 0.95, 0.99)
+
+class LatencyHistogram:
+    """
+    Fixed-bucket latency histogram with percentile estimates.
+
+    Recording is a bisect and a few increments under a lock, so it is safe
+    from the event loop and from executor threads. Percentiles are accurate
+    to the 20% bucket width and never exceed the observed maximum.
+    """
+
+    def __init__(self, bounds: List[float] = BUCKET_BOUNDS):
+        self.bounds = bounds
+        # Last bucket collects everything above the highest bound
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        index = bisect_left(self.bounds, seconds)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.total += seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def percentile(self, quantile: float) -> float:
+        """Estimated latency at a quantile between 0 and 1."""
+        with self._lock:
+            if not self.count:
+                return 0.0
+            rank = quantile * self.count
+            seen = 0
+            for index, bucket_count in enumerate(self.counts):
+                seen += bucket_count
+                if seen >= rank and bucket_count:
+                    upper = self.bounds[index] if index < len(self.bounds) else self.max
+                    return min(upper, self.max)
+            return self.max
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            count, total, maximum = self.count, self.total, self.max
+        return {
+            "count": count,
+            "mean": total / count if count else 0.0,
+            "p50": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99),
+            "max": maximum,
+            "sum": total
+        }
+
+class LatencyRecorder:
+    """Per-stage latency histograms (fetch, parse, extract, llm, fallback_fanout...)."""
+
+    def __init__(self):
+        self._histograms: Dict[str, LatencyHistogram] = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, stage: str) -> LatencyHistogram:
+        histogram = self._histograms.get(stage)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(stage, LatencyHistogram())
+        return histogram
+
+    def observe(self, stage: str, seconds: float):
+        """Record one duration for a stage."""
+        self.histogram(stage).observe(seconds)
+
+    @contextmanager
+    def time(self, stage: str):
+        """Time the enclosed block on the monotonic clock, including when it raises."""
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start_time)
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """Percentile summary of every stage."""
+        with self._lock:
+            stages = list(self._histograms.items())
+        return {stage: histogram.snapshot() for stage, histogram in sorted(stages)}
+
+    def reset(self):
+        with self._lock:
+            self._histograms = {}
+
+    def to_prometheus(self, prefix: str = "price_retriever") -> str:
+        """Stage latencies as Prometheus summaries in text exposition format."""
+        name = f"{prefix}_stage_latency_seconds"
+        lines = [
+            f"# HELP {name} Latency of each pipeline stage.",
+            f"# TYPE {name} summary"
+        ]
+        for stage, summary in self.snapshot().items():
+            for quantile in QUANTILES:
+                value = summary[f"p{int(quantile * 100)}"]
+                lines.append(f'{name}{{stage="{stage}",quantile="{quantile}"}} {value:.6f}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {summary["sum"]:.6f}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {summary["count"]}')
+        return "\n".join(lines) + "\n"
+
+def prometheus_gauges(metrics: Dict[str, Any], prefix: str = "price_retriever") -> str:
+    """Numeric leaves of a nested metrics dict as Prometheus gauges."""
+    lines = []
+
+    def visit(path: str, value: Any):
+        if isinstance(value, bool):
+            value = int(value)
+        if isinstance(value, (int, float)):
+            name = re.sub(r"[^a-zA-Z0-9_]", "_", path)
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+        elif isinstance(value, dict):
+            for key, child in value.items():
+                visit(f"{path}_{key}", child)
+
+    for key, value in metrics.items():
+        visit(f"{prefix}_{key}", value)
+    return "\n".join(lines) + "\n" if lines else ""
+
+_shared_recorder: Optional[LatencyRecorder] = None
+
+def get_latency_recorder() -> LatencyRecorder:
+    """Get the process-wide latency recorder."""
+    global _shared_recorder
+    if _shared_recorder is None:
+        _shared_recorder = LatencyRecorder()
+    return _shared_recorder
@@ -0,0 +1,104 @@
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+import asyncio
+from ..config import MICROBATCH_WINDOW, MICROBATCH_MAX_SIZE, MICROBATCH_MAX_TOKENS
+
+class MicroBatcher:
+    """
+    Collects concurrent submissions into batches for one downstream call.
+
+    A batch is sent when it reaches max_size items, when the next item would
+    take it past max_tokens, or window seconds after its first item arrived.
+    send receives the batch's items and returns one result per item, in
+    order; a result that is an exception fails only that item's caller. If
+    send itself raises, every caller in the batch gets the error.
+    """
+
+    def __init__(self,
+                 send: Callable[[List[Any]], Awaitable[List[Any]]],
+                 window: float = MICROBATCH_WINDOW,
+                 max_size: int = MICROBATCH_MAX_SIZE,
+                 max_tokens: int = MICROBATCH_MAX_TOKENS):
+        self.send = send
+        self.window = window
+        self.max_size = max(1, max_size)
+        self.max_tokens = max_tokens
+        self._pending: List[Tuple[Any, asyncio.Future]] = []
+        self._pending_tokens = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self.metrics = {
+            "submitted": 0,
+            "batches": 0,
+            "flushed_full": 0,
+            "flushed_tokens": 0,
+            "flushed_window": 0,
+            "failed_items": 0
+        }
+
+    async def submit(self, item: Any, tokens: int = 0) -> Any:
+        """
+        Add an item to the current batch and wait for its result.
+
+        Args:
+            item: Passed to send as part of a batch
+            tokens: Estimated size of the item, counted against max_tokens
+
+        Returns:
+            The item's result from send
+        """
+        loop = asyncio.get_running_loop()
+        self.metrics["submitted"] += 1
+        if self._pending and self._pending_tokens + tokens > self.max_tokens:
+            self._flush("flushed_tokens")
+        future = loop.create_future()
+        self._pending.append((item, future))
+        self._pending_tokens += tokens
+        if len(self._pending) >= self.max_size:
+            self._flush("flushed_full")
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush, "flushed_window")
+        return await future
+
+    def _flush(self, reason: str):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending, self._pending_tokens = self._pending, [], 0
+        self.metrics["batches"] += 1
+        self.metrics[reason] += 1
+        task = asyncio.ensure_future(self._send(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, batch: List[Tuple[Any, asyncio.Future]]):
+        try:
+            results = await self.send([item for item, _ in batch])
+            if len(results) != len(batch):
+                raise ValueError(f"Batch returned {len(results)} results for {len(batch)} items")
+        except Exception as e:
+            results = [e] * len(batch)
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                # The caller was cancelled while the batch was in flight
+                continue
+            if isinstance(result, BaseException):
+                self.metrics["failed_items"] += 1
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    async def close(self):
+        """Send the pending batch and wait for batches in flight."""
+        self._flush("flushed_window")
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get batching counters and the average batch size."""
+        return {
+            **self.metrics,
+            "average_batch_size": self.metrics["submitted"] / self.metrics["batches"] if self.metrics["batches"] else 0.0,
+            "pending": len(self._pending)
+        }
@@ -0,0 +1,273 @@
+from typing import Dict, Any, Optional
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from ..config import PAGE_CACHE_MAX_BYTES, PAGE_CACHE_DIR, PAGE_CACHE_DEFAULT_TTL
+from .disk_writer import DiskWriter
+
+def parse_cache_control(header: Optional[str]) -> Dict[str, Any]:
+    """Parse a Cache-Control header into a directive dict."""
+    directives = {}
+    if not header:
+        return directives
+    for part in header.split(","):
+        part = part.strip().lower()
+        if not part:
+            continue
+        if "=" in part:
+            name, value = part.split("=", 1)
+            value = value.strip('"')
+            try:
+                directives[name.strip()] = int(value)
+            except ValueError:
+                directives[name.strip()] = value
+        else:
+            directives[part] = True
+    return directives
+
+class CacheEntry:
+    """Cached page body with the validators needed to revalidate it."""
+
+    def __init__(self, url: str, body: bytes, headers: Dict[str, str],
+                 encoding: Optional[str], stored_at: float, ttl: float):
+        self.url = url
+        self.body = body
+        self.headers = headers
+        self.encoding = encoding
+        self.stored_at = stored_at
+        self.ttl = ttl
+
+    @property
+    def etag(self) -> Optional[str]:
+        return self.headers.get("ETag")
+
+    @property
+    def last_modified(self) -> Optional[str]:
+        return self.headers.get("Last-Modified")
+
+    def is_fresh(self, now: Optional[float] = None) -> bool:
+        """Whether the entry can be served without revalidation."""
+        now = time.time() if now is None else now
+        return now - self.stored_at < self.ttl
+
+    def conditional_headers(self) -> Dict[str, str]:
+        """Request headers for a conditional GET."""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+class PageCache:
+    """
+    Two-tier HTTP page cache: size-bounded memory LRU over an on-disk store.
+
+    Disk writes run on a DiskWriter and get_async() reads the disk off the
+    event loop, so the disk tier never stalls concurrent requests.
+    """
+
+    # Response headers kept with an entry
+    STORED_HEADERS = ("ETag", "Last-Modified", "Cache-Control", "Expires", "Content-Type", "Date")
+
+    def __init__(self,
+                 max_memory_bytes: int = PAGE_CACHE_MAX_BYTES,
+                 disk_dir: Optional[str] = PAGE_CACHE_DIR,
+                 default_ttl: float = PAGE_CACHE_DEFAULT_TTL):
+        self.max_memory_bytes = max_memory_bytes
+        self.disk_dir = disk_dir or None
+        self.default_ttl = default_ttl
+        self._memory: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self._writer = DiskWriter("page-cache")
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+        self.metrics = {
+            "hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "revalidations": 0,
+            "stores": 0,
+            "evictions": 0
+        }
+
+    def ttl_for(self, headers: Dict[str, str]) -> Optional[float]:
+        """
+        Freshness lifetime allowed by the response headers.
+
+        Returns None when the response must not be stored.
+        """
+        directives = parse_cache_control(headers.get("Cache-Control"))
+        if "no-store" in directives:
+            return None
+        if "no-cache" in directives:
+            return 0.0
+        if isinstance(directives.get("max-age"), int):
+            return float(directives["max-age"])
+        if headers.get("Expires"):
+            try:
+                expires = parsedate_to_datetime(headers["Expires"]).timestamp()
+                return max(expires - time.time(), 0.0)
+            except (TypeError, ValueError):
+                return 0.0
+        return self.default_ttl
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        """Look up an entry in memory, then on disk."""
+        entry = self._get_memory(key)
+        if entry is not None:
+            return entry
+        return self._disk_hit(key, self._read_disk(key))
+
+    async def get_async(self, key: str) -> Optional[CacheEntry]:
+        """get() for callers on the event loop: a memory miss reads the disk in a worker thread."""
+        entry = self._get_memory(key)
+        if entry is not None or not self.disk_dir:
+            return entry
+        loop = asyncio.get_running_loop()
+        return self._disk_hit(key, await loop.run_in_executor(None, self._read_disk, key))
+
+    def _get_memory(self, key: str) -> Optional[CacheEntry]:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+            return entry
+
+    def _disk_hit(self, key: str, entry: Optional[CacheEntry]) -> Optional[CacheEntry]:
+        if entry is not None:
+            self.metrics["disk_hits"] += 1
+            self._put_memory(key, entry)
+        return entry
+
+    def store(self, key: str, url: str, body: bytes, headers: Dict[str, str],
+              encoding: Optional[str]) -> Optional[CacheEntry]:
+        """Store a 200 response if its headers allow it."""
+        ttl = self.ttl_for(headers)
+        if ttl is None:
+            return None
+        kept = {name: headers[name] for name in self.STORED_HEADERS if name in headers}
+        entry = CacheEntry(url, body, kept, encoding, time.time(), ttl)
+        self._put_memory(key, entry)
+        self._writer.submit(self._write_disk, key, entry)
+        self.metrics["stores"] += 1
+        return entry
+
+    def refresh(self, key: str, entry: CacheEntry, headers: Dict[str, str]) -> CacheEntry:
+        """Renew an entry after a 304 Not Modified response."""
+        self.metrics["revalidations"] += 1
+        entry.headers.update({name: headers[name] for name in self.STORED_HEADERS
+                              if name in headers and name != "Content-Type"})
+        ttl = self.ttl_for(headers)
+        entry.ttl = self.default_ttl if ttl is None else ttl
+        entry.stored_at = time.time()
+        self._put_memory(key, entry)
+        self._writer.submit(self._write_disk, key, entry, True)
+        return entry
+
+    def record_hit(self):
+        self.metrics["hits"] += 1
+
+    def record_miss(self):
+        self.metrics["misses"] += 1
+
+    def _put_memory(self, key: str, entry: CacheEntry):
+        size = len(entry.body)
+        if size > self.max_memory_bytes:
+            return
+        with self._lock:
+            previous = self._memory.pop(key, None)
+            if previous is not None:
+                self._memory_bytes -= len(previous.body)
+            self._memory[key] = entry
+            self._memory_bytes += size
+            while self._memory_bytes > self.max_memory_bytes:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= len(evicted.body)
+                self.metrics["evictions"] += 1
+
+    def _disk_paths(self, key: str):
+        name = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return (os.path.join(self.disk_dir, f"{name}.json"),
+                os.path.join(self.disk_dir, f"{name}.body"))
+
+    def _write_disk(self, key: str, entry: CacheEntry, meta_only: bool = False):
+        if not self.disk_dir:
+            return
+        meta_path, body_path = self._disk_paths(key)
+        try:
+            if not meta_only:
+                self._atomic_write(body_path, entry.body)
+            meta = {
+                "url": entry.url,
+                "headers": entry.headers,
+                "encoding": entry.encoding,
+                "stored_at": entry.stored_at,
+                "ttl": entry.ttl
+            }
+            self._atomic_write(meta_path, json.dumps(meta).encode("utf-8"))
+        except OSError:
+            # Disk tier is best effort; memory tier still serves the entry
+            pass
+
+    def _read_disk(self, key: str) -> Optional[CacheEntry]:
+        if not self.disk_dir:
+            return None
+        meta_path, body_path = self._disk_paths(key)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            with open(body_path, "rb") as f:
+                body = f.read()
+        except (OSError, ValueError):
+            return None
+        return CacheEntry(meta["url"], body, meta["headers"], meta["encoding"],
+                          meta["stored_at"], meta["ttl"])
+
+    @staticmethod
+    def _atomic_write(path: str, data: bytes):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def flush(self):
+        """Wait for queued disk writes."""
+        self._writer.flush()
+
+    def clear(self):
+        """Drop every entry from both tiers."""
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+        self._writer.flush()
+        if self.disk_dir and os.path.isdir(self.disk_dir):
+            for name in os.listdir(self.disk_dir):
+                if name.endswith((".json", ".body")):
+                    try:
+                        os.remove(os.path.join(self.disk_dir, name))
+                    except OSError:
+                        pass
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get cache counters and memory usage."""
+        return {
+            **self.metrics,
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_bytes
+        }
+
+_shared_cache: Optional[PageCache] = None
+
+def get_page_cache() -> PageCache:
+    """Get the process-wide page cache."""
+    global _shared_cache
+    if _shared_cache is None:
+        _shared_cache = PageCache()
+    return _shared_cache
@@ -0,0 +1,193 @@
+from typing import Dict, Any, Optional, Callable
+import asyncio
+import contextvars
+import time
+from .fetcher import AsyncFetcher, get_fetcher
+from .singleflight import SingleFlight, canonicalize_url, content_hash
+from .extraction import ExtractionEngine, PageIndex, ContainerIndex, get_extraction_engine
+from .parsers import get_parser_backend
+from .parse_pool import ParsePool
+from .streaming import StreamingExtractor
+from .latency import LatencyRecorder, get_latency_recorder
+from .tracing import get_tracer
+from ..config import STREAM_MAX_BYTES, PARSE_MODE
+
+class ParsedPage:
+    """Fetched page content together with its parsed tree and plan index."""
+
+    def __init__(self, url: Optional[str], content: Optional[str], content_hash: Optional[str],
+                 tree: Any, index: PageIndex, parser: str,
+                 stats: Optional[Dict[str, Any]] = None):
+        self.url = url
+        # Content, hash and tree are None for streamed pages, which keep only the index
+        self.content = content
+        self.content_hash = content_hash
+        # Native tree of the parser backend (BeautifulSoup or selectolax); None when parsed in a worker process
+        self.tree = tree
+        self.index = index
+        self.parser = parser
+        self.stats = stats or {}
+
+class PageLoader:
+    """Fetches and parses pages, sharing in-flight work between callers."""
+
+    def __init__(self, fetcher: Optional[AsyncFetcher] = None,
+                 engine: Optional[ExtractionEngine] = None,
+                 parser: Optional[str] = None,
+                 latency: Optional[LatencyRecorder] = None,
+                 parse_mode: Optional[str] = None):
+        self.fetcher = fetcher or get_fetcher()
+        self.engine = engine or get_extraction_engine()
+        self.parser = get_parser_backend(parser)
+        self.latency = latency or get_latency_recorder()
+        parse_mode = parse_mode or PARSE_MODE
+        if parse_mode not in ("thread", "process"):
+            raise ValueError(f"Unknown parse mode: {parse_mode}")
+        self.parse_pool = ParsePool(self.parser.name) if parse_mode == "process" else None
+        self._fetches = SingleFlight()
+        self._loads = SingleFlight()
+        self._parses = SingleFlight()
+        self._streams = SingleFlight()
+
+    async def load(self, url: str) -> ParsedPage:
+        """
+        Fetch and parse a page.
+
+        Concurrent loads of the same canonical URL await one download and parse.
+        """
+        return await self._loads.do(canonicalize_url(url), lambda: self._load(url))
+
+    async def _load(self, url: str) -> ParsedPage:
+        with get_tracer().span("page.load", url=url):
+            content = await self.fetch_text(url)
+            return await self.parse(content, url)
+
+    async def fetch_text(self, url: str) -> str:
+        """
+        Download a page without parsing it.
+
+        Concurrent fetches of the same canonical URL, including those made
+        by load(), await one download.
+        """
+        return await self._fetches.do(canonicalize_url(url), lambda: self.fetcher.fetch_text(url))
+
+    async def parse(self, content: str, url: Optional[str] = None) -> ParsedPage:
+        """
+        Parse and index page content.
+
+        Concurrent parses of identical content share one tree and index.
+        """
+        digest = content_hash(content)
+        tree, index = await self._parses.do(digest, lambda: self._parse(content))
+        return ParsedPage(url, content, digest, tree, index, self.parser.name)
+
+    async def _parse(self, content: str):
+        if self.parse_pool is not None:
+            return await self._parse_in_process(content)
+        # Parse off the event loop so fetches keep progressing meanwhile;
+        # the copied context keeps the parse span inside the caller's trace
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(None, context.run, self._parse_sync, content)
+
+    def _parse_sync(self, content: str):
+        with get_tracer().span("page.parse", parser=self.parser.name, bytes=len(content)) as span, \
+                self.latency.time("parse"):
+            tree, index = self.parser.index(content, self.engine)
+            span.set_attribute("containers", len(index.containers))
+            return tree, index
+
+    async def _parse_in_process(self, content: str):
+        # Worker processes keep no tree: only the index, with plans extracted, comes back
+        with get_tracer().span("page.parse", parser=self.parser.name, bytes=len(content), mode="process") as span, \
+                self.latency.time("parse"):
+            index = await self.parse_pool.index(content)
+            span.set_attribute("containers", len(index.containers))
+            return None, index
+
+    async def locate(self, url: str, path: str, ordinal: int = 0,
+                     content: Optional[str] = None) -> Optional[ContainerIndex]:
+        """
+        Index only the plan container at a selector path and ordinal of a page.
+
+        The page (fetched unless its content is given) is parsed with the
+        native backend but not indexed as a whole; returns None if no such
+        container exists.
+        """
+        with get_tracer().span("page.locate", url=url, path=path) as span:
+            if content is None:
+                content = await self.fetch_text(url)
+            loop = asyncio.get_running_loop()
+            context = contextvars.copy_context()
+            container = await loop.run_in_executor(None, context.run, self._locate_sync, content, path, ordinal)
+            span.set_attribute("found", container is not None)
+            return container
+
+    def _locate_sync(self, content: str, path: str, ordinal: int) -> Optional[ContainerIndex]:
+        with self.latency.time("parse"):
+            return self.parser.locate(content, self.engine, path, ordinal)
+
+    async def stream(self, url: str,
+                     stop: Optional[Callable[[ContainerIndex], bool]] = None,
+                     flight_key: Optional[str] = None,
+                     max_bytes: int = STREAM_MAX_BYTES) -> ParsedPage:
+        """
+        Fetch and index a page incrementally with bounded memory.
+
+        Non-content markup is skipped, the download stops at max_bytes, and
+        parsing stops as soon as stop() accepts a completed container.
+        Callers passing the same flight_key share one stream.
+        """
+        if flight_key is None:
+            return await self._stream(url, stop, max_bytes)
+        key = f"{canonicalize_url(url)}|{flight_key}"
+        return await self._streams.do(key, lambda: self._stream(url, stop, max_bytes))
+
+    async def _stream(self, url: str, stop, max_bytes: int) -> ParsedPage:
+        with get_tracer().span("page.stream", url=url) as span:
+            page = await self._stream_page(url, stop, max_bytes)
+            span.set_attributes(**page.stats)
+            return page
+
+    async def _stream_page(self, url: str, stop, max_bytes: int) -> ParsedPage:
+        extractor = StreamingExtractor(self.engine, stop=stop)
+        chunks = self.fetcher.stream(url, max_bytes=max_bytes)
+        # Only time spent tokenizing counts as parse time, not waiting on the network
+        parse_time = 0.0
+        try:
+            async for text in chunks:
+                start_time = time.perf_counter()
+                extractor.feed(text)
+                parse_time += time.perf_counter() - start_time
+                if extractor.stopped:
+                    break
+        finally:
+            await chunks.aclose()
+        start_time = time.perf_counter()
+        index = extractor.result()
+        self.latency.observe("parse", parse_time + time.perf_counter() - start_time)
+        return ParsedPage(url, None, None, None, index, "stream", stats=extractor.get_stats())
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get load and parse coalescing metrics."""
+        return {
+            "fetches": self._fetches.get_metrics(),
+            "loads": self._loads.get_metrics(),
+            "parses": self._parses.get_metrics(),
+            "streams": self._streams.get_metrics(),
+            "parse_pool": self.parse_pool.get_metrics() if self.parse_pool is not None else None
+        }
+
+    def close(self):
+        """Stop the parse worker processes, if any."""
+        if self.parse_pool is not None:
+            self.parse_pool.close()
+
+_shared_loader: Optional[PageLoader] = None
+
+def get_page_loader() -> PageLoader:
+    """Get the process-wide page loader shared by all agents."""
+    global _shared_loader
+    if _shared_loader is None:
+        _shared_loader = PageLoader()
+    return _shared_loader
@@ -0,0 +1,131 @@
+from typing import Dict, Any, Optional, Tuple
+import asyncio
+import multiprocessing
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from ..config import PARSE_WORKERS, PARSE_SHM_MIN_BYTES, PARSE_START_METHOD
+from .extraction import PageIndex, ROLE_CONTAINER
+
+# Per-worker parser state, set up once by the pool initializer
+_worker_engine = None
+_worker_backend = None
+
+def _init_worker(parser_name: str):
+    global _worker_engine, _worker_backend
+    from .extraction import get_extraction_engine
+    from .parsers import get_parser_backend
+    _worker_engine = get_extraction_engine()
+    _worker_backend = get_parser_backend(parser_name)
+
+def _read_shared(name: str, size: int) -> str:
+    # Pool workers share the parent's resource tracker, so attaching here does not
+    # register a second owner; the parent unlinks the segment once the page is done
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        view = shm.buf[:size]
+        try:
+            # Decode straight from the mapping, without an intermediate bytes copy
+            return str(view, "utf-8")
+        finally:
+            view.release()
+    finally:
+        shm.close()
+
+def _index_in_worker(content: Optional[str], shm_name: Optional[str], size: int) -> Tuple[PageIndex, float]:
+    """Parse, index and extract a page in a worker; returns the index and the worker's CPU time."""
+    start_time = time.process_time()
+    if shm_name is not None:
+        content = _read_shared(shm_name, size)
+    _, page_index = _worker_backend.index(content, _worker_engine)
+    for container in page_index.containers:
+        if container.roles & ROLE_CONTAINER:
+            # Extracted plans and fingerprints travel back with the index, so the
+            # parent never runs the regex extraction or hashing itself
+            _worker_engine.extract_plan(container)
+            container.fingerprint
+    return page_index, time.process_time() - start_time
+
+class ParsePool:
+    """
+    Parses and indexes pages in worker processes, past the GIL.
+
+    Pages of at least shm_min_bytes are handed to workers through a shared
+    memory segment instead of being pickled through the pool's pipe; smaller
+    ones are passed directly, where the segment setup would cost more than
+    it saves. Workers return the plan index with every container's plan
+    already extracted.
+    """
+
+    def __init__(self, parser: str,
+                 workers: int = PARSE_WORKERS,
+                 shm_min_bytes: int = PARSE_SHM_MIN_BYTES,
+                 start_method: str = PARSE_START_METHOD):
+        self.parser = parser
+        self.workers = max(1, workers)
+        self.shm_min_bytes = shm_min_bytes
+        self.start_method = start_method
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self.metrics = {
+            "pages": 0,
+            "shared_memory_pages": 0,
+            "bytes": 0,
+            "worker_cpu_time": 0.0,
+            "pool_restarts": 0
+        }
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        """Worker pool, started on first use."""
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context(self.start_method),
+                initializer=_init_worker,
+                initargs=(self.parser,)
+            )
+        return self._executor
+
+    async def index(self, content: str) -> PageIndex:
+        """Parse and index page content in a worker process."""
+        loop = asyncio.get_running_loop()
+        data = content.encode("utf-8")
+        shm = None
+        try:
+            if len(data) >= self.shm_min_bytes:
+                shm = shared_memory.SharedMemory(create=True, size=max(len(data), 1))
+                shm.buf[:len(data)] = data
+                args = (None, shm.name, len(data))
+                self.metrics["shared_memory_pages"] += 1
+            else:
+                args = (content, None, 0)
+            page_index, cpu_time = await loop.run_in_executor(self.executor, _index_in_worker, *args)
+        except BrokenProcessPool:
+            # A worker died (e.g. killed for memory); the next page starts a fresh pool
+            self._executor = None
+            self.metrics["pool_restarts"] += 1
+            raise
+        finally:
+            if shm is not None:
+                shm.close()
+                shm.unlink()
+        self.metrics["pages"] += 1
+        self.metrics["bytes"] += len(data)
+        self.metrics["worker_cpu_time"] += cpu_time
+        return page_index
+
+    def close(self):
+        """Stop the worker processes; a later parse starts a new pool."""
+        if self._executor is not None:
+            if sys.version_info >= (3, 9):
+                self._executor.shutdown(wait=False, cancel_futures=True)
+            else:
+                # No cancel_futures before 3.9: queued parses still run, but nothing waits for them
+                self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get pool counters."""
+        return {**self.metrics, "workers": self.workers}
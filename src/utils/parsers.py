@@ -0,0 +1,226 @@
+from typing import Dict, Any, Optional, List, Tuple
+import importlib
+from bs4 import BeautifulSoup
+from ..config import HTML_PARSER
+from .extraction import (ExtractionEngine, IndexBuilder, PageIndex, ContainerIndex, ROLE_CONTAINER,
+                         walk_soup, selector_path_part)
+
+# Elements whose text BeautifulSoup keeps out of Tag.text
+NON_TEXT_CONTAINERS = frozenset(['script', 'style', 'template', 'rt', 'rp'])
+
+class ParserBackend:
+    """HTML parser that can feed the extraction engine's index builder."""
+
+    name = ""
+    module = ""
+
+    def is_available(self) -> bool:
+        try:
+            importlib.import_module(self.module)
+            return True
+        except ImportError:
+            return False
+
+    def parse(self, content: str):
+        """Parse content into the backend's native tree."""
+        raise NotImplementedError
+
+    def walk(self, tree, builder: IndexBuilder):
+        """Feed the tree to an index builder as start/text/end events."""
+        raise NotImplementedError
+
+    def walk_element(self, element, builder: IndexBuilder):
+        """Feed one element and its subtree to an index builder."""
+        raise NotImplementedError
+
+    def elements(self, tree, tag: str) -> List[Any]:
+        """Elements with a tag name, in document order."""
+        raise NotImplementedError
+
+    def element_info(self, element) -> Optional[Tuple[str, Any]]:
+        """(tag, class attribute) of an element; None above the root element."""
+        raise NotImplementedError
+
+    def parent(self, element):
+        raise NotImplementedError
+
+    def index(self, content: str, engine: ExtractionEngine) -> Tuple[Any, PageIndex]:
+        """Parse content and index its plan containers."""
+        tree = self.parse(content)
+        builder = IndexBuilder(engine)
+        self.walk(tree, builder)
+        return tree, builder.finish()
+
+    def locate(self, content: str, engine: ExtractionEngine, path: str, ordinal: int) -> Optional[ContainerIndex]:
+        """
+        Parse content and index only the container at a selector path and ordinal.
+
+        Candidates are found with the parser's own tag lookup and matched by
+        the container path of their ancestors, so only the located subtree
+        goes through the index builder. The result carries the same path,
+        ordinal and element offsets as in a full index.
+        """
+        tree = self.parse(content)
+        own = path.rsplit(" > ", 1)[-1]
+        seen = 0
+        for element in self.elements(tree, own.split(".", 1)[0]):
+            if self._container_path(element, engine, own) != path:
+                continue
+            if seen == ordinal:
+                builder = IndexBuilder(engine)
+                self.walk_element(element, builder)
+                container = builder.finish().containers[0]
+                container.path, container.ordinal = path, ordinal
+                return container
+            seen += 1
+        return None
+
+    def _container_path(self, element, engine: ExtractionEngine, own: str) -> Optional[str]:
+        """Selector path of an element as the index builder assigns it, if the element is the container own names."""
+        tag, classes = self.element_info(element)
+        if selector_path_part(tag, classes) != own or not engine.classify(tag, classes) & ROLE_CONTAINER:
+            return None
+        parts = [own]
+        element = self.parent(element)
+        while element is not None:
+            info = self.element_info(element)
+            if info is None:
+                break
+            if engine.classify(*info) & ROLE_CONTAINER:
+                parts.append(selector_path_part(*info))
+            element = self.parent(element)
+        return " > ".join(reversed(parts))
+
+class BeautifulSoupBackend(ParserBackend):
+    """BeautifulSoup with a named tree builder (html.parser or lxml)."""
+
+    def __init__(self, name: str, module: str):
+        self.name = name
+        self.module = module
+
+    def parse(self, content: str) -> BeautifulSoup:
+        return BeautifulSoup(content, self.name)
+
+    def walk(self, tree: BeautifulSoup, builder: IndexBuilder):
+        walk_soup(tree, builder)
+
+    def walk_element(self, element, builder: IndexBuilder):
+        builder.start(element.name, element.get('class'))
+        walk_soup(element, builder)
+        builder.end()
+
+    def elements(self, tree: BeautifulSoup, tag: str) -> List[Any]:
+        return tree.find_all(tag)
+
+    def element_info(self, element) -> Optional[Tuple[str, Any]]:
+        if isinstance(element, BeautifulSoup):
+            return None
+        return element.name, element.get('class')
+
+    def parent(self, element):
+        return element.parent
+
+class SelectolaxBackend(ParserBackend):
+    """selectolax's lexbor bindings, a C HTML5 parser."""
+
+    name = "selectolax"
+    module = "selectolax.lexbor"
+
+    def parse(self, content: str):
+        from selectolax.lexbor import LexborHTMLParser
+        return LexborHTMLParser(content)
+
+    def walk(self, tree, builder: IndexBuilder):
+        root = tree.root
+        if root is None:
+            return
+        self._walk_siblings(root, builder)
+
+    def walk_element(self, element, builder: IndexBuilder):
+        attributes = element.attributes
+        builder.start(element.tag, attributes.get('class') if attributes else None)
+        if element.child is not None:
+            self._walk_siblings(element.child, builder, skip_depth=int(element.tag in NON_TEXT_CONTAINERS))
+        builder.end()
+
+    def elements(self, tree, tag: str) -> List[Any]:
+        return tree.css(tag)
+
+    def element_info(self, element) -> Optional[Tuple[str, Any]]:
+        tag = element.tag
+        if tag.startswith('-') or tag.startswith('_') or tag.startswith('#'):
+            return None
+        attributes = element.attributes
+        return tag, attributes.get('class') if attributes else None
+
+    def parent(self, element):
+        return element.parent
+
+    def _walk_siblings(self, first, builder: IndexBuilder, skip_depth: int = 0):
+        """Feed a node, its following siblings and their subtrees to a builder."""
+        # Explicit stack of sibling cursors: no recursion on deeply nested pages
+        stack = [first]
+        while stack:
+            node = stack[-1]
+            if node is None:
+                stack.pop()
+                if stack:
+                    parent = stack.pop()
+                    if parent.tag in NON_TEXT_CONTAINERS:
+                        skip_depth -= 1
+                    builder.end()
+                    stack.append(parent.next)
+                continue
+
+            tag = node.tag
+            if tag == '-text':
+                if not skip_depth:
+                    builder.text(node.text_content)
+                stack[-1] = node.next
+            elif tag.startswith('-') or tag.startswith('_') or tag.startswith('#'):
+                stack[-1] = node.next
+            else:
+                attributes = node.attributes
+                builder.start(tag, attributes.get('class') if attributes else None)
+                if tag in NON_TEXT_CONTAINERS:
+                    skip_depth += 1
+                stack.append(node.child)
+
+BACKENDS: Dict[str, ParserBackend] = {
+    "selectolax": SelectolaxBackend(),
+    "lxml": BeautifulSoupBackend("lxml", "lxml"),
+    "html.parser": BeautifulSoupBackend("html.parser", "html.parser"),
+}
+# Fastest first; html.parser ships with Python and is always available
+FALLBACK_ORDER = ["selectolax", "lxml", "html.parser"]
+
+_resolved: Dict[str, ParserBackend] = {}
+
+def available_backends() -> List[str]:
+    """Names of the installed parser backends, fastest first."""
+    return [name for name in FALLBACK_ORDER if BACKENDS[name].is_available()]
+
+def get_parser_backend(name: Optional[str] = None) -> ParserBackend:
+    """
+    Resolve a parser backend by name.
+
+    "auto" picks the fastest installed backend. A named backend that is not
+    installed falls back to the next one in FALLBACK_ORDER.
+    """
+    name = (name or HTML_PARSER).lower()
+    if name in _resolved:
+        return _resolved[name]
+
+    if name == "auto":
+        candidates = FALLBACK_ORDER
+    elif name in BACKENDS:
+        candidates = FALLBACK_ORDER[FALLBACK_ORDER.index(name):]
+    else:
+        raise ValueError(f"Unknown HTML parser backend: {name}")
+
+    for candidate in candidates:
+        backend = BACKENDS[candidate]
+        if backend.is_available():
+            _resolved[name] = backend
+            return backend
+    raise ValueError(f"No HTML parser backend available for: {name}")
@@ -0,0 +1,161 @@
+from typing import Dict, Any, Optional, List, Tuple
+from collections import OrderedDict
+from bisect import bisect_left, bisect_right
+import threading
+import time
+from ..config import PLAN_TABLE_TTL, PLAN_TABLE_MAX_ENTRIES
+from .singleflight import canonicalize_url
+
+# Relative speed difference within which a plan answers a speed query, as in the agents' filters
+SPEED_TOLERANCE = 0.1
+
+def normalize_name(name: Optional[str]) -> str:
+    return " ".join((name or "").lower().split())
+
+class PlanTable:
+    """
+    Every plan extracted from one page, indexed by speed and by normalized name.
+
+    Records are plan dicts with at least "speed" and "name"; a record may set
+    "match_text" to be matched by name queries instead of its name. Lookups
+    return records in page order, so callers pick the same plan a scan of
+    the page would.
+    """
+
+    def __init__(self, records: List[Dict[str, Any]], ttl: float = PLAN_TABLE_TTL):
+        self.records = records
+        self.created_at = time.time()
+        self.ttl = ttl
+        # Sorted speed index: parallel lists of speeds and record positions
+        indexed = sorted((record["speed"], position) for position, record in enumerate(records)
+                         if record.get("speed") is not None)
+        self._speeds = [speed for speed, _ in indexed]
+        self._speed_positions = [position for _, position in indexed]
+        self._unknown_speed = [position for position, record in enumerate(records) if record.get("speed") is None]
+        # Distinct normalized names, each with the positions sharing it
+        self._by_name: Dict[str, List[int]] = {}
+        for position, record in enumerate(records):
+            key = normalize_name(record.get("match_text", record.get("name")))
+            self._by_name.setdefault(key, []).append(position)
+
+    def is_fresh(self) -> bool:
+        return time.time() - self.created_at < self.ttl
+
+    def lookup(self, download_speed: Optional[float], plan_name: Optional[str],
+               unknown_speed_matches: bool = False) -> List[Dict[str, Any]]:
+        """
+        Records within SPEED_TOLERANCE of download_speed whose name contains plan_name.
+
+        Args:
+            download_speed: Wanted speed; None or 0 matches every speed
+            plan_name: Substring of the normalized name; None matches every name
+            unknown_speed_matches: Whether records without a speed match any speed query
+
+        Returns:
+            Matching records in page order
+        """
+        if download_speed:
+            # A hair wider than the tolerance so float rounding never drops a boundary plan;
+            # callers apply their exact filter to the candidates
+            margin = download_speed * SPEED_TOLERANCE * (1 + 1e-9)
+            low = bisect_left(self._speeds, download_speed - margin)
+            high = bisect_right(self._speeds, download_speed + margin)
+            positions = set(self._speed_positions[low:high])
+            if unknown_speed_matches:
+                positions.update(self._unknown_speed)
+        else:
+            positions = None
+
+        if plan_name:
+            wanted = normalize_name(plan_name)
+            named = {position for name, name_positions in self._by_name.items() if wanted and wanted in name
+                     for position in name_positions}
+            positions = named if positions is None else positions & named
+        elif positions is None:
+            return list(self.records)
+        return [self.records[position] for position in sorted(positions)]
+
+    def nearest(self, download_speed: float) -> Optional[Dict[str, Any]]:
+        """The record whose speed is closest to download_speed (first in page order on ties)."""
+        if not self._speeds:
+            return None
+        index = bisect_left(self._speeds, download_speed)
+        candidates = [i for i in (index - 1, index) if 0 <= i < len(self._speeds)]
+        best = min(candidates, key=lambda i: (abs(self._speeds[i] - download_speed), self._speed_positions[i]))
+        # Several records may share the closest speed
+        speed = self._speeds[best]
+        low, high = bisect_left(self._speeds, speed), bisect_right(self._speeds, speed)
+        return self.records[min(self._speed_positions[low:high])]
+
+class PlanTableCache:
+    """
+    In-memory LRU of plan tables per canonical URL and table kind, with a TTL.
+
+    A fresh table answers later queries for any speed or plan name on the
+    same page without fetching or parsing it again.
+    """
+
+    def __init__(self, ttl: float = PLAN_TABLE_TTL, max_entries: int = PLAN_TABLE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._tables: "OrderedDict[Tuple[str, str], PlanTable]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.metrics = {
+            "hits": 0,
+            "misses": 0,
+            "expired": 0,
+            "tables_built": 0
+        }
+
+    def get(self, kind: str, url: str) -> Optional[PlanTable]:
+        """Fresh table of a page, if there is one."""
+        key = (kind, canonicalize_url(url))
+        with self._lock:
+            table = self._tables.get(key)
+            if table is not None and not table.is_fresh():
+                del self._tables[key]
+                self.metrics["expired"] += 1
+                table = None
+            if table is None:
+                self.metrics["misses"] += 1
+                return None
+            self._tables.move_to_end(key)
+            self.metrics["hits"] += 1
+            return table
+
+    def put(self, kind: str, url: str, records: List[Dict[str, Any]]) -> PlanTable:
+        """Index a page's plan records and keep the table for ttl seconds."""
+        table = PlanTable(records, self.ttl)
+        key = (kind, canonicalize_url(url))
+        with self._lock:
+            self._tables[key] = table
+            self._tables.move_to_end(key)
+            while len(self._tables) > self.max_entries:
+                self._tables.popitem(last=False)
+            self.metrics["tables_built"] += 1
+        return table
+
+    def invalidate(self, url: str):
+        """Drop every table of a page."""
+        url = canonicalize_url(url)
+        with self._lock:
+            for key in [key for key in self._tables if key[1] == url]:
+                del self._tables[key]
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get table hit counters."""
+        lookups = self.metrics["hits"] + self.metrics["misses"]
+        return {
+            **self.metrics,
+            "hit_rate": self.metrics["hits"] / lookups if lookups else 0.0,
+            "tables": len(self._tables)
+        }
+
+_shared_cache: Optional[PlanTableCache] = None
+
+def get_plan_table_cache() -> PlanTableCache:
+    """Get the process-wide plan table cache."""
+    global _shared_cache
+    if _shared_cache is None:
+        _shared_cache = PlanTableCache()
+    return _shared_cache
@@ -0,0 +1,125 @@
+from typing import Dict, Any, Optional
+from collections import Counter
+from contextlib import contextmanager
+import cProfile
+import os
+import sys
+import threading
+import time
+from ..config import SLOW_REQUEST_PROFILER, SLOW_REQUEST_THRESHOLD, PROFILE_DIR, PROFILE_SAMPLE_INTERVAL
+
+class StackSampler:
+    """Samples one thread's Python stack on a timer into folded-stack counts."""
+
+    def __init__(self, thread_id: int, interval: float = PROFILE_SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+
+    def write(self, path: str):
+        """Write samples in collapsed-stack format for flamegraph tools."""
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+
+class SlowRequestProfiler:
+    """
+    Profiles requests and keeps the profile only when a request is slow.
+
+    Modes: "cprofile" (deterministic, higher overhead), "sampling" (a timer
+    thread sampling the event loop thread's stack) or "off". One request is
+    profiled at a time; both modes see everything running on the loop
+    thread meanwhile, including other concurrent requests.
+    """
+
+    def __init__(self,
+                 mode: str = SLOW_REQUEST_PROFILER,
+                 threshold: float = SLOW_REQUEST_THRESHOLD,
+                 output_dir: str = PROFILE_DIR):
+        if mode not in ("off", "cprofile", "sampling"):
+            raise ValueError(f"Unknown profiler mode: {mode}")
+        self.mode = mode
+        self.threshold = threshold
+        self.output_dir = output_dir
+        self._active = threading.Lock()
+        self.metrics = {
+            "profiled_requests": 0,
+            "skipped_busy": 0,
+            "profiles_saved": 0
+        }
+
+    @contextmanager
+    def profile(self, span=None, name: str = "request"):
+        """
+        Profile the enclosed block; save the profile if it ran longer than the threshold.
+
+        The saved file path is set as the span's "profile" attribute.
+        """
+        if self.mode == "off":
+            yield
+            return
+        if not self._active.acquire(blocking=False):
+            self.metrics["skipped_busy"] += 1
+            yield
+            return
+
+        profiler = None
+        sampler = None
+        if self.mode == "cprofile":
+            profiler = cProfile.Profile()
+            profiler.enable()
+        else:
+            sampler = StackSampler(threading.get_ident())
+            sampler.start()
+        self.metrics["profiled_requests"] += 1
+        start_time = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed_time = time.monotonic() - start_time
+            if profiler is not None:
+                profiler.disable()
+            if sampler is not None:
+                sampler.stop()
+            self._active.release()
+            if elapsed_time >= self.threshold:
+                path = self._save(name, profiler, sampler)
+                if path and span is not None:
+                    span.set_attribute("profile", path)
+
+    def _save(self, name: str, profiler: Optional[cProfile.Profile], sampler: Optional[StackSampler]) -> Optional[str]:
+        extension = "prof" if profiler is not None else "folded"
+        path = os.path.join(self.output_dir, f"{name}-{int(time.time() * 1000)}-{os.getpid()}.{extension}")
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+            if profiler is not None:
+                profiler.dump_stats(path)
+            else:
+                sampler.write(path)
+        except OSError:
+            return None
+        self.metrics["profiles_saved"] += 1
+        return path
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {**self.metrics, "mode": self.mode, "threshold": self.threshold}
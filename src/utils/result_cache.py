@@ -0,0 +1,171 @@
+from typing import Dict, Any, Optional
+from collections import OrderedDict
+import asyncio
+import copy
+import hashlib
+import json
+import os
+import threading
+import time
+from ..config import RESULT_CACHE_TTL, RESULT_CACHE_MAX_ENTRIES, RESULT_CACHE_DIR
+from .singleflight import canonicalize_url
+from .disk_writer import DiskWriter
+
+class ResultCache:
+    """
+    TTL'd cache of extraction results, with a memory tier and a disk tier.
+
+    Each entry records the hash of the page it was computed from. A lookup
+    with a different page hash misses and drops the entry, so a changed
+    page invalidates its results automatically. Disk writes run on a
+    DiskWriter and get_async() reads the disk off the event loop.
+    """
+
+    def __init__(self,
+                 ttl: float = RESULT_CACHE_TTL,
+                 max_entries: int = RESULT_CACHE_MAX_ENTRIES,
+                 disk_dir: Optional[str] = RESULT_CACHE_DIR):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir or None
+        self._memory: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._writer = DiskWriter("result-cache")
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+        self.metrics = {
+            "hits": 0,
+            "misses": 0,
+            "invalidations": 0,
+            "expirations": 0,
+            "stores": 0
+        }
+
+    @staticmethod
+    def make_key(url: str, download_speed: float, plan_name: Optional[str], namespace: str = "") -> str:
+        """Key for normalized request inputs."""
+        normalized = {
+            "namespace": namespace,
+            "url": canonicalize_url(url),
+            "download_speed": float(download_speed),
+            "plan_name": (plan_name or "").strip().lower()
+        }
+        return hashlib.sha256(json.dumps(normalized, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def get(self, key: str, content_hash: str) -> Optional[Dict[str, Any]]:
+        """Cached result for key if still fresh and computed from the same page content."""
+        return self._check(key, self._get_entry(key), content_hash)
+
+    async def get_async(self, key: str, content_hash: str) -> Optional[Dict[str, Any]]:
+        """get() for callers on the event loop: a memory miss reads the disk in a worker thread."""
+        entry = self._get_memory(key)
+        if entry is None and self.disk_dir:
+            loop = asyncio.get_running_loop()
+            entry = await loop.run_in_executor(None, self._read_disk, key)
+            if entry is not None:
+                self._put_memory(key, entry)
+        return self._check(key, entry, content_hash)
+
+    def _check(self, key: str, entry: Optional[Dict[str, Any]], content_hash: str) -> Optional[Dict[str, Any]]:
+        if entry is None:
+            self.metrics["misses"] += 1
+            return None
+
+        if entry["content_hash"] != content_hash:
+            self.metrics["invalidations"] += 1
+            self.metrics["misses"] += 1
+            self.invalidate(key)
+            return None
+
+        if time.time() - entry["stored_at"] >= self.ttl:
+            self.metrics["expirations"] += 1
+            self.metrics["misses"] += 1
+            self.invalidate(key)
+            return None
+
+        self.metrics["hits"] += 1
+        return copy.deepcopy(entry["result"])
+
+    def put(self, key: str, content_hash: str, result: Dict[str, Any]):
+        """Store a result computed from the page with content_hash."""
+        entry = {
+            "content_hash": content_hash,
+            "stored_at": time.time(),
+            "result": copy.deepcopy(result)
+        }
+        self._put_memory(key, entry)
+        self._writer.submit(self._write_disk, key, entry)
+        self.metrics["stores"] += 1
+
+    def invalidate(self, key: str):
+        """Drop a key from both tiers."""
+        with self._lock:
+            self._memory.pop(key, None)
+        if self.disk_dir:
+            # Queued behind any pending write of the same key
+            self._writer.submit(self._remove_disk, key)
+
+    def flush(self):
+        """Wait for queued disk writes."""
+        self._writer.flush()
+
+    def _get_memory(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+            return entry
+
+    def _get_entry(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._get_memory(key)
+        if entry is not None:
+            return entry
+        entry = self._read_disk(key)
+        if entry is not None:
+            self._put_memory(key, entry)
+        return entry
+
+    def _put_memory(self, key: str, entry: Dict[str, Any]):
+        with self._lock:
+            self._memory[key] = entry
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.json")
+
+    def _write_disk(self, key: str, entry: Dict[str, Any]):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError):
+            # Disk tier is best effort; unserializable results stay memory-only
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    def _remove_disk(self, key: str):
+        try:
+            os.remove(self._disk_path(key))
+        except OSError:
+            pass
+
+    def _read_disk(self, key: str) -> Optional[Dict[str, Any]]:
+        if not self.disk_dir:
+            return None
+        try:
+            with open(self._disk_path(key), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get cache counters."""
+        return {**self.metrics, "memory_entries": len(self._memory)}
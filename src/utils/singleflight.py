@@ -0,0 +1,80 @@
+from typing import Dict, Any, Callable, Awaitable
+import asyncio
+import hashlib
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+def canonicalize_url(url: str) -> str:
+    """
+    Normalize a URL so equivalent spellings share one key.
+
+    Lowercases scheme and host, drops default ports and fragments,
+    and sorts query parameters.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    path = parts.path or "/"
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, host, path, query, ""))
+
+def content_hash(content) -> str:
+    """Stable hash of page content (str or bytes)."""
+    if isinstance(content, str):
+        content = content.encode("utf-8", errors="replace")
+    return hashlib.sha256(content).hexdigest()
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key onto one shared task."""
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.metrics = {
+            "calls": 0,
+            "executions": 0,
+            "coalesced": 0
+        }
+
+    async def do(self, key: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run func once per key among concurrent callers.
+
+        Args:
+            key: Deduplication key
+            func: Zero-argument coroutine function producing the result
+
+        Returns:
+            The shared result; exceptions propagate to every caller
+        """
+        self.metrics["calls"] += 1
+        loop = asyncio.get_running_loop()
+
+        task = self._inflight.get(key)
+        if task is not None and not task.done() and task.get_loop() is loop:
+            self.metrics["coalesced"] += 1
+        else:
+            self.metrics["executions"] += 1
+            task = loop.create_task(func())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._finish(key, t))
+
+        # Shield so one cancelled caller does not cancel the work for the others
+        return await asyncio.shield(task)
+
+    def _finish(self, key: str, task: asyncio.Task):
+        """Drop a finished task and mark its exception as retrieved."""
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()
+
+    def in_flight(self) -> int:
+        """Number of keys currently being executed."""
+        return len(self._inflight)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get coalescing metrics."""
+        return {**self.metrics, "in_flight": self.in_flight()}
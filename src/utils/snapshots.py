@@ -0,0 +1,308 @@
+from typing import Dict, Any, Optional, List, Tuple, Callable
+from collections import OrderedDict
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from ..config import SNAPSHOT_DIR, SNAPSHOT_MAX_ENTRIES
+from .extraction import ExtractionEngine, PageIndex, ContainerIndex, get_extraction_engine
+from .singleflight import canonicalize_url, content_hash
+from .disk_writer import DiskWriter
+
+# Plan fields shown in change reports
+SUMMARY_FIELDS = ("name", "price", "speed")
+
+def plan_summary(plan: Dict[str, Any]) -> Dict[str, Any]:
+    return {field: plan.get(field) for field in SUMMARY_FIELDS}
+
+def leaf_mask(containers: List[ContainerIndex]) -> List[bool]:
+    """
+    Whether each container holds no other plan container.
+
+    Wrappers such as a pricing section change whenever any card inside them
+    does, so diffs and cache dependencies look at the innermost cards only.
+    """
+    wrappers = {container.path.rsplit(" > ", 1)[0] for container in containers if " > " in container.path}
+    return [container.path not in wrappers for container in containers]
+
+def matches_query(plan: Dict[str, Any], download_speed: Optional[float], plan_name: Optional[str]) -> bool:
+    """Whether an extracted plan could answer the query (speed within 10%, name substring)."""
+    if plan_name and plan_name.lower() not in (plan.get("name") or "").lower():
+        return False
+    speed = plan.get("speed")
+    if download_speed and speed is not None and abs(speed - download_speed) / download_speed > 0.1:
+        return False
+    return True
+
+class SnapshotStore:
+    """
+    Per-URL record of plan container fingerprints and their extracted plans.
+
+    Observing a page diffs its containers against the stored version,
+    reuses the stored plan for every unchanged container and extracts only
+    the new or changed ones. Each distinct page version is diffed once; the
+    diff is kept with the version, so every caller observing the same page
+    gets the same change report.
+
+    Agents that read other containers, or read them differently, keep their
+    own per-fingerprint results in the same snapshot through reuse().
+
+    Disk writes run on a DiskWriter; callers on the event loop await load()
+    first, so observe() and reuse() find the snapshot in memory.
+    """
+
+    def __init__(self,
+                 disk_dir: Optional[str] = SNAPSHOT_DIR,
+                 max_entries: int = SNAPSHOT_MAX_ENTRIES,
+                 engine: Optional[ExtractionEngine] = None):
+        self.disk_dir = disk_dir or None
+        self.max_entries = max_entries
+        self.engine = engine or get_extraction_engine()
+        self._memory: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._writer = DiskWriter("snapshots")
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+        self.metrics = {
+            "observations": 0,
+            "unchanged_pages": 0,
+            "changed_pages": 0,
+            "new_pages": 0,
+            "plans_reused": 0,
+            "plans_extracted": 0
+        }
+
+    async def load(self, url: str):
+        """Bring url's snapshot into memory, reading the disk tier in a worker thread."""
+        key = canonicalize_url(url)
+        with self._lock:
+            if key in self._memory or not self.disk_dir:
+                return
+        loop = asyncio.get_running_loop()
+        snapshot = await loop.run_in_executor(None, self._read_disk, key)
+        if snapshot is not None:
+            with self._lock:
+                # A snapshot observed while the read ran is newer than the disk copy
+                if key in self._memory:
+                    return
+            self._put_memory(key, snapshot)
+
+    def observe(self, url: str, page_index: PageIndex) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """
+        Plans of a page's plan containers, and how the page differs from its previous version.
+
+        Args:
+            url: Page URL (canonicalized for the snapshot key)
+            page_index: Indexed page
+
+        Returns:
+            The plan for each of page_index.plan_containers(), in order, and
+            the change report of the current page version:
+                - version: Increments whenever the plan containers change
+                - first_seen: No earlier version was known
+                - changed_at: When this version was first observed
+                - unchanged: Number of plan cards carried over
+                - changed: Cards whose content changed in place (before/after)
+                - added, removed: Cards that appeared or disappeared
+            Only innermost containers are reported (see leaf_mask).
+        """
+        self.metrics["observations"] += 1
+        key = canonicalize_url(url)
+        containers = page_index.plan_containers()
+        fingerprints = [container.fingerprint for container in containers]
+        page_hash = content_hash("\x00".join(fingerprints))
+        previous = self._get(key)
+
+        if previous is not None and previous["page_hash"] == page_hash:
+            self.metrics["unchanged_pages"] += 1
+            self.metrics["plans_reused"] += len(containers)
+            plans = [dict(previous["plans"][fingerprint]) for fingerprint in fingerprints]
+            return plans, dict(previous["diff"])
+
+        stored_plans = previous["plans"] if previous is not None else {}
+        plans = []
+        for container, fingerprint in zip(containers, fingerprints):
+            plan = stored_plans.get(fingerprint)
+            if plan is None:
+                plan = self.engine.extract_plan(container)
+                self.metrics["plans_extracted"] += 1
+            else:
+                self.metrics["plans_reused"] += 1
+            plans.append(plan)
+
+        leaves = leaf_mask(containers)
+        positions = [[container.path, container.ordinal] for container, leaf in zip(containers, leaves) if leaf]
+        leaf_fingerprints = [fingerprint for fingerprint, leaf in zip(fingerprints, leaves) if leaf]
+        leaf_plans = [plan for plan, leaf in zip(plans, leaves) if leaf]
+        diff = self._diff(previous, positions, leaf_fingerprints, leaf_plans)
+        self.metrics["new_pages" if previous is None else "changed_pages"] += 1
+        self._put(key, {
+            "page_hash": page_hash,
+            "positions": positions,
+            "fingerprints": leaf_fingerprints,
+            "plans": dict(zip(fingerprints, plans)),
+            "diff": diff,
+            # Carried over so reuse() still finds the results of unchanged containers
+            "extracts": previous.get("extracts", {}) if previous is not None else {}
+        })
+        return [dict(plan) for plan in plans], dict(diff)
+
+    def reuse(self, url: str, kind: str, containers: List[ContainerIndex],
+              extract: Callable[[ContainerIndex], Any]) -> List[Any]:
+        """
+        extract() of each container, served from the snapshot for fingerprints seen before.
+
+        Results are kept per kind next to the observed plans and replaced by
+        the current page's on every call, so only live fingerprints are
+        stored. Call after observe() on the same page: without a snapshot
+        every container is extracted and nothing is kept.
+        """
+        key = canonicalize_url(url)
+        snapshot = self._get(key)
+        stored = snapshot["extracts"].get(kind, {}) if snapshot is not None and "extracts" in snapshot else {}
+        current = {}
+        values = []
+        for container in containers:
+            fingerprint = container.fingerprint
+            if fingerprint in stored:
+                value = stored[fingerprint]
+                self.metrics["plans_reused"] += 1
+            else:
+                value = extract(container)
+                self.metrics["plans_extracted"] += 1
+            current[fingerprint] = value
+            values.append(value)
+        if snapshot is not None and current.keys() != stored.keys():
+            self._put(key, {**snapshot, "extracts": {**snapshot.get("extracts", {}), kind: current}})
+        return values
+
+    @staticmethod
+    def _diff(previous: Optional[Dict[str, Any]], positions: List[List[Any]],
+              fingerprints: List[str], plans: List[Dict[str, Any]]) -> Dict[str, Any]:
+        diff = {
+            "version": previous["diff"]["version"] + 1 if previous is not None else 1,
+            "first_seen": previous is None,
+            "changed_at": time.time(),
+            "unchanged": 0,
+            "changed": [],
+            "added": [],
+            "removed": []
+        }
+        if previous is None:
+            diff["added"] = [plan_summary(plan) for plan in plans]
+            return diff
+
+        old_fingerprints = set(previous["fingerprints"])
+        old_at = {tuple(position): fingerprint
+                  for position, fingerprint in zip(previous["positions"], previous["fingerprints"])}
+        new_fingerprints = set(fingerprints)
+        replaced = set()
+        for position, fingerprint, plan in zip(positions, fingerprints, plans):
+            if fingerprint in old_fingerprints:
+                diff["unchanged"] += 1
+                continue
+            old = old_at.get(tuple(position))
+            if old is not None and old not in new_fingerprints:
+                # Same slot, different content: an edited card rather than a new one
+                replaced.add(old)
+                diff["changed"].append({
+                    "path": position[0],
+                    "ordinal": position[1],
+                    "before": plan_summary(previous["plans"][old]),
+                    "after": plan_summary(plan)
+                })
+            else:
+                diff["added"].append(plan_summary(plan))
+        for fingerprint in previous["fingerprints"]:
+            if fingerprint not in new_fingerprints and fingerprint not in replaced:
+                diff["removed"].append(plan_summary(previous["plans"][fingerprint]))
+        return diff
+
+    def forget(self, url: str):
+        key = canonicalize_url(url)
+        with self._lock:
+            self._memory.pop(key, None)
+        if self.disk_dir:
+            self._writer.submit(self._remove_disk, key)
+
+    def flush(self):
+        """Wait for queued disk writes."""
+        self._writer.flush()
+
+    def _get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            snapshot = self._memory.get(key)
+            if snapshot is not None:
+                self._memory.move_to_end(key)
+                return snapshot
+        snapshot = self._read_disk(key)
+        if snapshot is not None:
+            self._put_memory(key, snapshot)
+        return snapshot
+
+    def _put(self, key: str, snapshot: Dict[str, Any]):
+        self._put_memory(key, snapshot)
+        if self.disk_dir:
+            self._writer.submit(self._write_disk, key, snapshot)
+
+    def _put_memory(self, key: str, snapshot: Dict[str, Any]):
+        with self._lock:
+            self._memory[key] = snapshot
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def _disk_path(self, key: str) -> str:
+        name = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.disk_dir, f"{name}.json")
+
+    def _write_disk(self, key: str, snapshot: Dict[str, Any]):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError):
+            # A lost snapshot only means the next observation extracts everything again
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    def _remove_disk(self, key: str):
+        try:
+            os.remove(self._disk_path(key))
+        except OSError:
+            pass
+
+    def _read_disk(self, key: str) -> Optional[Dict[str, Any]]:
+        if not self.disk_dir:
+            return None
+        try:
+            with open(self._disk_path(key), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get observation counters and the share of plans served from snapshots."""
+        total = self.metrics["plans_reused"] + self.metrics["plans_extracted"]
+        return {
+            **self.metrics,
+            "reuse_rate": self.metrics["plans_reused"] / total if total else 0.0,
+            "urls": len(self._memory)
+        }
+
+_shared_store: Optional[SnapshotStore] = None
+
+def get_snapshot_store() -> SnapshotStore:
+    """Get the process-wide snapshot store."""
+    global _shared_store
+    if _shared_store is None:
+        _shared_store = SnapshotStore()
+    return _shared_store
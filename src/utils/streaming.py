@@ -0,0 +1,112 @@
+from typing import Dict, Any, Optional, Callable, List
+from html.parser import HTMLParser
+from ..config import STREAM_SKIP_TAGS
+from .extraction import ExtractionEngine, IndexBuilder, ContainerIndex, PageIndex
+
+# Elements that never have an end tag
+VOID_TAGS = frozenset([
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link',
+    'meta', 'param', 'source', 'track', 'wbr'
+])
+
+class StreamingExtractor(HTMLParser):
+    """
+    Incremental tokenizer that feeds the index builder without building a tree.
+
+    Subtrees of skipped tags (scripts, styles, SVGs, footers...) are dropped
+    before they reach the index, as a SoupStrainer would. Feeding stops
+    once the stop predicate accepts a completed container.
+    """
+
+    def __init__(self, engine: ExtractionEngine,
+                 stop: Optional[Callable[[ContainerIndex], bool]] = None,
+                 skip_tags=STREAM_SKIP_TAGS):
+        super().__init__(convert_charrefs=True)
+        self.builder = IndexBuilder(engine)
+        self.stop = stop
+        self.skip_tags = skip_tags
+        self.stopped_on: Optional[ContainerIndex] = None
+        self.bytes_fed = 0
+        # Open elements: (tag, forwarded to the builder)
+        self._open: List[tuple] = []
+        self._skip_depth = 0
+
+    @property
+    def stopped(self) -> bool:
+        return self.stopped_on is not None
+
+    def feed(self, data: str):
+        if self.stopped:
+            return
+        self.bytes_fed += len(data)
+        super().feed(data)
+
+    def handle_starttag(self, tag: str, attrs):
+        if self.stopped:
+            return
+        if self._skip_depth or tag in self.skip_tags:
+            if tag not in VOID_TAGS:
+                self._skip_depth += 1
+                self._open.append((tag, False))
+            return
+
+        classes = None
+        for name, value in attrs:
+            if name == 'class':
+                classes = value
+                break
+        self.builder.start(tag, classes)
+        if tag in VOID_TAGS:
+            self._close_builder_element()
+        else:
+            self._open.append((tag, True))
+
+    def handle_startendtag(self, tag: str, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS and self._open and self._open[-1][0] == tag:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag: str):
+        if self.stopped:
+            return
+        # Close up to the matching open tag; stray end tags are ignored
+        for position in range(len(self._open) - 1, -1, -1):
+            if self._open[position][0] == tag:
+                break
+        else:
+            return
+        while len(self._open) > position:
+            _, forwarded = self._open.pop()
+            if forwarded:
+                self._close_builder_element()
+            else:
+                self._skip_depth -= 1
+            if self.stopped:
+                return
+
+    def handle_data(self, data: str):
+        if not self.stopped and not self._skip_depth:
+            self.builder.text(data)
+
+    def _close_builder_element(self):
+        container = self.builder.end()
+        if container is not None and self.stop is not None and self.stop(container):
+            self.stopped_on = container
+
+    def result(self) -> PageIndex:
+        """Index of the containers completed so far."""
+        if not self.stopped:
+            self.close()
+            while self._open:
+                _, forwarded = self._open.pop()
+                if forwarded:
+                    self._close_builder_element()
+            return self.builder.finish()
+        return self.builder.finish(close_open=False)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "bytes_parsed": self.bytes_fed,
+            "early_exit": self.stopped,
+            "containers": len(self.builder.containers)
+        }
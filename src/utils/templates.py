@@ -0,0 +1,265 @@
+from typing import Dict, Any, Optional, Callable, Tuple, TYPE_CHECKING
+from functools import lru_cache
+from urllib.parse import urlsplit
+import json
+import os
+import threading
+import time
+from ..config import TEMPLATE_STORE_PATH, TEMPLATE_SAVE_INTERVAL
+from .extraction import ContainerIndex, PageIndex
+from .singleflight import canonicalize_url
+
+if TYPE_CHECKING:
+    from .pages import PageLoader
+
+class ExtractionTemplate:
+    """Where a query's answer was found on a domain's page last time."""
+
+    def __init__(self, path: str, ordinal: int,
+                 price_offset: Optional[int] = None,
+                 speed_offset: Optional[int] = None,
+                 learned_at: Optional[float] = None):
+        self.path = path
+        self.ordinal = ordinal
+        # Element offsets of the price and speed nodes relative to the container
+        self.price_offset = price_offset
+        self.speed_offset = speed_offset
+        self.learned_at = learned_at or time.time()
+
+    @classmethod
+    def from_container(cls, container: ContainerIndex) -> "ExtractionTemplate":
+        return cls(
+            container.path,
+            container.ordinal,
+            _first_offset(container, container.price_texts),
+            _first_offset(container, container.speed_texts)
+        )
+
+    def matches(self, container: ContainerIndex) -> bool:
+        """Whether the container still has price/speed nodes where the template expects them."""
+        if self.price_offset is not None and self.price_offset != _first_offset(container, container.price_texts):
+            return False
+        if self.speed_offset is not None and self.speed_offset != _first_offset(container, container.speed_texts):
+            return False
+        return True
+
+    def same_location(self, other: "ExtractionTemplate") -> bool:
+        return (self.path, self.ordinal, self.price_offset, self.speed_offset) == \
+            (other.path, other.ordinal, other.price_offset, other.speed_offset)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "ordinal": self.ordinal,
+            "price_offset": self.price_offset,
+            "speed_offset": self.speed_offset,
+            "learned_at": self.learned_at
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ExtractionTemplate":
+        return cls(data["path"], data["ordinal"], data.get("price_offset"),
+                   data.get("speed_offset"), data.get("learned_at"))
+
+def _first_offset(container: ContainerIndex, entries) -> Optional[int]:
+    if not entries:
+        return None
+    return min(entries)[0] - container.seq
+
+class TemplateStore:
+    """
+    Per-domain extraction templates, persisted as one JSON file.
+
+    After a successful full scan the winning container is recorded for the
+    domain and query. Later lookups go straight to that container and only
+    fall back to a full scan when it is missing or fails validation, in
+    which case the template is dropped. Changes are written to the file at
+    most every save_interval seconds, from a background timer.
+    """
+
+    def __init__(self, path: Optional[str] = TEMPLATE_STORE_PATH, save_interval: float = TEMPLATE_SAVE_INTERVAL):
+        self.path = path or None
+        self.save_interval = save_interval
+        self._templates: Dict[str, Dict[str, ExtractionTemplate]] = {}
+        self._lock = threading.Lock()
+        # Serializes file writes between the save timer and explicit flushes
+        self._write_lock = threading.Lock()
+        self._dirty = False
+        self._save_timer: Optional[threading.Timer] = None
+        self.metrics = {
+            "lookups": 0,
+            "hits": 0,
+            "misses": 0,
+            "validation_failures": 0,
+            "learned": 0,
+            "direct_hits": 0,
+            "saves": 0
+        }
+        self._load()
+
+    @staticmethod
+    def make_key(namespace: str, download_speed: Optional[float], plan_name: Optional[str]) -> str:
+        """Query part of a template key; the domain is the other part."""
+        speed = "" if download_speed is None else f"{float(download_speed):g}"
+        return f"{namespace}|{speed}|{(plan_name or '').strip().lower()}"
+
+    @staticmethod
+    @lru_cache(maxsize=4096)
+    def domain(url: str) -> str:
+        # Memoized: canonicalizing on every lookup costs more than the template saves on small pages
+        return urlsplit(canonicalize_url(url)).netloc
+
+    def get(self, url: str, query: str) -> Optional[ExtractionTemplate]:
+        with self._lock:
+            return self._templates.get(self.domain(url), {}).get(query)
+
+    def lookup(self, page_index: PageIndex, url: str, query: str,
+               validate: Callable[[ContainerIndex], bool]) -> Optional[ContainerIndex]:
+        """
+        Container the domain's template points at in an indexed page, if it still validates.
+
+        Returns None when there is no template or it no longer fits the page;
+        the caller then does a full scan.
+        """
+        self.metrics["lookups"] += 1
+        template = self.get(url, query)
+        if template is None:
+            self.metrics["misses"] += 1
+            return None
+        return self._check(template, page_index.find(template.path, template.ordinal), url, query, validate)
+
+    async def load(self, loader: "PageLoader", url: str, query: str,
+                   validate: Callable[[ContainerIndex], bool]) -> Tuple[Optional[ContainerIndex], Optional[str]]:
+        """
+        Container the domain's template points at, read from the page before any full scan.
+
+        Only the template's container is indexed: the page is parsed, but the
+        index builder never walks the rest of it.
+
+        Returns:
+            The container, or None when there is no template or it no longer
+            fits the page; and the page content fetched for it (None without a
+            template), so that the caller's full scan after a miss parses it
+            instead of downloading the page again
+        """
+        self.metrics["lookups"] += 1
+        template = self.get(url, query)
+        if template is None:
+            self.metrics["misses"] += 1
+            return None, None
+        content = await loader.fetch_text(url)
+        container = await loader.locate(url, template.path, template.ordinal, content=content)
+        container = self._check(template, container, url, query, validate)
+        if container is not None:
+            self.metrics["direct_hits"] += 1
+        return container, content
+
+    def _check(self, template: ExtractionTemplate, container: Optional[ContainerIndex], url: str, query: str,
+               validate: Callable[[ContainerIndex], bool]) -> Optional[ContainerIndex]:
+        if container is None or not template.matches(container) or not validate(container):
+            self.metrics["validation_failures"] += 1
+            self.forget(url, query)
+            return None
+        self.metrics["hits"] += 1
+        return container
+
+    def learn(self, url: str, query: str, container: ContainerIndex):
+        """Record the container that answered a query on this domain."""
+        template = ExtractionTemplate.from_container(container)
+        domain = self.domain(url)
+        with self._lock:
+            current = self._templates.get(domain, {}).get(query)
+            if current is not None and current.same_location(template):
+                return
+            self._templates.setdefault(domain, {})[query] = template
+        self.metrics["learned"] += 1
+        self._schedule_save()
+
+    def forget(self, url: str, query: str):
+        domain = self.domain(url)
+        with self._lock:
+            removed = self._templates.get(domain, {}).pop(query, None)
+            if domain in self._templates and not self._templates[domain]:
+                del self._templates[domain]
+        if removed is not None:
+            self._schedule_save()
+
+    def _schedule_save(self):
+        # Changes within one interval share a single write, made off the request path
+        if not self.path:
+            return
+        with self._lock:
+            self._dirty = True
+            if self._save_timer is not None:
+                return
+            self._save_timer = threading.Timer(self.save_interval, self.flush)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def flush(self):
+        """Write pending template changes now."""
+        with self._lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+                self._save_timer = None
+        with self._write_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                self._dirty = False
+            self._save()
+
+    def _load(self):
+        if not self.path:
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self._templates = {
+                domain: {query: ExtractionTemplate.from_dict(entry) for query, entry in queries.items()}
+                for domain, queries in data.items()
+            }
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            self._templates = {}
+
+    def _save(self):
+        if not self.path:
+            return
+        with self._lock:
+            data = {
+                domain: {query: template.to_dict() for query, template in queries.items()}
+                for domain, queries in self._templates.items()
+            }
+        directory = os.path.dirname(self.path)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+            self.metrics["saves"] += 1
+        except OSError:
+            # Templates are an optimization; losing one only costs a full scan
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get template counters and hit rate."""
+        lookups = self.metrics["lookups"]
+        return {
+            **self.metrics,
+            "hit_rate": self.metrics["hits"] / lookups if lookups else 0.0,
+            "domains": len(self._templates)
+        }
+
+_shared_store: Optional[TemplateStore] = None
+
+def get_template_store() -> TemplateStore:
+    """Get the process-wide template store."""
+    global _shared_store
+    if _shared_store is None:
+        _shared_store = TemplateStore()
+    return _shared_store
@@ -0,0 +1,225 @@
+from typing import Dict, Any, Optional, List
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+import asyncio
+import functools
+import itertools
+import json
+import os
+import threading
+import time
+from ..config import TRACING_ENABLED, TRACE_BUFFER_SIZE
+
+# String annotation: subscripting ContextVar at runtime needs Python 3.9
+_current_span: "ContextVar[Optional[Span]]" = ContextVar("current_span", default=None)
+_span_ids = itertools.count(1)
+
+class Trace:
+    """All spans of one request, rooted at the outermost span."""
+
+    def __init__(self, trace_id: str):
+        self.trace_id = trace_id
+        self.spans: List["Span"] = []
+        # Monotonic origin so exported timestamps start at zero
+        self.origin = time.perf_counter()
+
+    @property
+    def root(self) -> Optional["Span"]:
+        return self.spans[0] if self.spans else None
+
+    def to_json(self) -> Dict[str, Any]:
+        """Spans as plain dicts, in start order."""
+        return {
+            "trace_id": self.trace_id,
+            "spans": [span.to_dict() for span in sorted(self.spans, key=lambda s: s.start)]
+        }
+
+    def to_chrome_trace(self) -> Dict[str, Any]:
+        """
+        Spans as Chrome trace events (chrome://tracing, Perfetto).
+
+        Each asyncio task or thread gets its own track so concurrent spans
+        such as a hedged coordinator and fallback do not overlap on one line.
+        """
+        lanes: Dict[str, int] = {}
+        events = []
+        for span in sorted(self.spans, key=lambda s: s.start):
+            lane = lanes.setdefault(span.lane, len(lanes) + 1)
+            end = span.end if span.end is not None else time.perf_counter()
+            events.append({
+                "name": span.name,
+                "cat": span.name.split(".")[0],
+                "ph": "X",
+                "ts": round((span.start - self.origin) * 1e6, 1),
+                "dur": round((end - span.start) * 1e6, 1),
+                "pid": 1,
+                "tid": lane,
+                "args": {**span.attributes, "status": span.status}
+            })
+        for lane, tid in lanes.items():
+            events.append({"name": "thread_name", "ph": "M", "pid": 1, "tid": tid, "args": {"name": lane}})
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+class Span:
+    """One timed operation within a trace."""
+
+    def __init__(self, name: str, trace: Trace, parent: Optional["Span"], attributes: Dict[str, Any]):
+        self.name = name
+        self.trace = trace
+        self.span_id = next(_span_ids)
+        self.parent_id = parent.span_id if parent is not None else None
+        self.attributes = attributes
+        self.status = "ok"
+        self.lane = _lane()
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+
+    @property
+    def duration(self) -> Optional[float]:
+        return None if self.end is None else self.end - self.start
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def set_attributes(self, **attributes):
+        self.attributes.update(attributes)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": self.start - self.trace.origin,
+            "duration": self.duration,
+            "status": self.status,
+            "lane": self.lane,
+            "attributes": self.attributes
+        }
+
+class _NoopSpan:
+    """Stand-in when tracing is off, so call sites need no checks."""
+
+    name = None
+    trace = None
+    attributes: Dict[str, Any] = {}
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+    def set_attributes(self, **attributes):
+        pass
+
+NOOP_SPAN = _NoopSpan()
+
+def _lane() -> str:
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None
+    if task is not None:
+        return task.get_name()
+    return threading.current_thread().name
+
+class Tracer:
+    """
+    Creates spans that follow a request across tasks and executor threads.
+
+    The current span lives in a context variable, so tasks created inside a
+    span (hedging, fan-out) become its children. Completed traces are kept
+    in a bounded buffer for export.
+    """
+
+    def __init__(self, enabled: bool = TRACING_ENABLED, buffer_size: int = TRACE_BUFFER_SIZE):
+        self.enabled = enabled
+        self.traces: deque = deque(maxlen=buffer_size)
+        self._trace_ids = itertools.count(1)
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """Open a span as a child of the current one, or as the root of a new trace."""
+        if not self.enabled:
+            yield NOOP_SPAN
+            return
+
+        parent = _current_span.get()
+        if parent is None:
+            trace = Trace(f"{os.getpid()}-{next(self._trace_ids)}")
+        else:
+            trace = parent.trace
+        span = Span(name, trace, parent, attributes)
+        trace.spans.append(span)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except asyncio.CancelledError:
+            span.status = "cancelled"
+            raise
+        except BaseException as e:
+            span.status = "error"
+            span.attributes.setdefault("error", str(e))
+            raise
+        finally:
+            span.end = time.perf_counter()
+            _current_span.reset(token)
+            if parent is None:
+                self.traces.append(trace)
+
+    def get_trace(self, trace_id: Optional[str] = None) -> Optional[Trace]:
+        """A completed trace by id, or the most recent one."""
+        if trace_id is None:
+            return self.traces[-1] if self.traces else None
+        for trace in self.traces:
+            if trace.trace_id == trace_id:
+                return trace
+        return None
+
+    def export(self, trace_id: Optional[str] = None, format: str = "json") -> Optional[Dict[str, Any]]:
+        """Export a trace as "json" or "chrome" (trace event format)."""
+        trace = self.get_trace(trace_id)
+        if trace is None:
+            return None
+        if format == "chrome":
+            return trace.to_chrome_trace()
+        if format == "json":
+            return trace.to_json()
+        raise ValueError(f"Unknown trace format: {format}")
+
+    def write(self, path: str, trace_id: Optional[str] = None, format: str = "chrome"):
+        """Write an exported trace to a file."""
+        data = self.export(trace_id, format)
+        if data is None:
+            raise ValueError("No trace to export")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, default=str)
+
+def current_span():
+    """The active span, or a no-op span outside any trace."""
+    span = _current_span.get()
+    return span if span is not None else NOOP_SPAN
+
+def traced(name: str):
+    """Decorator running a function or coroutine function inside a span."""
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with get_tracer().span(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with get_tracer().span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+_shared_tracer: Optional[Tracer] = None
+
+def get_tracer() -> Tracer:
+    """Get the process-wide tracer."""
+    global _shared_tracer
+    if _shared_tracer is None:
+        _shared_tracer = Tracer()
+    return _shared_tracer
@@ -0,0 +1,81 @@
+import pytest
+import asyncio
+from src.utils.admission import (
+    AdmissionController, AdmissionRejected, TokenBucket, estimate_tokens, token_usage, response_text, call_cost
+)
+
+def test_call_cost():
+    """Test cost from per-million token rates."""
+    assert call_cost(1_000_000, 0, input_rate=0.10, output_rate=0.40) == pytest.approx(0.10)
+    assert call_cost(1000, 500, input_rate=0.10, output_rate=0.40) == pytest.approx(0.0003)
+
+def test_usage_and_text_extraction():
+    """Test reading usage from autogen-style responses and falling back for strings."""
+    class Usage:
+        prompt_tokens = 120
+        completion_tokens = 30
+
+    class Result:
+        content = '{"price": 1}'
+        usage = Usage()
+
+    assert token_usage(Result()) == (120, 30)
+    assert response_text(Result()) == '{"price": 1}'
+    assert token_usage('{"price": 1}') is None
+    assert estimate_tokens("x" * 10) == 3
+
+def test_token_bucket_wait_time():
+    """Test that an empty bucket reports the refill time."""
+    bucket = TokenBucket(per_minute=60)
+    bucket.take(60)
+    assert bucket.wait_time(1) == pytest.approx(1.0, abs=0.05)
+    bucket.give(60)
+    assert bucket.wait_time(1) == 0.0
+
+@pytest.mark.asyncio
+async def test_rate_limited_call_is_deferred():
+    """Test that a call over the request rate waits instead of failing."""
+    admission = AdmissionController(requests_per_minute=600, tokens_per_minute=10**6, budget=1.0, max_wait=1.0)
+    for _ in range(600):
+        admission.requests.take(1)
+    loop = asyncio.get_running_loop()
+    start_time = loop.time()
+    await admission.admit(100, 0.0)
+    assert loop.time() - start_time >= 0.09
+    assert admission.metrics["deferred"] == 1
+
+@pytest.mark.asyncio
+async def test_rate_limited_call_is_rejected_past_max_wait():
+    """Test that a call that would wait too long is rejected for rerouting."""
+    admission = AdmissionController(requests_per_minute=60, tokens_per_minute=1000, budget=1.0, max_wait=0.1)
+    await admission.admit(1000, 0.0)
+    with pytest.raises(AdmissionRejected) as error:
+        await admission.admit(1000, 0.0)
+    assert error.value.reason == "rate"
+    assert error.value.retry_after > 0.1
+
+@pytest.mark.asyncio
+async def test_budget_window_rolls():
+    """Test that spend leaves the rolling budget window and frees capacity."""
+    admission = AdmissionController(budget=0.01, budget_window=0.2, max_wait=0.0)
+    reservation = await admission.admit(100, 0.006)
+    admission.settle(reservation, 80, 20, 0.006)
+    with pytest.raises(AdmissionRejected) as error:
+        await admission.admit(100, 0.006)
+    assert error.value.reason == "budget"
+
+    # With enough patience the call waits for the earlier spend to roll out
+    admission.max_wait = 1.0
+    await admission.admit(100, 0.006)
+    assert admission.metrics["deferred"] == 1
+    assert admission.metrics["rejected_budget"] == 1
+
+@pytest.mark.asyncio
+async def test_release_returns_reservation():
+    """Test that an unbilled call frees its reserved budget."""
+    admission = AdmissionController(budget=0.01, max_wait=0.0)
+    reservation = await admission.admit(100, 0.008)
+    with pytest.raises(AdmissionRejected):
+        await admission.admit(100, 0.008)
+    admission.release(reservation)
+    await admission.admit(100, 0.008)
@@ -0,0 +1,113 @@
+import pytest
+import asyncio
+from src import main
+from src.main import PriceRetriever
+from src.utils.pages import PageLoader
+
+PAGE = ('<div class="plan-card"><h3 class="plan-name">Fast 100</h3>'
+        '<div class="price">$59.99</div><div class="speed">100 Mbps</div></div>')
+
+class CountingFetcher:
+    """fetch_text stand-in counting downloads per URL."""
+
+    def __init__(self, delay: float = 0.02):
+        self.delay = delay
+        self.fetches = {}
+
+    async def fetch_text(self, url):
+        self.fetches[url] = self.fetches.get(url, 0) + 1
+        await asyncio.sleep(self.delay)
+        return PAGE
+
+class StubFallback:
+    """Loads the page through the shared loader, then answers after a per-URL delay."""
+
+    def __init__(self, loader, delays=None):
+        self.loader = loader
+        self.delays = delays or {}
+        self.started = []
+
+    async def process_request(self, url, download_speed, plan_name=None):
+        self.started.append((url, download_speed))
+        await self.loader.load(url)
+        await asyncio.sleep(self.delays.get(url, 0.01))
+        if "bad" in url:
+            raise RuntimeError("no plans found")
+        return {"price": download_speed / 2, "confidence": 0.9, "details": {}}
+
+def make_retriever(monkeypatch, delays=None):
+    fetcher = CountingFetcher()
+    loader = PageLoader(fetcher=fetcher)
+    fallback = StubFallback(loader, delays)
+    monkeypatch.setattr(main, "RoundRobinDistributor", lambda loader: fallback)
+    retriever = PriceRetriever(fallback_only=True)
+    return retriever, fallback, fetcher
+
+async def collect(generator):
+    return [item async for item in generator]
+
+@pytest.mark.asyncio
+async def test_same_url_queries_share_one_fetch(monkeypatch):
+    """Queries for one page in a batch are fetched and parsed once."""
+    retriever, fallback, fetcher = make_retriever(monkeypatch)
+    queries = [("https://a.example/plans", 100), ("https://A.example/plans#top", 50, "Fast"),
+               {"url": "https://b.example/plans", "download_speed": 25}]
+
+    results = await collect(retriever.get_plan_prices(queries))
+
+    assert sorted(result["index"] for result in results) == [0, 1, 2]
+    assert all(result["ok"] for result in results)
+    assert {result["index"]: result["result"]["price"] for result in results} == {0: 50.0, 1: 25.0, 2: 12.5}
+    assert fetcher.fetches == {"https://a.example/plans": 1, "https://b.example/plans": 1}
+    assert retriever.metrics["batch_queries"] == 3
+
+@pytest.mark.asyncio
+async def test_hosts_take_turns(monkeypatch):
+    """With one page in flight, a busy host does not starve the others."""
+    retriever, fallback, _ = make_retriever(monkeypatch)
+    queries = [("https://a.example/1", 100), ("https://a.example/2", 100), ("https://a.example/3", 100),
+               ("https://b.example/1", 100), ("https://c.example/1", 100)]
+
+    await collect(retriever.get_plan_prices(queries, concurrency=1))
+
+    assert [url for url, _ in fallback.started] == [
+        "https://a.example/1", "https://b.example/1", "https://c.example/1",
+        "https://a.example/2", "https://a.example/3"]
+
+@pytest.mark.asyncio
+async def test_results_yield_in_completion_order_with_errors(monkeypatch):
+    """Fast results are not held back by slow ones, and failures are reported per query."""
+    retriever, _, _ = make_retriever(monkeypatch, delays={"https://slow.example/": 0.1})
+    queries = [("https://slow.example/", 100), ("https://fast.example/", 100), ("https://bad.example/", 100)]
+
+    results = await collect(retriever.get_plan_prices(queries))
+
+    assert results[-1]["index"] == 0
+    failed = [result for result in results if not result["ok"]]
+    assert [result["index"] for result in failed] == [2]
+    assert "no plans found" in failed[0]["error"] and not failed[0]["timed_out"]
+
+@pytest.mark.asyncio
+async def test_deadline_returns_partial_results(monkeypatch):
+    """Queries unfinished at the deadline are cancelled and reported as timed out."""
+    retriever, _, _ = make_retriever(monkeypatch, delays={"https://slow.example/": 1.0})
+    queries = [("https://slow.example/", 100), ("https://fast.example/", 100), ("https://later.example/", 100)]
+
+    start_time = asyncio.get_running_loop().time()
+    results = await collect(retriever.get_plan_prices(queries, deadline=0.2, concurrency=2))
+    elapsed = asyncio.get_running_loop().time() - start_time
+
+    assert elapsed < 0.5
+    by_index = {result["index"]: result for result in results}
+    assert by_index[1]["ok"] and by_index[2]["ok"]
+    assert by_index[0]["timed_out"] and not by_index[0]["ok"]
+    assert retriever.metrics["batch_timeouts"] == 1
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("limits", [{"concurrency": 0}, {"per_host": 0}])
+async def test_rejects_limits_that_schedule_nothing(monkeypatch, limits):
+    """Zero slots are a caller error, not a batch of timeouts."""
+    retriever, fallback, _ = make_retriever(monkeypatch)
+    with pytest.raises(ValueError):
+        await collect(retriever.get_plan_prices([("https://a.example/1", 100)], **limits))
+    assert fallback.started == []
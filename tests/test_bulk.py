@@ -0,0 +1,123 @@
+import pytest
+import asyncio
+import json
+from src.bulk import BulkRunner, read_queries, completed_rows
+
+class StubRetriever:
+    """Records concurrency per host and fails for URLs containing 'bad'."""
+
+    def __init__(self, delay: float = 0.01):
+        self.delay = delay
+        self.calls = []
+        self.active = {}
+        self.peak = {}
+
+    async def get_plan_price(self, url, download_speed, plan_name=None):
+        host = url.split("/")[2]
+        self.calls.append(url)
+        self.active[host] = self.active.get(host, 0) + 1
+        self.peak[host] = max(self.peak.get(host, 0), self.active[host])
+        try:
+            await asyncio.sleep(self.delay)
+            if "bad" in url:
+                raise RuntimeError("scrape failed")
+            return {"price": download_speed / 2, "confidence": 0.9, "source": "fallback"}
+        finally:
+            self.active[host] -= 1
+
+def write_csv(path, rows):
+    lines = ["url,download_speed,plan_name"] + [",".join(row) for row in rows]
+    path.write_text("\n".join(lines) + "\n")
+
+def read_output(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+def test_read_queries_csv_and_jsonl(tmp_path):
+    """Both formats yield numbered rows with normalized fields."""
+    csv_path = tmp_path / "q.csv"
+    write_csv(csv_path, [("https://a.example", "100", ""), ("https://b.example", "50", "Fast 50")])
+    rows = list(read_queries(str(csv_path)))
+    assert [row["row"] for row in rows] == [0, 1]
+    assert rows[0]["plan_name"] is None and rows[1]["plan_name"] == "Fast 50"
+
+    jsonl_path = tmp_path / "q.jsonl"
+    jsonl_path.write_text('{"url": "https://a.example", "download_speed": 100}\n\n'
+                          '{"url": "https://b.example", "download_speed": 50}\n'
+                          '{"url": "https://c.exa\n[1, 2]\n')
+    rows = list(read_queries(str(jsonl_path)))
+    assert [row["row"] for row in rows] == [0, 2, 3, 4]
+    # Malformed lines become rows carrying the reason instead of aborting the read
+    assert "Malformed JSON" in rows[2]["error"] and "JSON object" in rows[3]["error"]
+
+@pytest.mark.asyncio
+async def test_bulk_run_limits_hosts_and_summarizes(tmp_path):
+    """Rows stream to JSONL, per-host concurrency is capped and failures are summarized."""
+    input_path, output_path = tmp_path / "q.csv", tmp_path / "out.jsonl"
+    rows = [("https://a.example/%d" % i, "100", "") for i in range(6)]
+    rows += [("https://b.example/bad", "50", ""), ("https://c.example", "fast", "")]
+    write_csv(input_path, rows)
+
+    retriever = StubRetriever()
+    runner = BulkRunner(retriever, concurrency=8, per_host=2)
+    summary = await runner.run(str(input_path), str(output_path))
+
+    records = read_output(output_path)
+    assert sorted(record["row"] for record in records) == list(range(8))
+    assert retriever.peak["a.example"] == 2
+    assert summary["succeeded"] == 6 and summary["failed"] == 2
+    assert summary["errors"] == {"RuntimeError": 1, "ValueError": 1}
+    assert summary["sources"] == {"fallback": 6}
+    assert summary["throughput"] > 0
+
+@pytest.mark.asyncio
+async def test_bulk_run_resumes_from_output(tmp_path):
+    """Rerunning skips recorded rows; --retry-errors reruns failed ones."""
+    input_path, output_path = tmp_path / "q.csv", tmp_path / "out.jsonl"
+    write_csv(input_path, [("https://a.example/1", "100", ""), ("https://a.example/bad", "100", ""),
+                           ("https://a.example/3", "100", "")])
+    # An interrupted run: row 0 done, row 1 failed, a stray non-record line and a torn final line
+    output_path.write_text(json.dumps({"row": 0, "ok": True}) + "\n" +
+                           json.dumps({"row": 1, "ok": False}) + "\n" + "[]\n" + '{"row": 2, "o')
+
+    assert completed_rows(str(output_path)) == {0, 1}
+    assert completed_rows(str(output_path), retry_errors=True) == {0}
+
+    retriever = StubRetriever()
+    summary = await BulkRunner(retriever).run(str(input_path), str(output_path))
+    assert retriever.calls == ["https://a.example/3"]
+    assert summary["skipped"] == 2
+
+    retriever = StubRetriever()
+    summary = await BulkRunner(retriever).run(str(input_path), str(output_path), retry_errors=True)
+    assert retriever.calls == ["https://a.example/bad"]
+    assert summary["processed"] == 1
+
+@pytest.mark.asyncio
+async def test_bulk_run_records_malformed_jsonl_rows(tmp_path):
+    """A malformed JSONL line fails only its own row."""
+    input_path, output_path = tmp_path / "q.jsonl", tmp_path / "out.jsonl"
+    input_path.write_text('{"url": "https://a.example/1", "download_speed": 100}\n'
+                          '{"url": "https://a.exa\n'
+                          '{"url": "https://a.example/3", "download_speed": 100}\n')
+    summary = await BulkRunner(StubRetriever()).run(str(input_path), str(output_path))
+    records = {record["row"]: record for record in read_output(output_path)}
+    assert records[0]["ok"] and records[2]["ok"]
+    assert not records[1]["ok"] and "Malformed JSON" in records[1]["error"]
+    assert summary["errors"] == {"ValueError": 1}
+
+@pytest.mark.asyncio
+async def test_busy_host_does_not_block_other_hosts(tmp_path):
+    """Rows for idle hosts start at once even when a busy host's backlog comes first in the file."""
+    input_path, output_path = tmp_path / "q.csv", tmp_path / "out.jsonl"
+    rows = [("https://busy.example/%d" % i, "100", "") for i in range(12)]
+    rows += [("https://%s.example" % name, "100", "") for name in ("b", "c", "d")]
+    write_csv(input_path, rows)
+
+    retriever = StubRetriever()
+    await BulkRunner(retriever, concurrency=4, per_host=1).run(str(input_path), str(output_path))
+
+    records = read_output(output_path)
+    assert retriever.peak["busy.example"] == 1
+    # The other hosts finish alongside the first busy-host row, not after the whole backlog
+    assert {record["url"] for record in records[:4]} >= {"https://b.example", "https://c.example", "https://d.example"}
+    assert len(records) == 15
@@ -1,6 +1,11 @@
 import pytest
+import asyncio
 import json
 from src.agents.coordinator import MagenticCoordinator
+from src.utils.extraction import get_extraction_engine
+from src.utils.fetcher import FetchError
+from src.utils.result_cache import ResultCache
+from src.utils.admission import AdmissionController, call_cost
 
 @pytest.fixture
 def coordinator():
@@ -78,16 +83,21 @@ def test_metrics_update(coordinator):
     assert coordinator.metrics["average_latency"] == 1.5
 
 @pytest.mark.asyncio
-async def test_process_request_validation(coordinator):
+async def test_process_request_validation(coordinator, tmp_path):
     """Test request processing validation."""
     url = "https://example.com"
     speed = 100.0
+    coordinator.loader = StubLoader("<div class='plan'>$89.99 100 Mbps</div>")
+    coordinator.result_cache = ResultCache(disk_dir=str(tmp_path))
+    coordinator.coordinator = StubModel()
     
     # Test with mock low confidence response
     coordinator._parse_response = lambda x: {"price": 89.99, "confidence": 0.3, "details": {}}
     
-    with pytest.raises(ValueError, match="Confidence below threshold"):
+    # process_request reports failures wrapped in a plain Exception naming the cause
+    with pytest.raises(Exception, match="Coordinator processing failed: Confidence below threshold"):
         await coordinator.process_request(url, speed)
+    assert coordinator.coordinator.calls == 1
 
 def test_monitor_performance(coordinator):
     """Test performance monitoring."""
@@ -107,3 +117,128 @@ def test_parse_response_type_validation(coordinator):
     
     with pytest.raises(ValueError):
         coordinator._parse_response(invalid_types_response)
+
+class StubPage:
+    """Parsed page stub exposing only what the coordinator reads."""
+
+    def __init__(self, html: str):
+        self.content = html
+        self.index = get_extraction_engine().index(html)
+        self.content_hash = "raw"
+
+class StubLoader:
+    def __init__(self, html: str):
+        self.html = html
+
+    async def load(self, url):
+        return StubPage(self.html)
+
+class StubModel:
+    def __init__(self):
+        self.calls = 0
+
+    async def generate(self, prompt):
+        self.calls += 1
+        return json.dumps({"price": 89.99, "confidence": 0.95, "details": {}})
+
+@pytest.mark.asyncio
+async def test_result_cache_skips_model_for_unchanged_page(coordinator, tmp_path):
+    """Test that unchanged pages are answered from the result cache."""
+    coordinator.loader = StubLoader("<div class='plan'>$89.99 100 Mbps</div>")
+    coordinator.result_cache = ResultCache(disk_dir=str(tmp_path))
+    coordinator.coordinator = StubModel()
+
+    first = await coordinator.process_request("https://example.com", 100.0)
+    second = await coordinator.process_request("https://example.com", 100.0)
+    assert first["price"] == second["price"] == 89.99
+    assert second["cached"] is True
+    assert coordinator.coordinator.calls == 1
+    assert coordinator.metrics["cache_hits"] == 1
+
+    # A changed plan container invalidates the cached result
+    coordinator.loader = StubLoader("<div class='plan'>$79.99 100 Mbps</div>")
+    await coordinator.process_request("https://example.com", 100.0)
+    assert coordinator.coordinator.calls == 2
+
+class UsageResponse:
+    """Model response carrying Gemini-style usage metadata."""
+
+    def __init__(self, text: str, prompt_tokens: int, output_tokens: int):
+        self.text = text
+        self.usage_metadata = type("Usage", (), {
+            "prompt_token_count": prompt_tokens,
+            "candidates_token_count": output_tokens
+        })()
+
+class UsageModel(StubModel):
+    async def generate(self, prompt):
+        self.calls += 1
+        return UsageResponse(json.dumps({"price": 89.99, "confidence": 0.95, "details": {}}), 1000, 200)
+
+@pytest.mark.asyncio
+async def test_token_cost_accounting(coordinator, tmp_path):
+    """Test that cost is computed from the tokens the model reports."""
+    coordinator.loader = StubLoader("<div class='plan'>$89.99 100 Mbps</div>")
+    coordinator.result_cache = ResultCache(disk_dir=str(tmp_path))
+    coordinator.admission = AdmissionController(budget=1.0)
+    coordinator.coordinator = UsageModel()
+
+    await coordinator.process_request("https://example.com", 100.0)
+    assert coordinator.metrics["input_tokens"] == 1000
+    assert coordinator.metrics["output_tokens"] == 200
+    assert coordinator.metrics["total_cost"] == pytest.approx(call_cost(1000, 200))
+    assert coordinator.admission.get_metrics()["window_spend"] == pytest.approx(call_cost(1000, 200))
+
+@pytest.mark.asyncio
+async def test_exhausted_budget_rejects_before_calling_model(coordinator, tmp_path):
+    """Test that calls over budget are refused before any money is spent."""
+    coordinator.loader = StubLoader("<div class='plan'>$89.99 100 Mbps</div>")
+    coordinator.result_cache = ResultCache(disk_dir=str(tmp_path))
+    coordinator.admission = AdmissionController(budget=0.0, max_wait=0.0)
+    coordinator.coordinator = StubModel()
+
+    with pytest.raises(Exception, match="Cost budget exhausted"):
+        await coordinator.process_request("https://example.com", 100.0)
+    assert coordinator.coordinator.calls == 0
+
+class ThrottledLoader:
+    async def load(self, url):
+        raise FetchError("HTTP 429", status=429, retry_after=30.0)
+
+@pytest.mark.asyncio
+async def test_fetch_failure_skips_model(coordinator, tmp_path):
+    """Test that an unfetchable page raises its FetchError without a model call or a cached result."""
+    coordinator.loader = ThrottledLoader()
+    coordinator.result_cache = ResultCache(disk_dir=str(tmp_path))
+    coordinator.coordinator = StubModel()
+
+    with pytest.raises(FetchError) as exc_info:
+        await coordinator.process_request("https://example.com", 100.0)
+    assert exc_info.value.status == 429 and exc_info.value.retry_after == 30.0
+    assert coordinator.coordinator.calls == 0
+    assert coordinator.metrics["cache_misses"] == 0
+
+class HangingModel(StubModel):
+    def __init__(self):
+        super().__init__()
+        self.started = asyncio.Event()
+
+    async def generate(self, prompt):
+        self.calls += 1
+        self.started.set()
+        await asyncio.sleep(60)
+
+@pytest.mark.asyncio
+async def test_cancelled_call_releases_its_reservation(coordinator):
+    """Test that a model call cancelled midway (e.g. a losing hedge) gives back its reserved cost and tokens."""
+    coordinator.admission = AdmissionController(budget=1.0)
+    coordinator.coordinator = HangingModel()
+
+    call = asyncio.ensure_future(coordinator._generate("What does the 100 Mbps plan cost?"))
+    await coordinator.coordinator.started.wait()
+    assert coordinator.admission._reserved_cost > 0
+    call.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await call
+    assert coordinator.admission._reserved_cost == 0
+    assert coordinator.admission.tokens.tokens == coordinator.admission.tokens.capacity
@@ -0,0 +1,102 @@
+import pytest
+import json
+from src.agents.coordinator import MagenticCoordinator
+from src.utils.extraction import get_extraction_engine
+from src.utils.digest import build_digest
+from src.utils.result_cache import ResultCache
+
+URL = "https://isp.example/plans"
+BOILERPLATE = '<li class="feature">Free installation</li><li class="feature">No data caps</li>'
+
+def card(name, price, speed, extra=""):
+    return (f'<div class="plan-card"><h3>{name}</h3><span class="price">${price}</span>'
+            f'<span class="speed">{speed} Mbps</span><ul>{BOILERPLATE}{extra}</ul></div>')
+
+def page(*cards):
+    filler = "<p>" + "Terms and conditions apply. " * 200 + "</p>"
+    return f'<html><body><nav>{"<a>Link</a>" * 50}</nav><section class="pricing">{"".join(cards)}</section>{filler}</body></html>'
+
+def digest_of(html, speed=100.0, plan_name=None, **kwargs):
+    return build_digest(get_extraction_engine().index(html), html, speed, plan_name, **kwargs)
+
+CARDS = [card("Basic", "49.99", 50), card("Fast", "69.99", 100, '<li class="feature">Free router</li>'), card("Ultra", "89.99", 1000)]
+
+def test_digest_lists_each_card_and_shares_boilerplate():
+    """Every card gets one line; features common to most cards appear once."""
+    digest = digest_of(page(*CARDS))
+    lines = digest.text.splitlines()
+    assert digest.included == digest.containers == 3
+    assert any(line.startswith("- Fast") and "$69.99" in line and "Free router" in line for line in lines)
+    assert digest.text.count("Free installation") == 1
+    assert lines[-1].startswith("Common to most plans:")
+    assert digest.tokens < digest.raw_tokens and digest.tokens_saved == digest.raw_tokens - digest.tokens
+
+def test_digest_puts_matching_plans_first_and_respects_budget():
+    """A tight budget keeps the plans matching the query and notes how many were cut."""
+    cards = [card(f"Plan {speed}", "59.99", speed) for speed in (25, 50, 200, 500, 1000, 100)]
+    digest = digest_of(page(*cards), speed=100.0, budget=40)
+    lines = digest.text.splitlines()
+    assert lines[1].startswith("- Plan 100")
+    assert digest.included < digest.containers
+    assert f"({digest.containers - digest.included} less relevant plans omitted)" in lines
+
+def test_digest_truncates_a_line_longer_than_the_budget():
+    """A single card whose line exceeds the budget on its own is cut to fit instead of included whole."""
+    features = "".join(f'<li class="feature">Perk number {i} with a long description</li>' for i in range(40))
+    budget = 60
+    digest = digest_of(page(card("Giant", "59.99", 100, features)), budget=budget)
+    lines = digest.text.splitlines()
+    assert digest.included == 1
+    assert lines[1].startswith("- Giant") and lines[1].endswith("...")
+    assert digest.tokens <= budget
+
+def test_digest_drops_duplicate_cards():
+    """Identical cards, such as a monthly/annual toggle rendering twice, are listed once."""
+    digest = digest_of(page(CARDS[1], CARDS[1]))
+    assert digest.containers == 2 and digest.included == 1
+
+def test_no_plan_containers():
+    """Pages without plan cards produce no digest."""
+    assert digest_of("<html><body><p>Nothing here</p></body></html>") is None
+
+class StubPage:
+    def __init__(self, html):
+        self.content = html
+        self.index = get_extraction_engine().index(html)
+        self.content_hash = "raw"
+
+class StubLoader:
+    def __init__(self, html):
+        self.html = html
+
+    async def load(self, url):
+        return StubPage(self.html)
+
+class StubModel:
+    def __init__(self):
+        self.prompts = []
+
+    async def generate(self, prompt):
+        self.prompts.append(prompt)
+        return json.dumps({"price": 69.99, "confidence": 0.95, "details": {}})
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("compact", [True, False])
+async def test_coordinator_reports_prompt_savings(tmp_path, compact):
+    """Compacted prompts carry the digest and report the tokens they saved."""
+    coordinator = MagenticCoordinator(result_cache=ResultCache(disk_dir=str(tmp_path)), compact_prompts=compact)
+    coordinator.coordinator = StubModel()
+    coordinator.loader = StubLoader(page(*CARDS))
+
+    result = await coordinator.process_request(URL, 100.0)
+
+    prompt = coordinator.coordinator.prompts[0]
+    assert prompt.startswith(f"Extract internet plan pricing information from {URL}.")
+    assert ("- Fast | $69.99" in prompt) is compact
+    assert result["prompt"]["compacted"] is compact
+    if compact:
+        assert result["prompt"]["tokens_saved"] > 0
+        assert result["prompt"]["latency_delta"] is None  # no full-page baseline yet
+        assert coordinator.metrics["prompt_tokens_saved"] == result["prompt"]["tokens_saved"]
+    else:
+        assert coordinator.metrics["full_prompts"] == 1
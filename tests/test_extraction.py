@@ -0,0 +1,99 @@
+import pytest
+from bs4 import BeautifulSoup
+from src.utils.extraction import (
+    ExtractionEngine, ROLE_PLAN, ROLE_SCRAPER_PLAN, ROLE_PRICE, parse_number
+)
+from src.agents.fallback import ScraperAgent
+
+@pytest.fixture
+def engine():
+    return ExtractionEngine()
+
+@pytest.fixture
+def pricing_page():
+    return """
+    <html><body>
+    <section class="pricing-table">
+        <div class="plan-card">
+            <h2 class="plan-name">Basic</h2>
+            <!-- was $99 -->
+            <script>var promo = "$1";</script>
+            <div class="price">$59.00 /mo</div>
+            <div class="speed">50 Mbps</div>
+        </div>
+        <div class="plan-card">
+            <h1> </h1>
+            <h3>Premium NBN Plan</h3>
+            <div class="price"><span class="amount">$89.99</span> /mo</div>
+            <div class="speed">Download speed 100 Mbps</div>
+            <ul class="features"><li>12 month contract</li><li>Unlimited data</li></ul>
+        </div>
+    </section>
+    <div class="subscription-banner">Subscribe for 20 /mo</div>
+    </body></html>
+    """
+
+def test_classify_roles(engine):
+    """Test role assignment from tag and class attribute."""
+    assert engine.classify('div', ['plan-card']) & ROLE_PLAN
+    assert engine.classify('div', 'subscription') & ROLE_PLAN
+    assert not engine.classify('div', 'subscription') & ROLE_SCRAPER_PLAN
+    assert not engine.classify('span', ['plan']) & ROLE_PLAN
+    assert engine.classify('span', ['Price-Tag']) & ROLE_PRICE
+    assert engine.classify('div', None) == 0
+
+def test_index_finds_containers_in_document_order(engine, pricing_page):
+    """Test that nested containers are indexed in document order."""
+    index = engine.index(pricing_page)
+    assert [c.classes for c in index.plan_containers()] == [
+        'pricing-table', 'plan-card', 'plan-card', 'subscription-banner'
+    ]
+    assert len(index.scraper_containers()) == 3
+
+def test_extract_plans(engine, pricing_page):
+    """Test plan records extracted from the index."""
+    plans = engine.extract_plans(engine.index(pricing_page))
+    basic, premium, banner = plans[1], plans[2], plans[3]
+
+    assert basic["name"] == "Basic"
+    assert basic["price"] == 59.0
+    assert basic["speed"] == 50.0
+
+    # Blank h1 falls through to the next selector
+    assert premium["name"] == "Premium NBN Plan"
+    assert premium["price"] == 89.99
+    assert premium["speed"] == 100.0
+    assert premium["details"]["contract_length"] == "12 months"
+    assert premium["details"]["data_limit"] == "Unlimited"
+
+    assert banner["price"] == 20.0
+
+def test_comments_and_scripts_are_not_text(engine, pricing_page):
+    """Test that only visible text is indexed."""
+    basic = engine.index(pricing_page).plan_containers()[1]
+    assert "$99" not in basic.text
+    assert "promo" not in basic.text
+    assert basic.first_strings["$"].strip() == "$59.00 /mo"
+
+def test_index_container_matches_page_index(engine, pricing_page):
+    """Test indexing a single element gives the same plan record."""
+    soup = BeautifulSoup(pricing_page, 'html.parser')
+    element = soup.find_all('div', class_='plan-card')[1]
+    container = engine.index_container(element)
+    page_plan = engine.extract_plans(engine.index(soup))[2]
+    assert engine.extract_plan(container) == page_plan
+
+def test_parse_number():
+    """Test number parsing from text nodes."""
+    assert parse_number("$89.99 /mo") == 89.99
+    assert parse_number("Up to 1,000 Mbps") == 1000.0
+    assert parse_number("no digits") is None
+
+def test_scraper_find_price(engine, pricing_page):
+    """Test the scraper's price lookup over the shared index."""
+    agent = ScraperAgent(0)
+    index = engine.index(pricing_page)
+    assert agent._find_price(index, 100.0, None) == 89.99
+    assert agent._find_price(index, 50.0, "basic") == 59.0
+    assert agent._find_price(index, 100.0, "premium") == 89.99
+    assert agent._find_price(index, 25.0, None) is None
@@ -0,0 +1,64 @@
+import pytest
+import asyncio
+import time
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from src.utils.fetcher import AsyncFetcher, FetchError
+
+PAGE = "<html><body><div class='plan'>$59.99 /mo 100 Mbps</div></body></html>"
+
+async def _page(request):
+    await asyncio.sleep(float(request.query.get("delay", 0)))
+    return web.Response(text=PAGE, content_type="text/html")
+
+async def _missing(request):
+    return web.Response(status=404)
+
+@pytest.fixture
+async def server():
+    app = web.Application()
+    app.router.add_get("/page", _page)
+    app.router.add_get("/missing", _missing)
+    server = TestServer(app)
+    await server.start_server()
+    yield server
+    await server.close()
+
+@pytest.fixture
+async def fetcher():
+    fetcher = AsyncFetcher(timeout=5.0, read_timeout=0.5, max_connections_per_host=10)
+    yield fetcher
+    await fetcher.close()
+
+@pytest.mark.asyncio
+async def test_fetch_text(server, fetcher):
+    """Test fetching a page body."""
+    text = await fetcher.fetch_text(str(server.make_url("/page")))
+    assert text == PAGE
+    assert fetcher.metrics["requests"] == 1
+    assert fetcher.metrics["bytes_received"] == len(PAGE)
+
+@pytest.mark.asyncio
+async def test_concurrent_fetches_overlap(server, fetcher):
+    """Test that concurrent fetches wait on the network in parallel."""
+    url = str(server.make_url("/page?delay=0.2"))
+    start_time = time.monotonic()
+    results = await asyncio.gather(*(fetcher.fetch(url) for _ in range(5)))
+    elapsed_time = time.monotonic() - start_time
+
+    assert all(result.status == 200 for result in results)
+    assert elapsed_time < 0.8
+
+@pytest.mark.asyncio
+async def test_http_error_status(server, fetcher):
+    """Test that error statuses raise FetchError with the status code."""
+    with pytest.raises(FetchError) as exc_info:
+        await fetcher.fetch(str(server.make_url("/missing")))
+    assert exc_info.value.status == 404
+    assert fetcher.metrics["failed_requests"] == 1
+
+@pytest.mark.asyncio
+async def test_read_timeout(server, fetcher):
+    """Test that slow responses are cut off by the read timeout."""
+    with pytest.raises(FetchError):
+        await fetcher.fetch(str(server.make_url("/page?delay=2")))
@@ -0,0 +1,95 @@
+import pytest
+import asyncio
+from src import main
+from src.main import PriceRetriever
+from src.utils.fetcher import FetchError
+
+class StubPath:
+    """Coordinator/fallback stub with a fixed delay and outcome."""
+
+    def __init__(self, delay: float, confidence: float = 0.95, error: Exception = None):
+        self.delay = delay
+        self.confidence = confidence
+        self.error = error
+        self.started = False
+        self.cancelled = False
+
+    async def process_request(self, url, download_speed, plan_name=None):
+        self.started = True
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        if self.error:
+            raise self.error
+        return {"price": 69.0, "confidence": self.confidence, "details": {}}
+
+def make_retriever(monkeypatch, coordinator: StubPath, fallback: StubPath, hedge_delay: float = 0.05):
+    monkeypatch.setattr(main, "MagenticCoordinator", lambda loader: coordinator)
+    monkeypatch.setattr(main, "RoundRobinDistributor", lambda loader: fallback)
+    return PriceRetriever(hedged=True, hedge_delay=hedge_delay)
+
+@pytest.mark.asyncio
+async def test_fast_coordinator_skips_fallback(monkeypatch):
+    """Test that the fallback never starts when the coordinator answers in time."""
+    coordinator, fallback = StubPath(0.01), StubPath(0.01)
+    retriever = make_retriever(monkeypatch, coordinator, fallback)
+    result = await retriever.get_plan_price("https://example.com", 50)
+    assert result["source"] == "coordinator"
+    assert not result["hedge"]["fallback_started"]
+    assert not fallback.started
+
+@pytest.mark.asyncio
+async def test_slow_coordinator_loses_to_fallback(monkeypatch):
+    """Test that a slow coordinator is hedged and cancelled once the fallback wins."""
+    coordinator, fallback = StubPath(1.0), StubPath(0.01)
+    retriever = make_retriever(monkeypatch, coordinator, fallback)
+    result = await retriever.get_plan_price("https://example.com", 50)
+    await asyncio.sleep(0)
+    assert result["source"] == "fallback"
+    assert result["hedge"]["fallback_started"]
+    assert result["hedge"]["elapsed"] < 0.5
+    assert coordinator.cancelled
+    assert retriever.metrics["fallback_wins"] == 1
+
+@pytest.mark.asyncio
+async def test_coordinator_failure_starts_fallback_immediately(monkeypatch):
+    """Test that a failed coordinator does not wait out the hedge delay."""
+    coordinator, fallback = StubPath(0.0, error=Exception("model down")), StubPath(0.0)
+    retriever = make_retriever(monkeypatch, coordinator, fallback, hedge_delay=5.0)
+    result = await retriever.get_plan_price("https://example.com", 50)
+    assert result["source"] == "fallback"
+    assert result["hedge"]["elapsed"] < 1.0
+
+@pytest.mark.asyncio
+async def test_low_confidence_keeps_best_result(monkeypatch):
+    """Test that the most confident result is kept when neither clears the threshold."""
+    coordinator, fallback = StubPath(0.01, confidence=0.6), StubPath(0.02, confidence=0.4)
+    retriever = make_retriever(monkeypatch, coordinator, fallback)
+    result = await retriever.get_plan_price("https://example.com", 50)
+    assert result["source"] == "coordinator"
+    assert result["confidence"] == 0.6
+
+@pytest.mark.asyncio
+async def test_both_paths_fail(monkeypatch):
+    """Test that the error propagates when both paths fail."""
+    coordinator = StubPath(0.0, error=Exception("model down"))
+    fallback = StubPath(0.0, error=ValueError("no price"))
+    retriever = make_retriever(monkeypatch, coordinator, fallback)
+    with pytest.raises(ValueError):
+        await retriever.get_plan_price("https://example.com", 50)
+
+@pytest.mark.asyncio
+async def test_fetch_failure_outranks_fallback_error(monkeypatch):
+    """Test that a page fetch failure, not the fallback's later error, reaches the caller."""
+    coordinator = StubPath(0.0, error=FetchError("HTTP 503", status=503, retry_after=2.0))
+    fallback = StubPath(0.01, error=ValueError("no price"))
+    retriever = make_retriever(monkeypatch, coordinator, fallback)
+    with pytest.raises(FetchError) as exc_info:
+        await retriever.get_plan_price("https://example.com", 50)
+    assert exc_info.value.retry_after == 2.0
+
+    retriever.hedged = False
+    with pytest.raises(FetchError):
+        await retriever.get_plan_price("https://example.com", 50)
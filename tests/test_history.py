@@ -0,0 +1,128 @@
+import pytest
+import os
+import sys
+import threading
+from src.utils.history import PriceHistory, _encode_varints, _decode_varints
+
+URL = "https://isp.example/plans"
+DAY = 24 * 3600.0
+T0 = 1_700_000_000.0
+
+def fill(history, days=90):
+    """Daily prices for two plans, with a price change halfway."""
+    for day in range(days):
+        history.append(URL, "Fast 100", 100, 69.99 if day < days // 2 else 64.99, 0.95, T0 + day * DAY)
+        history.append(URL, "Ultra", 1000, 89.99, 0.9, T0 + day * DAY + 60)
+
+def test_varint_round_trip():
+    """Zigzag varints round-trip positive, negative and large values."""
+    values = [0, 1, -1, 63, -64, 500, -500, 2 ** 40, -(2 ** 40)]
+    assert _decode_varints(_encode_varints(values)) == values
+    assert len(_encode_varints([0, 1, -1, 63, -64])) == 5
+
+def test_per_plan_and_time_range_queries():
+    """Queries select one plan series and a half-open time range."""
+    history = PriceHistory(directory=None)
+    fill(history)
+    fast = history.query(URL, "Fast 100", 100)
+    assert len(fast) == 90 and all(obs.plan_name == "Fast 100" for obs in fast)
+    assert [obs.price for obs in fast[44:46]] == [69.99, 64.99]
+
+    week = history.query(start=T0 + 10 * DAY, end=T0 + 17 * DAY)
+    assert len(week) == 14
+    assert week[0].timestamp == T0 + 10 * DAY and week[-1].timestamp < T0 + 17 * DAY
+    assert len(history.query("HTTPS://ISP.example/plans", speed=1000)) == 90
+    assert history.query("https://other.example/") == []
+
+def test_out_of_order_appends_stay_queryable():
+    """Late observations are found by both per-plan and global time queries."""
+    history = PriceHistory(directory=None)
+    history.append(URL, "Fast", 100, 70.0, timestamp=T0 + 20)
+    history.append(URL, "Fast", 100, 60.0, timestamp=T0 + 10)
+    assert [obs.price for obs in history.query(URL)] == [60.0, 70.0]
+    assert [obs.price for obs in history.query(start=T0, end=T0 + 15)] == [60.0]
+    history.append(URL, "Fast", 100, 65.0, timestamp=T0 + 15)
+    assert [obs.price for obs in history.query(URL, "Fast", start=T0 + 12, end=T0 + 20)] == [65.0]
+    assert [obs.price for obs in history.query(URL, "Fast", start=T0 + 10)] == [60.0, 65.0, 70.0]
+
+def test_confidence_keeps_its_stored_precision():
+    """Confidences come back exactly as rounded to 0.001, not widened from single precision."""
+    history = PriceHistory(directory=None)
+    history.append(URL, "Fast", 100, 70.0, 0.1234, timestamp=T0)
+    assert history.query()[0].confidence == 0.123
+
+def test_segments_round_trip_and_compact(tmp_path):
+    """Flushed segments reload with cent, millisecond and 0.001 precision, and compaction keeps every row."""
+    history = PriceHistory(directory=str(tmp_path), flush_rows=50, max_segments=2)
+    fill(history)
+    history.append(URL, "Fast 100", 100, 64.999, 0.9504, T0 + 91 * DAY + 0.0004)
+    history.flush()
+    assert history.metrics["compactions"] >= 1
+    assert len(os.listdir(tmp_path)) <= 3
+
+    reloaded = PriceHistory(directory=str(tmp_path))
+    assert len(reloaded) == 181
+    assert [obs.to_dict() for obs in reloaded.query()] == [obs.to_dict() for obs in history.query()]
+    last = reloaded.query(URL, "Fast 100")[-1]
+    assert (last.price, last.timestamp) == (65.0, T0 + 91 * DAY)
+    assert last.confidence == 0.95
+
+    # Delta encoding: a stable daily series costs a few bytes per row on disk
+    assert history.metrics["bytes_written"] / history.metrics["appended"] < 40
+
+def test_record_get_plan_price_results():
+    """Results are recorded under the query's plan name, or the extracted one."""
+    history = PriceHistory(directory=None)
+    assert history.record(URL, 100, None, {"price": 59.99, "confidence": 0.9, "name": "Fast", "speed": 100.0})
+    assert history.record(URL, 100, "Fast", {"price": 58.99, "confidence": 0.9, "details": {}})
+    assert not history.record(URL, 100, None, {"price": None})
+    assert history.plans() == [(URL, "Fast", 100.0)]
+
+def deep_size(value):
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(deep_size(k) + deep_size(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple)):
+        size += sum(deep_size(item) for item in value)
+    return size
+
+def test_memory_per_observation_is_small():
+    """A stored observation takes a small fraction of its result dict."""
+    history = PriceHistory(directory=None)
+    fill(history, days=500)
+    result = {"url": URL, "plan_name": "Fast 100", "speed": 100.0, "price": 69.99, "confidence": 0.95,
+              "timestamp": T0, "details": {"contract_length": "12 months", "data_limit": "Unlimited"}}
+    assert history.get_metrics()["bytes_per_observation"] < deep_size(result) / 10
+
+@pytest.mark.asyncio
+async def test_get_plan_price_flushes_off_the_event_loop(tmp_path):
+    """A due segment write runs in a worker thread; the request and later appends do not wait for it."""
+    from src.main import PriceRetriever
+
+    class BlockingHistory(PriceHistory):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.release = threading.Event()
+            self.threads = []
+
+        def flush(self):
+            self.threads.append(threading.get_ident())
+            self.release.wait(5)
+            super().flush()
+
+    history = BlockingHistory(directory=str(tmp_path), flush_rows=2)
+    retriever = PriceRetriever(fallback_only=True, history=history)
+
+    async def answer(url, download_speed, plan_name=None):
+        return {"price": 59.99, "confidence": 0.9, "speed": download_speed, "source": "fallback"}
+    retriever._get_plan_price = answer
+
+    for speed in (100, 200, 300):
+        await retriever.get_plan_price(URL, speed)
+    # One flush is in progress and still blocked, yet every request has returned and been recorded
+    assert len(history) == 3 and history.metrics["segments_written"] == 0
+    assert history.threads and threading.get_ident() not in history.threads
+
+    history.release.set()
+    await retriever.close()
+    assert len(PriceHistory(directory=str(tmp_path))) == 3
@@ -0,0 +1,77 @@
+import pytest
+import threading
+from src.utils.latency import LatencyHistogram, LatencyRecorder, prometheus_gauges
+from src.utils.pages import PageLoader
+
+class StaticFetcher:
+    """Fetcher stub returning fixed content."""
+
+    async def fetch_text(self, url: str) -> str:
+        return "<div class='plan'><span class='price'>$59</span> 50 Mbps</div>"
+
+def test_percentiles_within_bucket_precision():
+    """Test percentile estimates on a known distribution."""
+    histogram = LatencyHistogram()
+    for millis in range(1, 1001):
+        histogram.observe(millis / 1000)
+    summary = histogram.snapshot()
+    assert summary["count"] == 1000
+    assert summary["max"] == 1.0
+    assert 0.5 <= summary["p50"] <= 0.5 * 1.2
+    assert 0.95 <= summary["p95"] <= 1.0
+    assert summary["p99"] <= summary["max"]
+    assert summary["mean"] == pytest.approx(0.5005)
+
+def test_tail_is_visible():
+    """Test that a slow tail shows up in p99 but not p50."""
+    histogram = LatencyHistogram()
+    for _ in range(980):
+        histogram.observe(0.01)
+    for _ in range(20):
+        histogram.observe(2.0)
+    assert histogram.percentile(0.5) <= 0.012
+    assert histogram.percentile(0.99) == pytest.approx(2.0, rel=0.2)
+
+def test_concurrent_threads_do_not_lose_counts():
+    """Test that recording from many threads keeps exact counts."""
+    recorder = LatencyRecorder()
+
+    def work():
+        for _ in range(2000):
+            recorder.observe("parse", 0.001)
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert recorder.snapshot()["parse"]["count"] == 16000
+
+def test_timer_records_failures():
+    """Test that the stage timer records blocks that raise."""
+    recorder = LatencyRecorder()
+    with pytest.raises(ValueError):
+        with recorder.time("llm"):
+            raise ValueError("boom")
+    assert recorder.snapshot()["llm"]["count"] == 1
+
+def test_prometheus_export():
+    """Test the Prometheus text format of summaries and gauges."""
+    recorder = LatencyRecorder()
+    recorder.observe("fetch", 0.2)
+    text = recorder.to_prometheus()
+    assert "# TYPE price_retriever_stage_latency_seconds summary" in text
+    assert 'price_retriever_stage_latency_seconds{stage="fetch",quantile="0.99"}' in text
+    assert 'price_retriever_stage_latency_seconds_count{stage="fetch"} 1' in text
+
+    gauges = prometheus_gauges({"fallback_metrics": {"total_requests": 3, "scheduler": "ewma_p2c"}})
+    assert "price_retriever_fallback_metrics_total_requests 3" in gauges
+    assert "scheduler" not in gauges
+
+@pytest.mark.asyncio
+async def test_loader_records_parse_stage():
+    """Test that page parsing is timed per stage."""
+    recorder = LatencyRecorder()
+    loader = PageLoader(fetcher=StaticFetcher(), latency=recorder)
+    await loader.load("https://example.com/plans")
+    assert recorder.snapshot()["parse"]["count"] == 1
@@ -0,0 +1,43 @@
+import pytest
+import os
+import subprocess
+import sys
+from src import config
+from src.agents.coordinator import MagenticCoordinator
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def test_fallback_only_run_skips_model_sdks():
+    """Test that a fallback-only retriever starts without the API key or model SDKs."""
+    code = (
+        "import sys\n"
+        "from src.main import PriceRetriever\n"
+        "retriever = PriceRetriever(fallback_only=True)\n"
+        "retriever.fallback\n"
+        "loaded = [m for m in ('google.cloud.aiplatform', 'autogen_ext') if m in sys.modules]\n"
+        "print(','.join(loaded) or 'none')\n"
+    )
+    env = {key: value for key, value in os.environ.items() if key != "GOOGLE_API_KEY"}
+    output = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True)
+    assert output.stdout.strip() == "none"
+
+def test_api_key_checked_on_first_model_use(monkeypatch):
+    """Test that a missing API key only fails when the model is needed."""
+    monkeypatch.setattr(config, "GOOGLE_API_KEY", None)
+    coordinator = MagenticCoordinator()
+    assert coordinator._model is None
+    with pytest.raises(ValueError, match="GOOGLE_API_KEY"):
+        coordinator.model
+
+def test_status_does_not_build_agents():
+    """Test that a status call reports unbuilt agents as None instead of constructing them."""
+    from src.main import PriceRetriever
+    retriever = PriceRetriever(fallback_only=True)
+    status = retriever.get_system_status()
+    assert retriever._coordinator is None and retriever._web_surfer is None and retriever._fallback is None
+    assert status["coordinator_metrics"] is None and status["fallback_metrics"] is None
+
+    retriever.fallback
+    assert retriever.get_system_status()["fallback_metrics"] is not None
+    assert retriever._coordinator is None
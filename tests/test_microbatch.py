@@ -0,0 +1,100 @@
+import pytest
+import asyncio
+import json
+import re
+from src.agents.coordinator import MagenticCoordinator
+from src.utils.extraction import get_extraction_engine
+from src.utils.microbatch import MicroBatcher
+from src.utils.result_cache import ResultCache
+
+class Recorder:
+    """send() stub that records batches and echoes items, failing the ones named 'bad'."""
+
+    def __init__(self):
+        self.batches = []
+
+    async def __call__(self, items):
+        self.batches.append(list(items))
+        await asyncio.sleep(0)
+        return [ValueError("bad item") if item == "bad" else item.upper() for item in items]
+
+@pytest.mark.asyncio
+async def test_batch_flushes_when_full():
+    """max_size concurrent submissions go out together without waiting for the window."""
+    send = Recorder()
+    batcher = MicroBatcher(send, window=10, max_size=3)
+    results = await asyncio.wait_for(asyncio.gather(*(batcher.submit(item) for item in "abc")), 1)
+    assert results == ["A", "B", "C"]
+    assert send.batches == [["a", "b", "c"]]
+    assert batcher.metrics["flushed_full"] == 1
+
+@pytest.mark.asyncio
+async def test_batch_flushes_after_window_and_on_token_budget():
+    """A partial batch is sent after the window; one over the token budget is split."""
+    send = Recorder()
+    batcher = MicroBatcher(send, window=0.02, max_size=10, max_tokens=100)
+    results = await asyncio.gather(batcher.submit("a", 60), batcher.submit("b", 60), batcher.submit("c", 30))
+    assert results == ["A", "B", "C"]
+    assert send.batches == [["a"], ["b", "c"]]
+    assert batcher.metrics["flushed_tokens"] == 1 and batcher.metrics["flushed_window"] == 1
+    assert batcher.get_metrics()["average_batch_size"] == 1.5
+
+@pytest.mark.asyncio
+async def test_failed_item_fails_only_its_caller():
+    """An exception result is raised to its own caller; the rest of the batch succeeds."""
+    batcher = MicroBatcher(Recorder(), window=0.01)
+    results = await asyncio.gather(batcher.submit("a"), batcher.submit("bad"), return_exceptions=True)
+    assert results[0] == "A"
+    assert isinstance(results[1], ValueError)
+    assert batcher.metrics["failed_items"] == 1
+
+QUERY_PATTERN = re.compile(r"### Query (\S+)\nExtract internet plan pricing information from \S+/(\w+)\.")
+
+class BatchModel:
+    """Answers batched prompts by query id; the 'broken' site gets an answer without a price."""
+
+    def __init__(self):
+        self.prompts = []
+
+    async def generate(self, prompt):
+        self.prompts.append(prompt)
+        answers = {}
+        for query_id, site in QUERY_PATTERN.findall(prompt):
+            answers[query_id] = {"confidence": 0.9} if site == "broken" else {"price": 49.99, "confidence": 0.9}
+        return json.dumps(answers)
+
+class BlankPage:
+    """Loaded page without plan listings, so prompts carry no digest."""
+
+    def __init__(self):
+        self.content = "<html></html>"
+        self.index = get_extraction_engine().index(self.content)
+        self.content_hash = "blank"
+
+class BlankLoader:
+    async def load(self, url):
+        return BlankPage()
+
+@pytest.mark.asyncio
+async def test_coordinator_batches_concurrent_requests(tmp_path):
+    """Concurrent requests share one model call, and a malformed sub-answer fails only its request."""
+    coordinator = MagenticCoordinator(loader=BlankLoader(), result_cache=ResultCache(disk_dir=str(tmp_path)),
+                                      micro_batching=True)
+    coordinator.batcher.window = 0.02
+    coordinator.coordinator = BatchModel()
+
+    results = await asyncio.gather(
+        coordinator.process_request("https://isp.example/a", 100.0),
+        coordinator.process_request("https://isp.example/broken", 100.0),
+        coordinator.process_request("https://isp.example/b", 200.0, "Fast"),
+        return_exceptions=True
+    )
+
+    assert len(coordinator.coordinator.prompts) == 1
+    assert coordinator.coordinator.prompts[0].count("Format the response") == 1
+    assert results[0]["price"] == 49.99 and results[2]["price"] == 49.99
+    assert results[0]["prompt"]["batch_size"] == 3
+    assert isinstance(results[1], Exception) and "missing price" in str(results[1])
+    assert coordinator.metrics["model_calls"] == 1 and coordinator.metrics["batched_queries"] == 3
+    assert coordinator.metrics["requests_processed"] == 2
+    await coordinator.close()
@@ -0,0 +1,136 @@
+import pytest
+import threading
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from src.utils.page_cache import PageCache, parse_cache_control
+from src.utils.fetcher import AsyncFetcher
+
+PAGE = "<div class='plan'>$59.99 /mo 100 Mbps</div>"
+
+@pytest.fixture
+def cache(tmp_path):
+    return PageCache(max_memory_bytes=1024, disk_dir=str(tmp_path / "pages"), default_ttl=60.0)
+
+@pytest.fixture
+async def server():
+    hits = {"full": 0, "not_modified": 0}
+
+    async def etagged(request):
+        if request.headers.get("If-None-Match") == '"v1"':
+            hits["not_modified"] += 1
+            return web.Response(status=304, headers={"ETag": '"v1"', "Cache-Control": "max-age=0"})
+        hits["full"] += 1
+        return web.Response(text=PAGE, content_type="text/html",
+                            headers={"ETag": '"v1"', "Cache-Control": "max-age=0"})
+
+    async def cacheable(request):
+        hits["full"] += 1
+        return web.Response(text=PAGE, content_type="text/html", headers={"Cache-Control": "max-age=600"})
+
+    async def no_store(request):
+        hits["full"] += 1
+        return web.Response(text=PAGE, content_type="text/html", headers={"Cache-Control": "no-store"})
+
+    app = web.Application()
+    app.router.add_get("/etagged", etagged)
+    app.router.add_get("/cacheable", cacheable)
+    app.router.add_get("/no-store", no_store)
+    server = TestServer(app)
+    await server.start_server()
+    server.hits = hits
+    yield server
+    await server.close()
+
+def test_parse_cache_control():
+    """Test Cache-Control directive parsing."""
+    directives = parse_cache_control('public, max-age=300, no-cache, foo="bar"')
+    assert directives["max-age"] == 300
+    assert directives["no-cache"] is True
+    assert directives["foo"] == "bar"
+    assert parse_cache_control(None) == {}
+
+def test_ttl_from_headers(cache):
+    """Test freshness lifetime derived from response headers."""
+    assert cache.ttl_for({"Cache-Control": "max-age=120"}) == 120.0
+    assert cache.ttl_for({"Cache-Control": "no-cache"}) == 0.0
+    assert cache.ttl_for({"Cache-Control": "no-store"}) is None
+    assert cache.ttl_for({}) == 60.0
+
+def test_memory_lru_eviction(cache):
+    """Test that the memory tier stays within its byte budget."""
+    for i in range(4):
+        cache.store(f"key{i}", f"https://example.com/{i}", b"x" * 400, {}, None)
+    assert cache.get_metrics()["memory_bytes"] <= 1024
+    assert cache.metrics["evictions"] == 2
+
+def test_disk_tier_survives_restart(cache, tmp_path):
+    """Test that entries are served from disk by a fresh cache instance."""
+    cache.store("key", "https://example.com", b"body", {"ETag": '"abc"'}, "utf-8")
+    reopened = PageCache(disk_dir=str(tmp_path / "pages"))
+    entry = reopened.get("key")
+    assert entry.body == b"body"
+    assert entry.etag == '"abc"'
+    assert reopened.metrics["disk_hits"] == 1
+
+@pytest.mark.asyncio
+async def test_disk_tier_io_runs_off_the_event_loop(cache, tmp_path, monkeypatch):
+    """Test that stores on the event loop queue their disk writes and get_async reads the disk in a thread."""
+    threads = []
+    write = PageCache._atomic_write
+    monkeypatch.setattr(PageCache, "_atomic_write",
+                        staticmethod(lambda path, data: threads.append(threading.get_ident()) or write(path, data)))
+    cache.store("key", "https://example.com", b"body", {}, "utf-8")
+    cache.flush()
+    assert threads and threading.get_ident() not in threads
+
+    reopened = PageCache(disk_dir=str(tmp_path / "pages"))
+    read = reopened._read_disk
+    monkeypatch.setattr(reopened, "_read_disk", lambda key: threads.append(threading.get_ident()) or read(key))
+    del threads[:]
+    entry = await reopened.get_async("key")
+    assert entry.body == b"body" and reopened.metrics["disk_hits"] == 1
+    assert threads and threading.get_ident() not in threads
+
+@pytest.mark.asyncio
+async def test_fresh_entries_skip_network(server, cache):
+    """Test that fresh entries are served without a request."""
+    fetcher = AsyncFetcher(cache=cache)
+    try:
+        url = str(server.make_url("/cacheable"))
+        first = await fetcher.fetch(url)
+        second = await fetcher.fetch(url)
+    finally:
+        await fetcher.close()
+    assert first.cache_status == "miss"
+    assert second.cache_status == "hit"
+    assert second.text == PAGE
+    assert server.hits["full"] == 1
+    assert cache.metrics["hits"] == 1
+
+@pytest.mark.asyncio
+async def test_stale_entries_revalidate(server, cache):
+    """Test conditional GET revalidation of stale entries."""
+    fetcher = AsyncFetcher(cache=cache)
+    try:
+        url = str(server.make_url("/etagged"))
+        await fetcher.fetch(url)
+        result = await fetcher.fetch(url)
+    finally:
+        await fetcher.close()
+    assert result.cache_status == "revalidated"
+    assert result.text == PAGE
+    assert server.hits == {"full": 1, "not_modified": 1}
+    assert cache.metrics["revalidations"] == 1
+
+@pytest.mark.asyncio
+async def test_no_store_is_not_cached(server, cache):
+    """Test that no-store responses are never cached."""
+    fetcher = AsyncFetcher(cache=cache)
+    try:
+        url = str(server.make_url("/no-store"))
+        await fetcher.fetch(url)
+        await fetcher.fetch(url)
+    finally:
+        await fetcher.close()
+    assert server.hits["full"] == 2
+    assert cache.metrics["stores"] == 0
@@ -0,0 +1,47 @@
+import pytest
+from src.utils.pages import PageLoader
+from src.utils.parse_pool import ParsePool
+
+def card(name, price, speed):
+    return (f'<div class="plan-card"><h3>{name}</h3><span class="price">${price}/mo</span>'
+            f'<span class="speed">{speed} Mbps</span><ul><li class="feature">No contract</li></ul></div>')
+
+PAGE = ('<html><body><section class="pricing">'
+        + "".join(card(f"Plan {i}", f"{40 + i}.99", 25 * (i + 1)) for i in range(40))
+        + '</section><p>Café pricing – taxes extra</p></body></html>')
+
+@pytest.fixture(scope="module")
+def process_loader():
+    loader = PageLoader(fetcher=object(), parse_mode="process")
+    loader.parse_pool = ParsePool(loader.parser.name, workers=1, shm_min_bytes=1024)
+    yield loader
+    loader.close()
+
+async def plans_of(loader, content):
+    page = await loader.parse(content)
+    return page, [loader.engine.extract_plan(container) for container in page.index.plan_containers()]
+
+@pytest.mark.asyncio
+async def test_process_parse_matches_thread_parse(process_loader):
+    """Pages indexed in a worker carry the same containers and plans as in-process parsing."""
+    _, expected = await plans_of(PageLoader(fetcher=object(), parse_mode="thread"), PAGE)
+    page, plans = await plans_of(process_loader, PAGE)
+    assert plans == expected and len(plans) == 41
+    assert page.tree is None and page.content == PAGE
+    # Plans were extracted in the worker
+    assert all(container._plan is not None for container in page.index.plan_containers())
+    assert process_loader.parse_pool.metrics["shared_memory_pages"] == 1
+
+@pytest.mark.asyncio
+async def test_small_pages_skip_shared_memory(process_loader):
+    """Pages under the threshold are passed to the worker directly."""
+    before = process_loader.parse_pool.metrics["shared_memory_pages"]
+    _, plans = await plans_of(process_loader, card("Solo", "19.99", 10))
+    assert [plan["price"] for plan in plans] == [19.99]
+    assert process_loader.parse_pool.metrics["shared_memory_pages"] == before
+    assert process_loader.get_metrics()["parse_pool"]["pages"] >= 1
+
+def test_unknown_parse_mode():
+    """Only thread and process parse modes exist."""
+    with pytest.raises(ValueError):
+        PageLoader(fetcher=object(), parse_mode="gpu")
@@ -0,0 +1,58 @@
+import pytest
+from src.utils.extraction import ExtractionEngine
+from src.utils import parsers
+from src.utils.parsers import get_parser_backend, available_backends
+
+SAMPLE_PAGE = """
+<html><head><style>.plan { color: red }</style><script>var x = "$1";</script></head>
+<body>
+<section class="pricing">
+    <div class="plan">
+        <h2 class="plan-name">Premium NBN Plan</h2>
+        <div class="price">$89.99 /mo</div>
+        <div class="speed">Download speed 100 Mbps</div>
+        <ul class="features"><li>No contract</li><li>Setup fee $0</li><li>Unlimited data</li></ul>
+    </div>
+    <div class="plan">
+        <h2 class="plan-name">Basic</h2>
+        <div class="price">$59 per month</div>
+        <div class="speed">25 Mbps</div>
+    </div>
+</section>
+</body></html>
+"""
+
+@pytest.fixture(autouse=True)
+def reset_resolution():
+    parsers._resolved.clear()
+    yield
+    parsers._resolved.clear()
+
+def test_html_parser_always_available():
+    """Test that the stdlib backend is always present."""
+    assert "html.parser" in available_backends()
+    assert get_parser_backend("html.parser").name == "html.parser"
+
+def test_auto_picks_fastest_installed():
+    """Test that auto resolves to the first installed backend."""
+    assert get_parser_backend("auto").name == available_backends()[0]
+
+def test_missing_backend_falls_back(monkeypatch):
+    """Test fallback when a requested backend is not installed."""
+    monkeypatch.setattr(parsers.BACKENDS["selectolax"], "module", "not_installed_selectolax")
+    monkeypatch.setattr(parsers.BACKENDS["lxml"], "module", "not_installed_lxml")
+    assert get_parser_backend("selectolax").name == "html.parser"
+
+def test_unknown_backend():
+    """Test that unknown backend names are rejected."""
+    with pytest.raises(ValueError, match="Unknown HTML parser backend"):
+        get_parser_backend("regex")
+
+@pytest.mark.parametrize("backend", available_backends())
+def test_backends_extract_identical_plans(backend):
+    """Test that every installed backend yields the same plan records."""
+    engine = ExtractionEngine()
+    reference = engine.extract_plans(engine.index(SAMPLE_PAGE, backend="html.parser"))
+    plans = engine.extract_plans(engine.index(SAMPLE_PAGE, backend=backend))
+    assert plans == reference
+    assert [plan["price"] for plan in plans] == [89.99, 89.99, 59.0]
@@ -0,0 +1,103 @@
+import pytest
+from src.agents.fallback import ScraperAgent
+from src.agents.web_surfer import WebSurferAgent
+from src.utils.extraction import get_extraction_engine
+from src.utils.plan_table import PlanTable, PlanTableCache
+from src.utils.templates import TemplateStore
+
+URL = "https://isp.example/plans"
+
+def card(name, price, speed=None):
+    speed_html = f'<span class="speed">{speed} Mbps</span>' if speed is not None else ""
+    return (f'<div class="plan-card"><h3>{name}</h3><span class="price">${price}/mo</span>'
+            f'{speed_html}<ul><li class="feature">No contract</li></ul></div>')
+
+PAGE = "".join([card("Basic 25", "39.99", 25), card("Fast 100", "69.99", 100), card("Fast 100 Plus", "74.99", 100),
+                card("Super 500", "99.99", 500), card("Giga 1000", "129.99", 1000)])
+
+class StubPage:
+    def __init__(self, html):
+        self.content = html
+        self.index = get_extraction_engine().index(html)
+        self.parser = "stub"
+
+class CountingLoader:
+    """Page loader stub that counts loads."""
+
+    def __init__(self, html):
+        self.html = html
+        self.engine = get_extraction_engine()
+        self.loads = 0
+
+    async def load(self, url):
+        self.loads += 1
+        return StubPage(self.html)
+
+class NoBrowser:
+    async def browse(self, url):
+        return None
+
+def test_lookup_by_speed_range_and_name():
+    """Lookups return plans within 10% of the speed whose name matches, in page order."""
+    table = PlanTable([{"name": "Basic", "speed": 25.0}, {"name": "Fast  Plus", "speed": 105.0},
+                       {"name": "Fast", "speed": 95.0}, {"name": "Mystery", "speed": None},
+                       {"name": "Giga", "speed": 1000.0}])
+    assert [plan["name"] for plan in table.lookup(100, None)] == ["Fast  Plus", "Fast"]
+    assert [plan["name"] for plan in table.lookup(100, "fast plus")] == ["Fast  Plus"]
+    assert [plan["name"] for plan in table.lookup(100, None, unknown_speed_matches=True)] == \
+        ["Fast  Plus", "Fast", "Mystery"]
+    assert [plan["name"] for plan in table.lookup(None, "giga")] == ["Giga"]
+    assert table.lookup(300, None) == []
+    assert len(table.lookup(None, None)) == 5
+    # Boundaries are inclusive, as in the agents' filters
+    assert [plan["name"] for plan in table.lookup(1100, None)] == ["Giga"]
+
+def test_nearest_speed():
+    """The nearest plan by speed, first in page order on ties."""
+    table = PlanTable([{"name": "A", "speed": 100.0}, {"name": "B", "speed": 500.0}, {"name": "C", "speed": 100.0}])
+    assert table.nearest(250)["name"] == "A"
+    assert table.nearest(400)["name"] == "B"
+    assert PlanTable([{"name": "X", "speed": None}]).nearest(100) is None
+
+def test_cache_expires_tables():
+    """Tables older than the TTL are dropped."""
+    cache = PlanTableCache(ttl=0.0)
+    cache.put("web_surfer", URL, [{"name": "A", "speed": 100.0}])
+    assert cache.get("web_surfer", URL) is None
+    assert cache.metrics["expired"] == 1
+
+@pytest.mark.asyncio
+async def test_web_surfer_answers_other_speeds_from_the_table():
+    """A query for another speed on the same page is answered without loading it again."""
+    loader = CountingLoader(PAGE)
+    agent = WebSurferAgent(loader=loader, templates=TemplateStore(path=None), plan_tables=PlanTableCache())
+    agent.web_surfer = NoBrowser()
+
+    first = await agent.process_content(URL, 100.0)
+    second = await agent.process_content(URL, 500.0)
+    third = await agent.process_content("https://ISP.example/plans", 100.0, "plus")
+    missing = await agent.process_content(URL, 350.0)
+
+    assert loader.loads == 1
+    assert (first["name"], first["price"]) == ("Fast 100", 69.99)
+    assert (second["name"], second["price"]) == ("Super 500", 99.99)
+    assert third["name"] == "Fast 100 Plus"
+    assert missing["error"] == "No matching plans found"
+    assert missing["nearest_plan"]["name"] == "Super 500"
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("speed,plan_name", [(100.0, None), (25.0, None), (1000.0, "giga"), (100.0, "plus"),
+                                             (300.0, None), (50.0, None)])
+async def test_scraper_table_matches_full_scan(speed, plan_name):
+    """The scraper's table lookups give the same price as scanning the page."""
+    html = PAGE + card("Promo", "19.99")  # no speed text: matches any speed in the scraper
+    expected = ScraperAgent(0, templates=TemplateStore(path=None))._find_price(
+        get_extraction_engine().index(html), speed, plan_name)
+
+    loader = CountingLoader(html)
+    agent = ScraperAgent(0, loader=loader, templates=TemplateStore(path=None), plan_tables=PlanTableCache())
+    await agent.extract_price(URL, 1000.0)
+    result = await agent.extract_price(URL, speed, plan_name)
+
+    assert loader.loads == 1
+    assert result.get("price") == expected
@@ -0,0 +1,109 @@
+import pytest
+import asyncio
+import time
+from src.refresh import RefreshScheduler, RefreshTarget
+from src.utils.fetcher import FetchError
+
+class StubRetriever:
+    """Records start times and concurrency; scripted errors are raised as get_plan_price passes them on."""
+
+    def __init__(self, delay: float = 0.01, errors=None):
+        self.delay = delay
+        self.errors = dict(errors or {})
+        self.starts = []
+        self.active = 0
+        self.peak = 0
+
+    async def get_plan_price(self, url, download_speed, plan_name=None):
+        self.starts.append((url, time.time()))
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+            error = self.errors.pop(url, None)
+            if error is not None:
+                raise error
+            return {"price": 59.99, "confidence": 0.9, "source": "fallback"}
+        finally:
+            self.active -= 1
+
+def make_scheduler(retriever, tmp_path, **kwargs):
+    options = dict(state_path=str(tmp_path / "refresh.json"), host_rpm=6000, min_interval=60,
+                   backoff_base=0.05, backoff_max=1.0)
+    options.update(kwargs)
+    return RefreshScheduler(retriever, **options)
+
+def test_interval_follows_change_rate(tmp_path):
+    """Volatile targets are due sooner than stable ones, within the interval bounds."""
+    scheduler = make_scheduler(StubRetriever(), tmp_path, min_interval=300, max_interval=7 * 24 * 3600)
+    now = time.time()
+    stable, volatile = RefreshTarget("https://a.example", 100), RefreshTarget("https://b.example", 100)
+    for target, changes in ((stable, 0), (volatile, 2000)):
+        target.first_checked, target.last_checked, target.changes = now - 10 * 24 * 3600, now, changes
+
+    assert scheduler.interval(volatile) == 300
+    assert scheduler.interval(stable) > 24 * 3600
+    # A new target assumes the prior rate of one change per day: due after half a day
+    assert scheduler.interval(RefreshTarget("https://c.example", 100)) == pytest.approx(12 * 3600)
+
+@pytest.mark.asyncio
+async def test_host_concurrency_cap_and_rescheduling(tmp_path):
+    """Checks on one host never overlap beyond the cap, and checked targets are not due again at once."""
+    retriever = StubRetriever()
+    scheduler = make_scheduler(retriever, tmp_path, host_concurrency=1)
+    for i in range(4):
+        scheduler.add(f"https://a.example/{i}", 100)
+    scheduler.add("https://b.example/0", 100)
+
+    await asyncio.wait_for(scheduler.run(max_checks=5), 2)
+
+    assert len(retriever.starts) == 5
+    assert retriever.peak == 2  # one per host
+    assert all(target.checks == 1 and target.due_at > time.time() for target in scheduler.targets.values())
+    assert scheduler.get_metrics()["due"] == 0
+
+@pytest.mark.asyncio
+async def test_throttled_host_backs_off(tmp_path):
+    """A 429 pauses every target on the host for Retry-After seconds."""
+    retriever = StubRetriever(errors={"https://a.example/0": FetchError("HTTP 429", status=429, retry_after=0.3)})
+    scheduler = make_scheduler(retriever, tmp_path, host_concurrency=1)
+    scheduler.add("https://a.example/0", 100)
+    scheduler.add("https://a.example/1", 100)
+
+    await asyncio.wait_for(scheduler.run(max_checks=3), 3)
+
+    (_, throttled_at), (_, second_at), (_, retried_at) = retriever.starts
+    assert second_at - throttled_at >= 0.3
+    assert retried_at - throttled_at >= 0.3
+    assert scheduler.metrics["throttled"] == 1 and scheduler.metrics["failures"] == 0
+
+@pytest.mark.asyncio
+async def test_other_failures_back_off_the_target_only(tmp_path):
+    """Non-throttling errors retry the target with backoff and count as failures."""
+    retriever = StubRetriever(errors={"https://a.example/0": FetchError("HTTP 404", status=404)})
+    scheduler = make_scheduler(retriever, tmp_path)
+    target = scheduler.add("https://a.example/0", 100)
+
+    await asyncio.wait_for(scheduler.run(max_checks=2), 2)
+
+    assert scheduler.metrics["failures"] == 1
+    assert target.checks == 1 and target.failures == 0 and target.last_price == 59.99
+
+@pytest.mark.asyncio
+async def test_state_survives_restart(tmp_path):
+    """A new scheduler resumes targets, history and due times from the state file."""
+    scheduler = make_scheduler(StubRetriever(), tmp_path)
+    scheduler.add("https://a.example/0", 100, "Fast")
+    await scheduler.run(max_checks=1)
+    due_at = scheduler.targets[RefreshTarget.make_key("https://a.example/0", 100, "Fast")].due_at
+
+    restarted = make_scheduler(StubRetriever(), tmp_path)
+    target = restarted.add("https://a.example/0", 100, "Fast")
+    assert target.checks == 1 and target.last_price == 59.99
+    assert target.due_at == due_at
+
+    # Nothing is due yet, so a short run starts no checks
+    stop = asyncio.Event()
+    asyncio.get_running_loop().call_later(0.1, stop.set)
+    await restarted.run(stop)
+    assert restarted.retriever.starts == []
@@ -0,0 +1,73 @@
+import pytest
+import threading
+import time
+from src.utils.result_cache import ResultCache
+
+RESULT = {"price": 89.99, "confidence": 0.95, "details": {"contract_length": "12 months"}}
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResultCache(ttl=60.0, max_entries=2, disk_dir=str(tmp_path / "results"))
+
+def test_key_normalization():
+    """Test that equivalent requests share one key."""
+    assert ResultCache.make_key("https://Example.com/plans#x", 100, " Premium ") == \
+        ResultCache.make_key("https://example.com/plans", 100.0, "premium")
+    assert ResultCache.make_key("https://example.com", 100, None) != \
+        ResultCache.make_key("https://example.com", 50, None)
+    assert ResultCache.make_key("https://example.com", 100, None, namespace="a") != \
+        ResultCache.make_key("https://example.com", 100, None, namespace="b")
+
+def test_hit_for_same_content(cache):
+    """Test that results are reused while the page is unchanged."""
+    cache.put("key", "hash-1", RESULT)
+    assert cache.get("key", "hash-1") == RESULT
+    assert cache.metrics["hits"] == 1
+
+def test_changed_page_invalidates(cache):
+    """Test that a new page hash drops the stale result."""
+    cache.put("key", "hash-1", RESULT)
+    assert cache.get("key", "hash-2") is None
+    assert cache.metrics["invalidations"] == 1
+    assert cache.get("key", "hash-1") is None
+
+def test_ttl_expiry(cache):
+    """Test that entries expire after the TTL."""
+    cache.put("key", "hash-1", RESULT)
+    cache._memory["key"]["stored_at"] = time.time() - 120
+    assert cache.get("key", "hash-1") is None
+    assert cache.metrics["expirations"] == 1
+
+def test_disk_tier_and_lru(cache, tmp_path):
+    """Test LRU bound in memory with entries still served from disk."""
+    for i in range(3):
+        cache.put(f"key{i}", "hash", {**RESULT, "price": float(i)})
+    assert cache.get_metrics()["memory_entries"] == 2
+    assert cache.get("key0", "hash")["price"] == 0.0
+
+    reopened = ResultCache(disk_dir=str(tmp_path / "results"))
+    assert reopened.get("key2", "hash")["price"] == 2.0
+
+def test_results_are_copied(cache):
+    """Test that callers cannot mutate cached results."""
+    cache.put("key", "hash", RESULT)
+    result = cache.get("key", "hash")
+    result["details"]["contract_length"] = "changed"
+    assert cache.get("key", "hash")["details"]["contract_length"] == "12 months"
+
+@pytest.mark.asyncio
+async def test_disk_tier_io_runs_off_the_event_loop(cache, tmp_path, monkeypatch):
+    """Test that puts on the event loop queue their disk writes and get_async reads the disk in a thread."""
+    threads = []
+    write = cache._write_disk
+    monkeypatch.setattr(cache, "_write_disk", lambda key, entry: threads.append(threading.get_ident()) or write(key, entry))
+    cache.put("key", "hash", RESULT)
+    cache.flush()
+    assert threads and threading.get_ident() not in threads
+
+    reopened = ResultCache(disk_dir=str(tmp_path / "results"))
+    read = reopened._read_disk
+    monkeypatch.setattr(reopened, "_read_disk", lambda key: threads.append(threading.get_ident()) or read(key))
+    del threads[:]
+    assert (await reopened.get_async("key", "hash")) == RESULT
+    assert threads and threading.get_ident() not in threads
@@ -0,0 +1,110 @@
+import pytest
+import asyncio
+from src.agents.fallback import RoundRobinDistributor, ScraperAgent
+from src.agents.scheduler import (
+    LeastOutstandingPolicy, EWMAPowerOfTwoPolicy, SuccessWeightedPolicy, get_scheduling_policy
+)
+
+class StubLoader:
+    """Loader stub; agents in these tests never fetch."""
+
+class StubAgent(ScraperAgent):
+    """Scraper agent with a scripted delay and outcome."""
+
+    def __init__(self, agent_id: int, delay: float = 0.0, price: float = None, max_concurrency: int = 2):
+        super().__init__(agent_id, loader=StubLoader(), max_concurrency=max_concurrency)
+        self.delay = delay
+        self.price = price
+        self.cancelled = False
+
+    async def _extract_price(self, url, download_speed, plan_name=None):
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        if self.price is None:
+            self.metrics["failed_extractions"] += 1
+            return {"error": "No matching price found", "confidence": 0.0, "agent_id": self.agent_id}
+        self.metrics["successful_extractions"] += 1
+        return {"price": self.price, "confidence": 0.7, "agent_id": self.agent_id}
+
+def make_agents(count: int = 4):
+    return [StubAgent(i) for i in range(count)]
+
+def test_least_outstanding_prefers_idle_agent():
+    """Test that the least loaded agent is picked, ties broken by latency."""
+    agents = make_agents()
+    for agent, in_flight, latency in zip(agents, [1, 0, 0, 1], [0.1, 0.5, 0.2, 0.1]):
+        agent.metrics.update(in_flight=in_flight, ewma_latency=latency)
+    assert LeastOutstandingPolicy().select(agents).agent_id == 2
+
+def test_saturated_agents_are_skipped():
+    """Test that agents at their concurrency cap are avoided while others are free."""
+    agents = make_agents()
+    for agent in agents[:3]:
+        agent.metrics.update(in_flight=2, ewma_latency=0.01)
+    agents[3].metrics.update(in_flight=1, ewma_latency=5.0)
+    for policy in (LeastOutstandingPolicy(), EWMAPowerOfTwoPolicy(seed=1), SuccessWeightedPolicy(seed=1)):
+        assert policy.select(agents).agent_id == 3
+
+def test_p2c_favors_fast_agents():
+    """Test that power of two choices rarely picks the slowest agent."""
+    agents = make_agents()
+    for agent, latency in zip(agents, [0.1, 0.2, 0.3, 5.0]):
+        agent.metrics["ewma_latency"] = latency
+    policy = EWMAPowerOfTwoPolicy(seed=7)
+    picks = [policy.select(agents).agent_id for _ in range(200)]
+    assert picks.count(3) == 0
+    assert picks.count(0) > picks.count(2)
+
+def test_success_weighted_favors_reliable_agents():
+    """Test that agents with better success rates are picked more often."""
+    agents = make_agents(2)
+    agents[0].metrics.update(successful_extractions=9, failed_extractions=1)
+    agents[1].metrics.update(successful_extractions=1, failed_extractions=9)
+    policy = SuccessWeightedPolicy(seed=3)
+    picks = [policy.select(agents).agent_id for _ in range(200)]
+    assert picks.count(0) > 3 * picks.count(1)
+
+def test_unknown_policy():
+    """Test that unknown policy names are rejected."""
+    with pytest.raises(ValueError):
+        get_scheduling_policy("random")
+
+@pytest.mark.asyncio
+async def test_agent_tracks_load_and_latency():
+    """Test that agents record in-flight requests and EWMA latency."""
+    agent = StubAgent(0, delay=0.02, price=59.0)
+    task = asyncio.ensure_future(agent.extract_price("https://example.com", 50))
+    await asyncio.sleep(0)
+    assert agent.metrics["in_flight"] == 1
+    await task
+    assert agent.metrics["in_flight"] == 0
+    assert agent.metrics["ewma_latency"] >= 0.02
+
+@pytest.mark.asyncio
+async def test_concurrency_cap_queues_requests():
+    """Test that an agent never runs more than its cap at once."""
+    agent = StubAgent(0, delay=0.05, price=59.0, max_concurrency=1)
+    loop = asyncio.get_running_loop()
+    start_time = loop.time()
+    await asyncio.gather(*(agent.extract_price("https://example.com", 50) for _ in range(3)))
+    assert loop.time() - start_time >= 0.15
+
+@pytest.mark.asyncio
+async def test_fan_out_returns_first_valid_and_cancels_rest():
+    """Test that fan-out returns on the first valid result without waiting for slow agents."""
+    distributor = RoundRobinDistributor(loader=StubLoader(), scheduler=LeastOutstandingPolicy())
+    distributor.agents = [
+        StubAgent(0, delay=0.0),
+        StubAgent(1, delay=0.01, price=None),
+        StubAgent(2, delay=0.02, price=69.0),
+        StubAgent(3, delay=5.0, price=79.0)
+    ]
+    result = await asyncio.wait_for(distributor.process_request("https://example.com", 50), timeout=1.0)
+    await asyncio.sleep(0)
+    assert result["price"] == 69.0
+    assert distributor.agents[3].cancelled
+    assert distributor.metrics["cancelled_agent_requests"] == 1
+    assert all(agent.metrics["in_flight"] == 0 for agent in distributor.agents)
@@ -0,0 +1,164 @@
+import pytest
+import asyncio
+from aiohttp.test_utils import TestServer, TestClient
+from src.service import PriceService
+from src.utils.admission import AdmissionRejected
+
+class StubRetriever:
+    """PriceRetriever stand-in that records call order and can be held open."""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.calls = []
+        self.release = asyncio.Event()
+        self.release.set()
+        self.closed = False
+
+    async def get_plan_price(self, url, download_speed, plan_name=None):
+        self.calls.append(url)
+        await self.release.wait()
+        await asyncio.sleep(self.delay)
+        return {"price": 59.99, "confidence": 0.9, "source": "coordinator", "details": {}}
+
+    def get_system_status(self):
+        return {"retriever_metrics": {"hedged_requests": 0}}
+
+    def export_prometheus(self):
+        return ""
+
+    async def close(self):
+        self.closed = True
+
+@pytest.mark.asyncio
+async def test_priority_order_and_full_queue_rejection():
+    """Higher priority jobs run first; a full queue rejects equal or lower priority work."""
+    retriever = StubRetriever()
+    retriever.release.clear()
+    service = PriceService(retriever, workers=1, queue_size=2, max_queue_wait=10)
+    service.start()
+
+    blocker = asyncio.create_task(service.submit("https://a.example/busy", 100))
+    await asyncio.sleep(0.01)
+    low = asyncio.create_task(service.submit("https://a.example/low", 100, priority=0))
+    high = asyncio.create_task(service.submit("https://a.example/high", 100, priority=5))
+    await asyncio.sleep(0.01)
+
+    with pytest.raises(AdmissionRejected) as excinfo:
+        await service.submit("https://a.example/extra", 100, priority=0)
+    assert excinfo.value.reason == "queue_full"
+    assert excinfo.value.retry_after >= 1
+
+    retriever.release.set()
+    await asyncio.gather(blocker, low, high)
+    assert retriever.calls == ["https://a.example/busy", "https://a.example/high", "https://a.example/low"]
+    assert service.get_metrics()["rejected"] == 1
+    await service.drain()
+
+@pytest.mark.asyncio
+async def test_higher_priority_displaces_queued_work():
+    """A full queue sheds its least important job for a more important newcomer."""
+    retriever = StubRetriever()
+    retriever.release.clear()
+    service = PriceService(retriever, workers=1, queue_size=1, max_queue_wait=10)
+    service.start()
+
+    blocker = asyncio.create_task(service.submit("https://a.example/busy", 100))
+    await asyncio.sleep(0.01)
+    low = asyncio.create_task(service.submit("https://a.example/low", 100, priority=0))
+    await asyncio.sleep(0.01)
+    high = asyncio.create_task(service.submit("https://a.example/high", 100, priority=1))
+    await asyncio.sleep(0.01)
+
+    with pytest.raises(AdmissionRejected) as excinfo:
+        await low
+    assert excinfo.value.reason == "shed"
+    retriever.release.set()
+    assert (await high)["price"] == 59.99
+    await blocker
+    assert service.get_metrics()["shed_displaced"] == 1
+    await service.drain()
+
+@pytest.mark.asyncio
+async def test_requests_waiting_too_long_are_shed():
+    """Jobs older than max_queue_wait are rejected instead of served late."""
+    retriever = StubRetriever(delay=0.05)
+    service = PriceService(retriever, workers=1, queue_size=10, max_queue_wait=0.02)
+    service.start()
+
+    results = await asyncio.gather(*(service.submit(f"https://a.example/{i}", 100) for i in range(3)),
+                                   return_exceptions=True)
+    assert results[0]["price"] == 59.99
+    assert all(isinstance(r, AdmissionRejected) and r.reason == "shed" for r in results[1:])
+    assert service.get_metrics()["shed_expired"] == 2
+    await service.drain()
+
+@pytest.mark.asyncio
+async def test_drain_finishes_in_flight_and_queued_work():
+    """Draining refuses new requests but completes those already accepted."""
+    retriever = StubRetriever(delay=0.02)
+    service = PriceService(retriever, workers=1, queue_size=10, max_queue_wait=10)
+    service.start()
+
+    pending = [asyncio.create_task(service.submit(f"https://a.example/{i}", 100)) for i in range(3)]
+    await asyncio.sleep(0)
+    await service.drain()
+
+    assert all(task.result()["price"] == 59.99 for task in pending)
+    with pytest.raises(AdmissionRejected) as excinfo:
+        await service.submit("https://a.example/late", 100)
+    assert excinfo.value.reason == "draining"
+
+@pytest.mark.asyncio
+async def test_drain_timeout_fails_in_flight_requests():
+    """Requests still running when drain_timeout cancels the workers are rejected instead of left hanging."""
+    retriever = StubRetriever()
+    retriever.release.clear()
+    service = PriceService(retriever, workers=1, queue_size=10, max_queue_wait=10, drain_timeout=0.05)
+    service.start()
+
+    pending = [asyncio.create_task(service.submit(f"https://a.example/{i}", 100)) for i in range(2)]
+    await asyncio.sleep(0.01)
+    assert service.in_flight == 1 and service.queue_depth == 1
+    await service.drain()
+
+    done, _ = await asyncio.wait(pending, timeout=1)
+    assert len(done) == 2
+    for task in pending:
+        assert isinstance(task.exception(), AdmissionRejected) and task.exception().reason == "draining"
+    assert service.in_flight == 0
+
+@pytest.mark.asyncio
+async def test_http_endpoints():
+    """The app serves prices, maps overload to 429 and exposes status and metrics."""
+    retriever = StubRetriever()
+    service = PriceService(retriever, workers=1, queue_size=1)
+    client = TestClient(TestServer(service.make_app()))
+    await client.start_server()
+    try:
+        response = await client.post("/price", json={"url": "https://a.example", "download_speed": 100})
+        assert response.status == 200
+        assert (await response.json())["price"] == 59.99
+
+        response = await client.post("/price", json={"url": "https://a.example"})
+        assert response.status == 400
+
+        retriever.release.clear()
+        busy = asyncio.ensure_future(client.post("/price", json={"url": "https://a.example/1", "download_speed": 100}))
+        queued = asyncio.ensure_future(client.post("/price", json={"url": "https://a.example/2", "download_speed": 100}))
+        await asyncio.sleep(0.05)
+        response = await client.post("/price", json={"url": "https://a.example/3", "download_speed": 100})
+        assert response.status == 429
+        assert "Retry-After" in response.headers
+        retriever.release.set()
+        assert (await busy).status == 200
+        assert (await queued).status == 200
+
+        status = await (await client.get("/status")).json()
+        assert status["service_metrics"]["completed"] == 3
+        metrics = await (await client.get("/metrics")).text()
+        assert "price_retriever_service_rejected 1" in metrics
+        assert (await client.get("/health")).status == 200
+    finally:
+        await client.close()
+    assert service.draining
+    assert retriever.closed
@@ -0,0 +1,88 @@
+import pytest
+import asyncio
+from src.utils.singleflight import SingleFlight, canonicalize_url, content_hash
+from src.utils.pages import PageLoader
+
+class CountingFetcher:
+    """Fetcher stub that counts downloads."""
+
+    def __init__(self, content: str, delay: float = 0.05):
+        self.content = content
+        self.delay = delay
+        self.calls = 0
+
+    async def fetch_text(self, url: str) -> str:
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return self.content
+
+def test_canonicalize_url():
+    """Test that equivalent URL spellings share one key."""
+    assert canonicalize_url("HTTPS://Example.com:443/plans?b=2&a=1#top") == \
+        canonicalize_url("https://example.com/plans?a=1&b=2")
+    assert canonicalize_url("http://example.com") == "http://example.com/"
+    assert canonicalize_url("http://example.com:8080/x") != canonicalize_url("http://example.com/x")
+
+def test_content_hash():
+    """Test content hashing of str and bytes."""
+    assert content_hash("abc") == content_hash(b"abc")
+    assert content_hash("abc") != content_hash("abd")
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_coalesce():
+    """Test that concurrent calls with one key run once."""
+    flight = SingleFlight()
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return 42
+
+    results = await asyncio.gather(*(flight.do("key", work) for _ in range(5)))
+    assert results == [42] * 5
+    assert len(calls) == 1
+    assert flight.metrics["coalesced"] == 4
+    assert flight.in_flight() == 0
+
+@pytest.mark.asyncio
+async def test_errors_propagate_to_all_callers():
+    """Test that a failure is shared by every waiting caller."""
+    flight = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    results = await asyncio.gather(*(flight.do("key", fail) for _ in range(3)), return_exceptions=True)
+    assert all(isinstance(result, ValueError) for result in results)
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_does_not_cancel_others():
+    """Test that cancelling one waiter leaves the shared work running."""
+    flight = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    first = asyncio.create_task(flight.do("key", work))
+    second = asyncio.create_task(flight.do("key", work))
+    await asyncio.sleep(0)
+    first.cancel()
+    assert await second == "done"
+
+@pytest.mark.asyncio
+async def test_page_loader_shares_download_and_parse():
+    """Test that concurrent loads of one URL fetch and parse once."""
+    fetcher = CountingFetcher("<div class='plan'>$10</div>")
+    loader = PageLoader(fetcher=fetcher)
+
+    pages = await asyncio.gather(
+        loader.load("https://example.com/plans"),
+        loader.load("https://EXAMPLE.com/plans#a"),
+        loader.load("https://example.com/plans")
+    )
+    assert fetcher.calls == 1
+    assert pages[0].tree is pages[1].tree is pages[2].tree
+    assert loader.get_metrics()["parses"]["executions"] == 1
@@ -0,0 +1,197 @@
+import pytest
+import json
+import threading
+from src.agents.coordinator import MagenticCoordinator
+from src.utils.extraction import get_extraction_engine
+from src.utils.result_cache import ResultCache
+from src.utils.snapshots import SnapshotStore, matches_query
+
+URL = "https://isp.example/plans"
+
+def card(name, price, speed):
+    return (f'<div class="plan-card"><h3>{name}</h3><span class="price">${price}</span>'
+            f'<span class="speed">{speed} Mbps</span></div>')
+
+def page(*cards):
+    return '<section class="pricing">' + "".join(cards) + '</section>'
+
+def index(html):
+    return get_extraction_engine().index(html)
+
+BASIC = card("Basic", "49.99", 50)
+FAST = card("Fast", "69.99", 100)
+ULTRA = card("Ultra", "89.99", 1000)
+
+def test_first_observation_extracts_everything(tmp_path):
+    """A new URL is extracted in full and reported as first seen."""
+    store = SnapshotStore(disk_dir=str(tmp_path))
+    plans, changes = store.observe(URL, index(page(BASIC, FAST)))
+    # The pricing section wrapper is a plan container too, but only the cards are reported
+    assert len(plans) == 3
+    assert [plan["name"] for plan in changes["added"]] == ["Basic", "Fast"]
+    assert changes["first_seen"] and changes["version"] == 1
+    assert store.metrics["plans_reused"] == 0
+
+def test_unchanged_containers_reuse_stored_plans(tmp_path):
+    """Only changed containers are re-extracted, and the diff names what changed."""
+    store = SnapshotStore(disk_dir=str(tmp_path))
+    store.observe(URL, index(page(BASIC, FAST, ULTRA)))
+    extracted = store.metrics["plans_extracted"]
+
+    plans, changes = store.observe(URL, index(page(BASIC, card("Fast", "64.99", 100))))
+
+    # The edited card and its wrapper are extracted again; Basic is reused
+    assert store.metrics["plans_extracted"] - extracted == 2
+    assert store.metrics["plans_reused"] == 1
+    assert changes["version"] == 2 and not changes["first_seen"]
+    assert changes["unchanged"] == 1
+    assert [(entry["before"]["price"], entry["after"]["price"]) for entry in changes["changed"]] == [(69.99, 64.99)]
+    assert [plan["name"] for plan in changes["removed"]] == ["Ultra"]
+    assert changes["added"] == []
+    assert [plan["price"] for plan in plans[1:]] == [49.99, 64.99]
+
+    _, changes = store.observe(URL, index(page(card("Giga", "99.99", 2000), BASIC, card("Fast", "64.99", 100))))
+    assert [plan["name"] for plan in changes["added"]] == ["Giga"]
+    assert changes["unchanged"] == 2 and changes["changed"] == []
+
+def test_same_version_reports_the_same_diff(tmp_path):
+    """Repeated observations of one page version return its change report unchanged."""
+    store = SnapshotStore(disk_dir=str(tmp_path))
+    store.observe(URL, index(page(BASIC, FAST)))
+    _, first = store.observe(URL, index(page(BASIC, card("Fast", "59.99", 100))))
+    _, second = store.observe(URL, index(page(BASIC, card("Fast", "59.99", 100))))
+    assert first == second
+    assert store.metrics["unchanged_pages"] == 1
+
+def test_snapshots_persist_across_instances(tmp_path):
+    """A new store picks up snapshots from the disk tier."""
+    SnapshotStore(disk_dir=str(tmp_path)).observe(URL, index(page(BASIC)))
+    store = SnapshotStore(disk_dir=str(tmp_path))
+    _, changes = store.observe(URL, index(page(BASIC, FAST)))
+    assert changes["version"] == 2
+    assert [plan["name"] for plan in changes["added"]] == ["Fast"]
+    assert store.metrics["plans_reused"] == 1
+
+@pytest.mark.asyncio
+async def test_disk_tier_io_runs_off_the_event_loop(tmp_path, monkeypatch):
+    """Observations on the event loop queue their disk writes and load() reads the disk in a thread."""
+    threads = []
+    store = SnapshotStore(disk_dir=str(tmp_path))
+    write = store._write_disk
+    monkeypatch.setattr(store, "_write_disk",
+                        lambda key, snapshot: threads.append(threading.get_ident()) or write(key, snapshot))
+    store.observe(URL, index(page(BASIC)))
+    store.flush()
+    assert threads and threading.get_ident() not in threads
+
+    reopened = SnapshotStore(disk_dir=str(tmp_path))
+    read = reopened._read_disk
+    monkeypatch.setattr(reopened, "_read_disk", lambda key: threads.append(threading.get_ident()) or read(key))
+    del threads[:]
+    await reopened.load(URL)
+    assert threads and threading.get_ident() not in threads
+    del threads[:]
+    _, changes = reopened.observe(URL, index(page(BASIC, FAST)))
+    assert not threads
+    assert changes["version"] == 2
+
+def test_matches_query():
+    """Plans match on speed within 10% and on a plan name substring."""
+    assert matches_query({"name": "Fast 100", "speed": 100.0}, 95, None)
+    assert not matches_query({"name": "Fast 100", "speed": 100.0}, 50, None)
+    assert not matches_query({"name": "Fast 100", "speed": 100.0}, 100, "ultra")
+    assert matches_query({"name": None, "speed": None}, 100, None)
+
+class StubPage:
+    def __init__(self, html):
+        self.index = index(html)
+        self.content = html
+        self.content_hash = "raw"
+        self.parser = "stub"
+
+class StubLoader:
+    def __init__(self, html):
+        self.html = html
+        self.engine = get_extraction_engine()
+
+    async def load(self, url):
+        return StubPage(self.html)
+
+class StubModel:
+    def __init__(self):
+        self.calls = 0
+
+    async def generate(self, prompt):
+        self.calls += 1
+        return json.dumps({"price": 69.99, "confidence": 0.95, "details": {}})
+
+@pytest.mark.asyncio
+async def test_coordinator_skips_model_when_only_unrelated_plans_change(tmp_path):
+    """Edits to plans that cannot answer the query keep the cached answer."""
+    coordinator = MagenticCoordinator(result_cache=ResultCache(disk_dir=str(tmp_path / "results")),
+                                      snapshots=SnapshotStore(disk_dir=str(tmp_path / "snapshots")))
+    coordinator.coordinator = StubModel()
+
+    coordinator.loader = StubLoader(page(BASIC, FAST))
+    first = await coordinator.process_request(URL, 100.0)
+    assert first["changes"]["first_seen"]
+
+    # The 50 Mbps plan changes: the 100 Mbps answer still holds
+    coordinator.loader = StubLoader(page(card("Basic", "44.99", 50), FAST))
+    second = await coordinator.process_request(URL, 100.0)
+    assert second["cached"] is True
+    assert coordinator.coordinator.calls == 1
+    assert second["changes"]["version"] == 2
+
+    # The matching plan changes: the model runs again
+    coordinator.loader = StubLoader(page(card("Basic", "44.99", 50), card("Fast", "64.99", 100)))
+    await coordinator.process_request(URL, 100.0)
+    assert coordinator.coordinator.calls == 2
+
+def quiet(agent):
+    """Agent reading only through its loader and the snapshot store."""
+    agent.templates = None
+    agent.plan_tables = None
+    return agent
+
+@pytest.mark.asyncio
+async def test_scraper_reads_only_changed_containers(tmp_path, monkeypatch):
+    """Re-checks serve unchanged scraper containers from the snapshot."""
+    from src.agents.fallback import ScraperAgent
+    agent = quiet(ScraperAgent(0, loader=StubLoader(page(BASIC, FAST)), stream_parsing=False,
+                               snapshots=SnapshotStore(disk_dir=str(tmp_path))))
+    read = []
+    record = agent._plan_record
+    monkeypatch.setattr(agent, "_plan_record", lambda plan: read.append(plan.text) or record(plan))
+
+    assert (await agent.extract_price(URL, 100.0))["price"] == 69.99
+    first_reads = len(read)
+    again = await agent.extract_price(URL, 100.0)
+    assert again["price"] == 69.99 and len(read) == first_reads
+
+    # Only the edited card and the section wrapping it are read again
+    agent.loader = StubLoader(page(BASIC, card("Fast", "64.99", 100)))
+    del read[:]
+    result = await agent.extract_price(URL, 100.0)
+    assert result["price"] == 64.99
+    assert len(read) == 2 and not any("Basic" in text and "Fast" not in text for text in read)
+    assert result["changes"]["version"] == 2
+
+@pytest.mark.asyncio
+async def test_web_surfer_reads_only_changed_containers(tmp_path):
+    """Re-checks take unchanged plans from the snapshot instead of extracting them."""
+    from src.agents.web_surfer import WebSurferAgent
+
+    class NoBrowser:
+        async def browse(self, url):
+            return None
+
+    store = SnapshotStore(disk_dir=str(tmp_path))
+    agent = quiet(WebSurferAgent(loader=StubLoader(page(BASIC, FAST)), stream_parsing=False, snapshots=store))
+    agent.web_surfer = NoBrowser()
+
+    assert (await agent.process_content(URL, 100.0))["price"] == 69.99
+    extracted = store.metrics["plans_extracted"]
+    agent.loader = StubLoader(page(BASIC, card("Fast", "64.99", 100)))
+    assert (await agent.process_content(URL, 100.0))["price"] == 64.99
+    assert store.metrics["plans_extracted"] - extracted == 2
@@ -0,0 +1,105 @@
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from src.utils.extraction import ExtractionEngine, ROLE_PLAN
+from src.utils.streaming import StreamingExtractor
+from src.utils.fetcher import AsyncFetcher
+from src.utils.pages import PageLoader
+
+def plan_card(name: str, speed: int, price: str) -> str:
+    return f"""
+    <div class="plan">
+        <svg><text>$999</text></svg>
+        <h2 class="plan-name">{name}</h2>
+        <div class="price">${price} /mo</div>
+        <div class="speed">Download speed {speed} Mbps</div>
+        <ul class="features"><li>No contract</li><li>Unlimited data</li></ul>
+        <img class="badge" src="x.png">
+    </div>
+    """
+
+PAGE = (
+    "<html><head><script>var price = '$1';</script><style>.plan{}</style></head><body>"
+    + plan_card("Basic", 25, "59.00") + plan_card("Standard", 50, "69.00") + plan_card("Premium", 100, "89.99")
+    + "<footer class='plan-footer'>Plans from $5</footer></body></html>"
+)
+
+@pytest.fixture
+def engine():
+    return ExtractionEngine()
+
+def feed_in_chunks(extractor: StreamingExtractor, content: str, size: int = 37):
+    for offset in range(0, len(content), size):
+        extractor.feed(content[offset:offset + size])
+        if extractor.stopped:
+            break
+
+def test_streamed_plans_match_full_parse(engine):
+    """Test chunked streaming gives the same plans as a full parse."""
+    extractor = StreamingExtractor(engine)
+    feed_in_chunks(extractor, PAGE)
+    streamed = engine.extract_plans(extractor.result())
+    full = engine.extract_plans(engine.index(PAGE, backend="html.parser"))
+    assert streamed == full[:3]
+    assert [plan["price"] for plan in streamed] == [59.0, 69.0, 89.99]
+
+def test_skipped_markup_is_not_indexed(engine):
+    """Test that scripts, SVGs and footers never reach the index."""
+    extractor = StreamingExtractor(engine)
+    feed_in_chunks(extractor, PAGE)
+    index = extractor.result()
+    assert len(index.containers) == 3
+    assert all("$999" not in container.text for container in index.containers)
+    # Nothing outside a container is retained
+    assert extractor.builder.strings == []
+
+def test_early_exit_on_match(engine):
+    """Test that parsing stops once a matching container completes."""
+    def is_standard(container):
+        return container.roles & ROLE_PLAN and engine.extract_plan(container)["speed"] == 50.0
+
+    extractor = StreamingExtractor(engine, stop=is_standard)
+    feed_in_chunks(extractor, PAGE)
+    index = extractor.result()
+    assert extractor.stopped
+    assert extractor.bytes_fed < len(PAGE)
+    assert [engine.extract_plan(c)["name"] for c in index.containers] == ["Basic", "Standard"]
+
+@pytest.fixture
+async def server():
+    async def page(request):
+        return web.Response(text=PAGE + "<!--" + "x" * 200000 + "-->", content_type="text/html")
+
+    app = web.Application()
+    app.router.add_get("/page", page)
+    server = TestServer(app)
+    await server.start_server()
+    yield server
+    await server.close()
+
+@pytest.mark.asyncio
+async def test_fetch_truncates_at_cap(server):
+    """Test that the download is capped."""
+    fetcher = AsyncFetcher(max_body_bytes=1000)
+    try:
+        result = await fetcher.fetch(str(server.make_url("/page")))
+    finally:
+        await fetcher.close()
+    assert result.truncated
+    assert len(result.body) == 1000
+
+@pytest.mark.asyncio
+async def test_loader_stream_stops_early(server, engine):
+    """Test streaming a page through the loader with early exit."""
+    fetcher = AsyncFetcher(chunk_size=256)
+    loader = PageLoader(fetcher=fetcher, engine=engine)
+    try:
+        page = await loader.stream(
+            str(server.make_url("/page")),
+            stop=lambda c: engine.extract_plan(c)["name"] == "Basic"
+        )
+    finally:
+        await fetcher.close()
+    assert page.stats["early_exit"]
+    assert page.stats["bytes_parsed"] < 2048
+    assert engine.extract_plans(page.index)[0]["price"] == 59.0
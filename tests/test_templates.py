@@ -0,0 +1,160 @@
+import pytest
+from src.utils.extraction import ExtractionEngine
+from src.utils.templates import TemplateStore, ExtractionTemplate
+from src.utils.parsers import available_backends, get_parser_backend
+from src.utils.pages import PageLoader
+from src.utils.plan_table import PlanTableCache
+from src.agents.fallback import ScraperAgent
+from src.agents.web_surfer import WebSurferAgent
+
+URL = "https://isp.example.com/nbn-plans"
+
+def plan_card(name: str, speed: int, price: str) -> str:
+    return f"""
+    <div class="plan-card">
+        <h2 class="plan-name">{name}</h2>
+        <div class="price">${price} /mo</div>
+        <div class="speed">Download speed {speed} Mbps</div>
+        <ul class="features"><li>No contract</li></ul>
+    </div>
+    """
+
+def page(*cards: str) -> str:
+    return f"<html><body><section class='pricing-table'>{''.join(cards)}</section></body></html>"
+
+PAGE = page(plan_card("Basic", 25, "59.00"), plan_card("Standard", 50, "69.00"), plan_card("Premium", 100, "89.99"))
+
+@pytest.fixture
+def engine():
+    return ExtractionEngine()
+
+@pytest.fixture
+def store(tmp_path):
+    return TemplateStore(path=str(tmp_path / "templates.json"))
+
+def test_containers_have_selector_paths(engine):
+    """Test that containers are addressable by selector path and ordinal."""
+    index = engine.index(PAGE)
+    card = index.find("section.pricing-table > div.plan-card", 2)
+    assert card is not None
+    assert engine.extract_plan(card)["name"] == "Premium"
+    assert index.find("section.pricing-table > div.plan-card", 3) is None
+
+def test_scraper_learns_and_reuses_template(engine, store):
+    """Test that a full scan is learned and the next lookup hits the template."""
+    agent = ScraperAgent(0, templates=store)
+    assert agent._find_price(engine.index(PAGE), 50.0, None, url=URL) == 69.0
+    assert store.metrics["learned"] == 1
+
+    # Price changed, structure did not: the template still answers
+    updated = PAGE.replace("$69.00", "$64.00")
+    assert agent._find_price(engine.index(updated), 50.0, None, url=URL) == 64.0
+    assert store.get_metrics()["hits"] == 1
+
+def test_stale_template_falls_back_to_full_scan(engine, store):
+    """Test that a template pointing at the wrong plan is dropped and relearned."""
+    agent = ScraperAgent(0, templates=store)
+    agent._find_price(engine.index(PAGE), 50.0, None, url=URL)
+
+    # A new plan inserted first shifts the ordinals
+    reordered = page(plan_card("Starter", 12, "49.00"), plan_card("Basic", 25, "59.00"),
+                     plan_card("Standard", 50, "69.00"))
+    assert agent._find_price(engine.index(reordered), 50.0, None, url=URL) == 69.0
+    assert store.metrics["validation_failures"] == 1
+    assert store.get(URL, TemplateStore.make_key("scraper", 50.0, None)).ordinal == 2
+
+def test_templates_persist(engine, store):
+    """Test that templates survive a restart."""
+    ScraperAgent(0, templates=store)._find_price(engine.index(PAGE), 100.0, None, url=URL)
+    # Writes are deferred to the save timer; flush makes them now
+    assert TemplateStore(path=store.path).get(URL, TemplateStore.make_key("scraper", 100.0, None)) is None
+    store.flush()
+    assert store.metrics["saves"] == 1
+    reloaded = TemplateStore(path=store.path)
+    template = reloaded.get("https://ISP.example.com/other", TemplateStore.make_key("scraper", 100.0, None))
+    assert template is not None
+    assert (template.path, template.ordinal) == ("section.pricing-table > div.plan-card", 2)
+
+@pytest.mark.asyncio
+async def test_web_surfer_template_fast_path(engine, store):
+    """Test that the web surfer answers from the template with the same result as a full scan."""
+    web_surfer = WebSurferAgent(templates=store)
+    index = engine.index(PAGE)
+    full = await web_surfer._extract_plan_information(index, 100.0, None, url=URL)
+    fast = await web_surfer._extract_plan_information(engine.index(PAGE), 100.0, None, url=URL)
+    assert fast == full
+    assert fast["name"] == "Premium"
+    assert store.metrics["hits"] == 1
+
+class PageFetcher:
+    """Serves one page, counting fetches."""
+
+    def __init__(self, content: str):
+        self.content = content
+        self.fetches = 0
+
+    async def fetch_text(self, url):
+        self.fetches += 1
+        return self.content
+
+@pytest.mark.parametrize("backend", available_backends())
+def test_locate_matches_full_index(engine, backend):
+    """Test that a located container is indexed exactly as in the full index, on every parser backend."""
+    parser = get_parser_backend(backend)
+    _, index = parser.index(PAGE, engine)
+    for container in index.containers:
+        located = parser.locate(PAGE, engine, container.path, container.ordinal)
+        assert (located.path, located.ordinal, located.text) == (container.path, container.ordinal, container.text)
+        assert engine.extract_plan(located) == engine.extract_plan(container)
+        template = ExtractionTemplate.from_container(container)
+        assert template.matches(located)
+    assert parser.locate(PAGE, engine, "section.pricing-table > div.plan-card", 3) is None
+
+@pytest.mark.asyncio
+async def test_template_skips_full_index(store):
+    """Test that a learned template answers from its own container without a full page index."""
+    loader = PageLoader(fetcher=PageFetcher(PAGE))
+    agent = ScraperAgent(0, loader=loader, stream_parsing=False, templates=store, plan_tables=PlanTableCache(ttl=0))
+
+    first = await agent.extract_price(URL, 50.0)
+    assert first["price"] == 69.0
+    assert loader.get_metrics()["parses"]["calls"] == 1
+
+    second = await agent.extract_price(URL, 50.0)
+    assert second["price"] == 69.0
+    assert loader.get_metrics()["parses"]["calls"] == 1
+    assert store.metrics["direct_hits"] == 1
+
+@pytest.mark.asyncio
+async def test_template_miss_downloads_page_once(store):
+    """Test that a template that no longer fits is followed by a full scan of the page it already fetched."""
+    fetcher = PageFetcher(PAGE)
+    loader = PageLoader(fetcher=fetcher)
+    agent = ScraperAgent(0, loader=loader, stream_parsing=False, templates=store, plan_tables=PlanTableCache(ttl=0))
+    await agent.extract_price(URL, 50.0)
+
+    # The learned second card is now the 100 Mbps plan
+    fetcher.content = page(plan_card("Standard", 50, "65.00"), plan_card("Premium", 100, "89.99"))
+    fetcher.fetches = 0
+    assert (await agent.extract_price(URL, 50.0))["price"] == 65.0
+    assert store.metrics["validation_failures"] == 1
+    assert fetcher.fetches == 1
+
+@pytest.mark.asyncio
+async def test_web_surfer_template_miss_skips_browsing(store):
+    """Test that the web surfer scans the page its template fetched rather than browsing to it again."""
+
+    class NoBrowser:
+        async def browse(self, url):
+            raise AssertionError("page was already downloaded")
+
+    fetcher = PageFetcher(PAGE)
+    web_surfer = WebSurferAgent(loader=PageLoader(fetcher=fetcher), stream_parsing=False, templates=store,
+                                plan_tables=PlanTableCache(ttl=0))
+    store.learn(URL, TemplateStore.make_key("web_surfer", 50.0, None),
+                web_surfer.engine.index(PAGE).find("section.pricing-table > div.plan-card", 0))
+    web_surfer.web_surfer = NoBrowser()
+
+    result = await web_surfer.process_content(URL, 50.0)
+    assert result["name"] == "Standard"
+    assert fetcher.fetches == 1
@@ -0,0 +1,112 @@
+import pytest
+import asyncio
+import os
+import pstats
+import time
+from src.utils import tracing
+from src.utils.tracing import Tracer, current_span, traced
+from src.utils.profiling import SlowRequestProfiler
+from src.utils.pages import PageLoader
+
+class StaticFetcher:
+    """Fetcher stub returning fixed content."""
+
+    async def fetch_text(self, url: str) -> str:
+        return "<div class='plan'><span class='price'>$59</span> 50 Mbps</div>"
+
+@pytest.fixture
+def tracer(monkeypatch):
+    tracer = Tracer(enabled=True)
+    monkeypatch.setattr(tracing, "_shared_tracer", tracer)
+    return tracer
+
+@pytest.mark.asyncio
+async def test_spans_follow_tasks_and_threads(tracer):
+    """Test that spans in child tasks and executor threads join the request trace."""
+    loader = PageLoader(fetcher=StaticFetcher())
+
+    @traced("agent.work")
+    async def work(delay):
+        await asyncio.sleep(delay)
+        current_span().set_attribute("delay", delay)
+
+    with tracer.span("request", url="https://example.com"):
+        await asyncio.gather(work(0.01), work(0.02), loader.load("https://example.com/plans"))
+
+    trace = tracer.get_trace()
+    names = [span.name for span in trace.spans]
+    assert names[0] == "request"
+    assert names.count("agent.work") == 2
+    assert {"page.load", "page.parse"} <= set(names)
+
+    root = trace.root
+    by_name = {span.name: span for span in trace.spans}
+    assert all(span.parent_id == root.span_id for span in trace.spans if span.name == "agent.work")
+    assert by_name["page.parse"].parent_id == by_name["page.load"].span_id
+    assert by_name["page.parse"].attributes["containers"] == 1
+
+@pytest.mark.asyncio
+async def test_errors_and_cancellation_are_recorded(tracer):
+    """Test span status for failing and cancelled work."""
+    @traced("slow")
+    async def slow():
+        await asyncio.sleep(1)
+
+    with pytest.raises(ValueError):
+        with tracer.span("request"):
+            task = asyncio.ensure_future(slow())
+            await asyncio.sleep(0)
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            raise ValueError("boom")
+
+    spans = {span.name: span for span in tracer.get_trace().spans}
+    assert spans["request"].status == "error"
+    assert spans["request"].attributes["error"] == "boom"
+    assert spans["slow"].status == "cancelled"
+
+def test_chrome_trace_export(tracer):
+    """Test the Chrome trace event format."""
+    with tracer.span("request", url="https://example.com"):
+        with tracer.span("http.fetch", bytes=1024):
+            pass
+
+    exported = tracer.export(format="chrome")
+    complete = [event for event in exported["traceEvents"] if event["ph"] == "X"]
+    assert [event["name"] for event in complete] == ["request", "http.fetch"]
+    assert complete[1]["args"]["bytes"] == 1024
+    assert complete[0]["dur"] >= complete[1]["dur"]
+    assert tracer.export(format="json")["spans"][1]["parent_id"] == tracer.export(format="json")["spans"][0]["span_id"]
+
+def test_disabled_tracer_is_noop():
+    """Test that a disabled tracer records nothing."""
+    tracer = Tracer(enabled=False)
+    with tracer.span("request") as span:
+        span.set_attribute("url", "https://example.com")
+    assert tracer.get_trace() is None
+
+@pytest.mark.parametrize("mode", ["cprofile", "sampling"])
+def test_slow_request_profile_is_saved(tmp_path, tracer, mode):
+    """Test that requests over the threshold leave a profile on disk."""
+    profiler = SlowRequestProfiler(mode=mode, threshold=0.05, output_dir=str(tmp_path))
+    with tracer.span("request") as span, profiler.profile(span):
+        deadline = time.monotonic() + 0.1
+        while time.monotonic() < deadline:
+            sum(range(1000))
+
+    path = span.attributes["profile"]
+    assert os.path.exists(path)
+    if mode == "cprofile":
+        assert pstats.Stats(path).total_calls > 0
+    else:
+        with open(path) as f:
+            assert "test_slow_request_profile_is_saved" in f.read()
+
+def test_fast_request_profile_is_discarded(tmp_path):
+    """Test that fast requests leave no profile behind."""
+    profiler = SlowRequestProfiler(mode="cprofile", threshold=10.0, output_dir=str(tmp_path))
+    with profiler.profile():
+        pass
+    assert profiler.metrics["profiled_requests"] == 1
+    assert profiler.metrics["profiles_saved"] == 0
+    assert not os.listdir(tmp_path)